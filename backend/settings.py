@@ -108,6 +108,21 @@ DATABASES = {
 # }
 
 
+# 后台上传任务的文件暂存目录和处理线程数
+UPLOAD_SPOOL_DIR = os.path.join(BASE_DIR, 'spool')
+UPLOAD_JOB_WORKERS = 2
+# 处理中的上传任务超过这个秒数没有进度时视为处理进程已经退出，由 run_upload_jobs 标记为失败并删除暂存文件
+UPLOAD_JOB_STALE_SECONDS = 30 * 60
+# 分块上传会话超过这个秒数没有追加内容时视为已放弃，由 run_upload_jobs 删除会话和暂存文件
+CHUNKED_UPLOAD_EXPIRE_SECONDS = 24 * 60 * 60
+
+# 并行上传模式下解析清洗文件的进程数，每个 web 进程的并行上传请求共用一个进程池，固定为较小的值，不占满服务器的全部 CPU 核心
+UPLOAD_PARALLEL_WORKERS = 4
+
+# 考核信息游标分页返回的记录总数按筛选条件缓存的秒数
+ASSESSMENT_COUNT_CACHE_SECONDS = 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -24,7 +24,7 @@ from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from upload.views import UserInfoViewSet, LogoutView, AssessmentBaseViewSet, AssessmentUploadView, SaveClassification, DataKeyCategoryList
+from upload.views import UserInfoViewSet, LogoutView, AssessmentBaseViewSet, AssessmentUploadView, SaveClassification, DataKeyCategoryList, UploadJobViewSet, ChunkedUploadViewSet
 
 router = DefaultRouter()
 '''
@@ -40,6 +40,12 @@ router.register(prefix="info", viewset=UserInfoViewSet)
 router.register(r'assessment-base', AssessmentBaseViewSet,
                 basename='assessmentbase')
 
+# 后台上传任务，创建任务并查询处理进度
+router.register(r'upload-jobs', UploadJobViewSet, basename='uploadjob')
+
+# 分块续传上传，创建会话、按偏移量追加分块、完成后创建后台上传任务
+router.register(r'chunked-uploads', ChunkedUploadViewSet, basename='chunkedupload')
+
 urlpatterns = [
     # 定义admin路径，连接到Django的管理后台
     path("admin/", admin.site.urls),
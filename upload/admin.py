@@ -1,10 +1,13 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from django.db import models
+from django.db import models, transaction
+from django import forms
 from django.forms import TextInput
 from django.utils.translation import gettext_lazy as _
 
-from .models import NewUser, Assessment_Base, Assessment_Classification
+from .models import NewUser, Assessment_Base, Assessment_Classification, Assessment_File, Assessment_UploadJob, Assessment_UploadJobFile, Assessment_ChunkedUpload, Assessment_Template, Assessment_Rejection, Assessment_Subject, Assessment_StepTiming, Assessment_DataKeys
+
+from .catalog import refresh_subjects
 
 # 创建NewUser模型的admin类
 class NewUserAdmin(UserAdmin):
@@ -19,8 +22,25 @@ class NewUserAdmin(UserAdmin):
     list_display_links = ('id','username','roles','email','last_login')
     search_fields = ('username', 'email')
 
+# 考核信息的编辑表单，动态数据按完整的字典编辑，保存时由模型拆分为列名字典和值
+class AssessmentBaseForm(forms.ModelForm):
+    additional_data = forms.JSONField(label='动态数据', required=False)
+
+    class Meta:
+        model = Assessment_Base
+        exclude = ('data_keys', 'data_values')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['additional_data'].initial = self.instance.additional_data
+
+    def save(self, commit=True):
+        self.instance.additional_data = self.cleaned_data['additional_data']
+        return super().save(commit)
+
 # 创建Assessment_Base模型的admin类
 class AssessmentBaseAdmin(admin.ModelAdmin):
+    form = AssessmentBaseForm
     # 设置整数型字段的输入框大小
     formfield_overrides = {
         models.IntegerField: {'widget': TextInput(attrs={'size':'20'})},
@@ -29,6 +49,29 @@ class AssessmentBaseAdmin(admin.ModelAdmin):
     list_display = ('id','file_name','record_date','crew_group','name','train_model','assessment_item','assessment_result')
     list_display_links = ('id','record_date','crew_group','name','train_model','assessment_item','assessment_result','file_name')
     search_fields = ('record_date','crew_group','name','train_model','assessment_item','assessment_result','file_name')
+    # 可以筛选出上传过程中尚未发布的暂存记录
+    list_filter = ('is_published',)
+
+    # 在后台修改或删除记录时同时更新科目目录
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            subjects = [(obj.train_model, obj.assessment_item)]
+            if change:
+                old = Assessment_Base.objects.get(pk=obj.pk)
+                subjects.append((old.train_model, old.assessment_item))
+            super().save_model(request, obj, form, change)
+            refresh_subjects(subjects)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            refresh_subjects([(obj.train_model, obj.assessment_item)])
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            subjects = set(queryset.values_list('train_model', 'assessment_item').distinct().order_by())
+            super().delete_queryset(request, queryset)
+            refresh_subjects(subjects)
 
 # 创建Assessment_Classification模型的admin类
 class AssessmentClassificationAdmin(admin.ModelAdmin):
@@ -37,7 +80,71 @@ class AssessmentClassificationAdmin(admin.ModelAdmin):
     list_display_links = ('assessment_base','file_name','data_key','category')
     search_fields = ('assessment_base__file_name','data_key','category')  # 允许通过file_name和category搜索
 
+# 创建Assessment_File模型的admin类
+class AssessmentFileAdmin(admin.ModelAdmin):
+    list_display = ('id','file_name','encoding','row_count','uploaded_at')
+    list_display_links = ('id','file_name','encoding','uploaded_at')
+    search_fields = ('file_name','encoding')
+
+# 创建Assessment_UploadJob模型的admin类，在任务页面内直接显示每个文件的处理情况
+class UploadJobFileInline(admin.TabularInline):
+    model = Assessment_UploadJobFile
+    extra = 0
+    fields = ('file_name','size','status','rows_read','rows_written','error')
+    readonly_fields = fields
+
+class UploadJobAdmin(admin.ModelAdmin):
+    list_display = ('id','status','created_by','created_at','started_at','finished_at')
+    list_display_links = ('id','status','created_by','created_at')
+    list_filter = ('status',)
+    inlines = [UploadJobFileInline]
+
+# 创建Assessment_ChunkedUpload模型的admin类
+class ChunkedUploadAdmin(admin.ModelAdmin):
+    list_display = ('id','file_name','size','offset','status','job','created_by','updated_at')
+    list_display_links = ('id','file_name')
+    list_filter = ('status',)
+
+# 创建Assessment_Template模型的admin类
+class AssessmentTemplateAdmin(admin.ModelAdmin):
+    list_display = ('id','assessment_item','header_signature','created_at')
+    list_display_links = ('id','assessment_item')
+    search_fields = ('assessment_item','header_signature')
+
+# 创建Assessment_Rejection模型的admin类，可以按原因筛选上传时被跳过的行
+class AssessmentRejectionAdmin(admin.ModelAdmin):
+    list_display = ('id','file_name','row_index','reason','value','created_at')
+    list_display_links = ('id','file_name')
+    list_filter = ('reason',)
+    search_fields = ('file_name','value')
+
+# 创建Assessment_Subject模型的admin类，科目目录由入库逻辑维护，只用于查看
+class AssessmentSubjectAdmin(admin.ModelAdmin):
+    list_display = ('id','train_model','assessment_item','row_count','first_date','last_date','updated_at')
+    list_display_links = ('id','train_model','assessment_item')
+    search_fields = ('train_model','assessment_item')
+
+# 创建Assessment_DataKeys模型的admin类，列名字典由入库逻辑登记，只用于查看
+class AssessmentDataKeysAdmin(admin.ModelAdmin):
+    list_display = ('signature','keys','created_at')
+    search_fields = ('signature',)
+
+# 创建Assessment_StepTiming模型的admin类，步骤用时由入库逻辑生成，只用于查看
+class AssessmentStepTimingAdmin(admin.ModelAdmin):
+    list_display = ('id','assessment_base','step_order','step_key','seconds')
+    list_display_links = ('id','assessment_base')
+    search_fields = ('step_key',)
+    raw_id_fields = ('assessment_base',)
+
 # 在管理员后台注册模型
 admin.site.register(NewUser,NewUserAdmin)
 admin.site.register(Assessment_Base, AssessmentBaseAdmin)
-admin.site.register(Assessment_Classification, AssessmentClassificationAdmin)
\ No newline at end of file
+admin.site.register(Assessment_Classification, AssessmentClassificationAdmin)
+admin.site.register(Assessment_File, AssessmentFileAdmin)
+admin.site.register(Assessment_UploadJob, UploadJobAdmin)
+admin.site.register(Assessment_ChunkedUpload, ChunkedUploadAdmin)
+admin.site.register(Assessment_Template, AssessmentTemplateAdmin)
+admin.site.register(Assessment_Rejection, AssessmentRejectionAdmin)
+admin.site.register(Assessment_Subject, AssessmentSubjectAdmin)
+admin.site.register(Assessment_StepTiming, AssessmentStepTimingAdmin)
+admin.site.register(Assessment_DataKeys, AssessmentDataKeysAdmin)
@@ -0,0 +1,149 @@
+import pandas as pd
+from django.db.models import Avg, Count, Max, Min, Q
+from django.db.models.functions import TruncMonth
+
+from .models import Assessment_Base
+
+'''
+考核信息的分组统计
+看板原先请求 unpaged-data 拿到全部记录，再在浏览器里按班组、线路、车型、月份计算合格率和优秀率
+这里在数据库中按维度分组计算记录数、考核结果分布和整体用时的平均值，只返回每组的统计结果
+SQLite 没有百分位数函数，整体用时的百分位数只读取分组字段和秒数两列，用 pandas 整列分组计算
+'''
+
+# 可以分组的维度，month 为记录日期所在的月份
+GROUP_DIMENSIONS = ['crew_group', 'train_line', 'train_model', 'assessment_item', 'month']
+
+# 统计指标：记录数、考核结果分布（包括合格率和优秀率）、整体用时
+COUNT_METRIC = 'count'
+RESULTS_METRIC = 'results'
+TOTAL_SECONDS_METRIC = 'total_seconds'
+METRICS = [COUNT_METRIC, RESULTS_METRIC, TOTAL_SECONDS_METRIC]
+
+# 默认计算的整体用时百分位数
+DEFAULT_PERCENTILES = [50, 90]
+
+# 计入合格率的考核结果
+PASSING_RESULTS = [Assessment_Base.EXCELLENT, Assessment_Base.QUALIFIED]
+
+
+def _split_param(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+'''
+解析统计参数，参数不合法时抛出 ValueError
+group_by 为逗号分隔的分组维度，不提供时统计全部记录；metrics 为逗号分隔的指标，默认全部
+percentiles 为逗号分隔的 0 到 100 之间的整体用时百分位数
+'''
+def parse_aggregation_params(params):
+    group_by = _split_param(params.get('group_by'))
+    unknown = [dimension for dimension in group_by if dimension not in GROUP_DIMENSIONS]
+    if unknown:
+        raise ValueError(f'不支持的分组维度: {", ".join(unknown)}，可选: {", ".join(GROUP_DIMENSIONS)}')
+    if len(set(group_by)) != len(group_by):
+        raise ValueError('分组维度不能重复')
+
+    metrics = _split_param(params.get('metrics')) or METRICS
+    unknown = [metric for metric in metrics if metric not in METRICS]
+    if unknown:
+        raise ValueError(f'不支持的统计指标: {", ".join(unknown)}，可选: {", ".join(METRICS)}')
+
+    try:
+        percentiles = [float(value) for value in _split_param(params.get('percentiles'))] or DEFAULT_PERCENTILES
+    except ValueError:
+        raise ValueError('百分位数必须是数字')
+    if any(not 0 <= value <= 100 for value in percentiles):
+        raise ValueError('百分位数必须在 0 到 100 之间')
+    return group_by, metrics, percentiles
+
+
+def _percentile_name(value):
+    return f'p{value:g}'
+
+
+# 分组字段的取值：月份输出为 YYYY-MM，pandas 分组后的空值还原为 None
+def _dimension_value(dimension, value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if dimension == 'month':
+        return value.strftime('%Y-%m')
+    return value
+
+
+# 在 pandas 中按分组计算整体用时的百分位数，返回 {分组键: {pXX: 秒数}}
+def _total_seconds_percentiles(queryset, group_by, percentiles):
+    rows = queryset.filter(total_seconds__isnull=False).values_list(*group_by, 'total_seconds')
+    frame = pd.DataFrame.from_records(list(rows), columns=[*group_by, 'total_seconds'])
+    if frame.empty:
+        return {}
+    quantiles = [value / 100 for value in percentiles]
+    names = [_percentile_name(value) for value in percentiles]
+    if not group_by:
+        values = frame['total_seconds'].quantile(quantiles).tolist()
+        return {(): dict(zip(names, values))}
+
+    # 空值也作为一个分组，与数据库中 GROUP BY 的结果对应
+    table = frame.groupby(group_by, dropna=False)['total_seconds'].quantile(quantiles).unstack()
+    result = {}
+    for key, values in zip(table.index, table.to_numpy().tolist()):
+        key = key if isinstance(key, tuple) else (key,)
+        key = tuple(_dimension_value(dimension, value) for dimension, value in zip(group_by, key))
+        result[key] = dict(zip(names, values))
+    return result
+
+
+'''
+按 group_by 分组统计 queryset 中的记录，返回每组一个字典
+每组包含分组字段、记录数 count，以及按 metrics 计算的：
+results：各考核结果的记录数，以及合格率 pass_rate（优秀和合格）和优秀率 excellent_rate
+total_seconds：有整体用时的记录数、平均值、最小值、最大值和各百分位数
+'''
+def aggregate_assessments(queryset, group_by=(), metrics=METRICS, percentiles=DEFAULT_PERCENTILES):
+    group_by = list(group_by)
+    queryset = queryset.order_by()
+    if 'month' in group_by:
+        queryset = queryset.annotate(month=TruncMonth('record_date'))
+
+    annotations = {'count': Count('id')}
+    if RESULTS_METRIC in metrics:
+        for value, _ in Assessment_Base.ASSESSMENT_RESULTS:
+            annotations[f'result_{value}'] = Count('id', filter=Q(assessment_result=value))
+    if TOTAL_SECONDS_METRIC in metrics:
+        annotations.update(
+            timed=Count('total_seconds'), mean_seconds=Avg('total_seconds'),
+            min_seconds=Min('total_seconds'), max_seconds=Max('total_seconds'),
+        )
+
+    if group_by:
+        rows = list(queryset.values(*group_by).annotate(**annotations).order_by(*group_by))
+    else:
+        rows = [queryset.aggregate(**annotations)]
+    percentile_values = _total_seconds_percentiles(queryset, group_by, percentiles) if TOTAL_SECONDS_METRIC in metrics else {}
+
+    groups = []
+    for row in rows:
+        key = tuple(_dimension_value(dimension, row[dimension]) for dimension in group_by)
+        group = dict(zip(group_by, key))
+        count = row['count']
+        group['count'] = count
+
+        if RESULTS_METRIC in metrics:
+            results = {label: row[f'result_{value}'] for value, label in Assessment_Base.ASSESSMENT_RESULTS}
+            passing = sum(row[f'result_{value}'] for value in PASSING_RESULTS)
+            group['results'] = results
+            group['pass_rate'] = round(passing / count, 4) if count else None
+            group['excellent_rate'] = round(row[f'result_{Assessment_Base.EXCELLENT}'] / count, 4) if count else None
+
+        if TOTAL_SECONDS_METRIC in metrics:
+            timing = {
+                'count': row['timed'],
+                'mean': None if row['mean_seconds'] is None else round(row['mean_seconds'], 2),
+                'min': row['min_seconds'],
+                'max': row['max_seconds'],
+            }
+            timing.update({_percentile_name(value): None for value in percentiles})
+            timing.update({name: round(value, 2) for name, value in percentile_values.get(key, {}).items()})
+            group['total_seconds'] = timing
+        groups.append(group)
+    return groups
@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+# SQLite 默认的回滚日志模式下，写事务提交时会阻塞所有读取
+# 切换为 WAL 模式后读取不再被写入阻塞，上传文件时列表和图表查询可以正常进行
+def enable_sqlite_wal(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL;')
 
 
 class UploadConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "upload"
+
+    def ready(self):
+        connection_created.connect(enable_sqlite_wal)
@@ -0,0 +1,54 @@
+import io
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from upload.ingestion import ingest_upload
+from upload.models import Assessment_Base
+from upload.serializers import AssessmentBaseSerializer, assessment_base_data, assessment_base_values
+
+from .bench_upload import clear_uploaded_data
+from .synthetic import generate_assessment_csv
+
+'''
+只读列表的序列化基准
+比较原先的 AssessmentBaseSerializer(many=True) 与 assessment_base_values 的快速序列化把同一批记录渲染为 JSON 的耗时
+两种方式渲染出的 JSON 必须完全相同，否则基准直接报错
+'''
+
+
+def _render_serializer(queryset):
+    return JSONRenderer().render(AssessmentBaseSerializer(queryset, many=True).data)
+
+
+def _render_values(queryset):
+    return JSONRenderer().render(assessment_base_data(assessment_base_values(queryset)))
+
+
+'''
+写入一个 rows 行的合成考核文件，分别用两种方式读取并渲染全部记录，每种方式运行 repeat 次取最短的一次
+返回实际的记录数、两种方式的耗时和每秒记录数，以及快速序列化的加速比
+'''
+def run_read_case(rows, steps=10, seed=0, repeat=3):
+    clear_uploaded_data()
+    content, _ = generate_assessment_csv(rows, steps=steps, seed=seed)
+    ingest_upload(io.BytesIO(content), f'bench_read_{rows}.csv')
+    queryset = Assessment_Base.objects.published()
+    records = queryset.count()
+
+    renderers = {'serializer': _render_serializer, 'values': _render_values}
+    result = {'rows': rows, 'records': records, 'steps': steps}
+    outputs = {}
+    for name, render in renderers.items():
+        elapsed = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            outputs[name] = render(queryset.all())
+            elapsed.append(time.perf_counter() - start)
+        result[name] = {'seconds': round(min(elapsed), 3), 'rows_per_second': round(records / min(elapsed))}
+    clear_uploaded_data()
+
+    if outputs['serializer'] != outputs['values']:
+        raise RuntimeError('快速序列化的结果与 AssessmentBaseSerializer 不一致')
+    result['speedup'] = round(result['serializer']['seconds'] / result['values']['seconds'], 1)
+    return result
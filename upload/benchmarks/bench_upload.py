@@ -0,0 +1,170 @@
+import io
+import json
+import resource
+import time
+import tracemalloc
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from rest_framework.test import APIRequestFactory
+
+import pandas as pd
+
+from upload.models import Assessment_Base, Assessment_Classification, Assessment_File, Assessment_Rejection, Assessment_StepTiming, Assessment_Subject
+from upload.readers import pa_csv, read_arrow_frame, read_csv_frame
+from upload.views import AssessmentUploadView
+
+from .synthetic import generate_assessment_csv
+
+'''
+上传接口的性能基准
+每个用例按给定的总行数生成若干个不同编码的合成考核文件，在一次请求中交给 AssessmentUploadView 处理
+记录耗时换算出的每秒行数、执行的 SQL 语句数，以及处理请求期间 Python 堆内存（包括 NumPy 数组）的峰值
+内存峰值用 tracemalloc 单独再跑一遍测得，避免追踪内存拖慢计时
+解析基准只比较各解析器读取同一个文件的耗时，不访问数据库
+'''
+
+# 默认的用例规模（总行数），100 万行的用例通过 --rows 指定
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# 每个用例中各文件依次使用的编码
+DEFAULT_ENCODINGS = ['utf-8-sig', 'gb18030', 'utf-8']
+
+
+# 只统计执行的 SQL 语句数量，不像 CaptureQueriesContext 那样保存每条语句，大文件的批量写入语句很长
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+# 每个用例的文件列表：总行数平均分给各个编码的文件
+def build_case_files(rows, encodings=DEFAULT_ENCODINGS, steps=10, seed=0):
+    files = []
+    for index, encoding in enumerate(encodings):
+        file_rows = rows // len(encodings) + (1 if index < rows % len(encodings) else 0)
+        content, stats = generate_assessment_csv(file_rows, steps=steps, seed=seed + index, encoding=encoding)
+        files.append((f'bench_{rows}_{index}_{encoding}.csv', content, stats))
+    return files
+
+
+# 用例之间清空上传的数据；基准数据库中没有分类信息，直接删除整张表，不经过 ORM 逐条收集级联删除的对象
+def clear_uploaded_data():
+    with connection.cursor() as cursor:
+        for model in (Assessment_Classification, Assessment_StepTiming, Assessment_Base, Assessment_File, Assessment_Rejection, Assessment_Subject):
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
+
+
+# 请求体在开始计时和追踪内存之前构造好，测得的只是视图处理上传的开销
+def _upload_request(files):
+    uploads = [SimpleUploadedFile(file_name, content, content_type='text/csv') for file_name, content, _ in files]
+    return APIRequestFactory().post('/api/upload-assessment/', {'file': uploads}, format='multipart')
+
+
+def _run_view(files, trace_memory=False):
+    request = _upload_request(files)
+    counter = QueryCounter()
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = AssessmentUploadView.as_view()(request)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    if response.status_code != 201:
+        raise RuntimeError(f'上传失败: {response.status_code} {response.data}')
+    return response, elapsed, counter.count, peak
+
+
+'''
+运行一个用例，返回结果字典
+rows_per_second 按生成的总行数计算，queries 为执行的 SQL 语句数
+peak_memory_mb 为 tracemalloc 测得的内存峰值，max_rss_mb 为进程到目前为止的最大常驻内存
+'''
+def run_case(rows, encodings=DEFAULT_ENCODINGS, steps=10, seed=0, measure_memory=True):
+    files = build_case_files(rows, encodings, steps, seed)
+    expected_rows = sum(stats['expected_rows'] for _, _, stats in files)
+
+    clear_uploaded_data()
+    response, elapsed, queries, _ = _run_view(files)
+    written_rows = sum(result['rows_written'] for result in response.data['files'])
+
+    peak = None
+    if measure_memory:
+        clear_uploaded_data()
+        _, _, _, peak = _run_view(files, trace_memory=True)
+    clear_uploaded_data()
+
+    return {
+        'rows': rows,
+        'files': len(files),
+        'expected_rows': expected_rows,
+        'written_rows': written_rows,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed),
+        'queries': queries,
+        'peak_memory_mb': None if peak is None else round(peak / 1024 / 1024, 1),
+        # Linux 下 ru_maxrss 的单位是 KB
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+'''
+与之前保存的基准结果比较，返回每秒行数下降或 SQL 语句数增加超过 tolerance 的用例说明
+只比较两次都有的用例规模
+'''
+def find_regressions(results, baseline, tolerance=0.2):
+    baseline = {result['rows']: result for result in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline.get(result['rows'])
+        if previous is None:
+            continue
+        if result['rows_per_second'] < previous['rows_per_second'] * (1 - tolerance):
+            regressions.append(
+                f"{result['rows']} 行: {previous['rows_per_second']} -> {result['rows_per_second']} 行/秒"
+            )
+        if result['queries'] > previous['queries'] * (1 + tolerance):
+            regressions.append(f"{result['rows']} 行: SQL 语句 {previous['queries']} -> {result['queries']} 条")
+    return regressions
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_results(results, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
+
+
+'''
+解析基准：比较原先逐列推断类型的 pd.read_csv、按声明类型读取的 pandas 解析器和 pyarrow 解析器读取同一个文件的耗时
+每个解析器读取 repeat 次取最短的一次，返回每个解析器的耗时和每秒行数
+'''
+def run_parse_case(rows, steps=40, encoding='utf-8', seed=0, repeat=3):
+    content, _ = generate_assessment_csv(rows, steps=steps, seed=seed, encoding=encoding)
+    parsers = {
+        'pandas_inferred': lambda source: pd.read_csv(source, header=1, encoding=encoding),
+        'pandas_schema': lambda source: read_csv_frame(source, encoding),
+    }
+    if pa_csv is not None:
+        parsers['pyarrow'] = lambda source: read_arrow_frame(source, encoding)
+
+    result = {'rows': rows, 'steps': steps, 'encoding': encoding, 'megabytes': round(len(content) / 1024 / 1024, 1)}
+    for name, parse in parsers.items():
+        elapsed = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            parse(io.BytesIO(content))
+            elapsed.append(time.perf_counter() - start)
+        result[name] = {'seconds': round(min(elapsed), 3), 'rows_per_second': round(rows / min(elapsed))}
+    return result
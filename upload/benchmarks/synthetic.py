@@ -0,0 +1,92 @@
+import csv
+import io
+import random
+
+'''
+合成考核 CSV 生成器，用于上传性能基准和测试
+生成的文件与各车辆段导出的考核表结构一致：第一行是表格标题，第二行是列名，"整体用时"及其后的各步骤用时列存入 additional_data
+按比例混入同一人重复填写的记录、不合法的工作证编号和格式错误的日期，同样的参数和随机种子总是生成相同的内容
+'''
+
+TRAIN_MODELS = ['01A', '02A', '03B', '04B', '06C', '10A', '12B']
+ASSESSMENT_ITEMS = ['客室车门故障处理', '受电弓故障处理', '紧急制动', '逃生门释放', '牵引故障处理', '列车救援']
+CREW_GROUPS = ['乘务一组', '乘务二组', '乘务三组', '乘务四组', '早高峰组', '晚高峰组']
+ASSESSMENT_RESULTS = ['优秀', '合格', '合格', '合格', '不合格', '']
+STEP_ACTIONS = ['确认故障信息', '报告行车调度', '检查车门状态', '切除故障设备', '复位断路器', '广播通知乘客', '试拉确认', '恢复运营']
+SURNAMES = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗'
+GIVEN_NAMES = '伟芳娜敏静丽强磊军洋勇艳杰涛明超秀霞平刚桂'
+
+# 不合法的工作证编号：非数字、不足五位、空值
+BAD_NUMBERS = ['abc', '1234', '', 'N/A']
+# 格式错误的日期
+BAD_DATES = ['2023-13-01', '20231345', '昨天']
+
+
+def step_columns(steps):
+    return [f'步骤{index + 1}{STEP_ACTIONS[index % len(STEP_ACTIONS)]}' for index in range(steps)]
+
+
+# 整体用时的两种写法：秒数，或者 分:秒
+def _format_seconds(seconds, time_format):
+    if time_format == 'clock':
+        return f'{seconds // 60}:{seconds % 60:02d}'
+    return str(seconds)
+
+
+'''
+生成一个合成考核 CSV 文件，返回文件内容的字节串和统计信息
+rows 为数据行数，steps 为步骤用时列数，encoding 为文件编码
+duplicate_ratio 为同一人同一科目重复填写的比例，bad_number_ratio 和 bad_date_ratio 为不合法的工作证编号和日期的比例
+统计信息中的 expected_rows 为按入库规则判重、校验后应写入的记录数
+'''
+def generate_assessment_csv(rows, steps=10, seed=0, encoding='utf-8', duplicate_ratio=0.05,
+                            bad_number_ratio=0.01, bad_date_ratio=0.005, time_format='seconds'):
+    rnd = random.Random(seed)
+    columns = ['日期', '乘务班组', '姓名', '工作证编号', '车型', '考核项目', '考核结果', '备注', '整体用时'] + step_columns(steps)
+
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(['乘务考核记录表'] + [''] * (len(columns) - 1))
+    writer.writerow(columns)
+
+    # 约三分之一的行数作为人数，每人平均参加三个科目的考核
+    people = [
+        (rnd.choice(SURNAMES) + rnd.choice(GIVEN_NAMES) + rnd.choice(GIVEN_NAMES), str(10000 + index))
+        for index in range(max(rows // 3, 1))
+    ]
+    # 已经出现过的 (姓名, 工作证编号, 车型, 考核项目)，重复填写的记录从中抽取
+    written = []
+    # 每个判重键最后一次出现的行是否有效，与入库时按 姓名、工作证编号、车型、考核项目 判重并保留最后一条一致
+    last_valid = {}
+    stats = {'rows': rows, 'duplicates': 0, 'bad_numbers': 0, 'bad_dates': 0}
+
+    for _ in range(rows):
+        if written and rnd.random() < duplicate_ratio:
+            name, number, train_model, assessment_item = rnd.choice(written)
+            stats['duplicates'] += 1
+        else:
+            name, number = rnd.choice(people)
+            train_model, assessment_item = rnd.choice(TRAIN_MODELS), rnd.choice(ASSESSMENT_ITEMS)
+            if (name, number, train_model, assessment_item) not in last_valid:
+                written.append((name, number, train_model, assessment_item))
+        valid = True
+        if rnd.random() < bad_number_ratio:
+            number = rnd.choice(BAD_NUMBERS)
+            stats['bad_numbers'] += 1
+            valid = False
+        record_date = f'2023{rnd.randint(1, 12):02d}{rnd.randint(1, 28):02d}'
+        if rnd.random() < bad_date_ratio:
+            record_date = rnd.choice(BAD_DATES)
+            stats['bad_dates'] += 1
+            valid = False
+
+        step_seconds = [rnd.randint(5, 90) for _ in range(steps)]
+        writer.writerow([
+            record_date, rnd.choice(CREW_GROUPS), name, number, train_model, assessment_item,
+            rnd.choice(ASSESSMENT_RESULTS), '', _format_seconds(sum(step_seconds), time_format),
+        ] + step_seconds)
+
+        last_valid[(name, number or None, train_model, assessment_item)] = valid
+
+    stats['expected_rows'] = sum(last_valid.values())
+    return output.getvalue().encode(encoding), stats
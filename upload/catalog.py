@@ -0,0 +1,50 @@
+import operator
+from functools import reduce
+
+from django.db.models import Count, Max, Min, Q
+
+from .models import Assessment_Base, Assessment_Subject
+
+'''
+科目目录的增量维护
+前端的科目选项框原先每次都对整张 Assessment_Base 做 DISTINCT (车型, 考核项目)
+现在由 Assessment_Subject 为每个科目保存已发布的记录数和最早、最晚日期，选项框直接读取这张小表
+发布、增量写入文件和通过接口增删改记录时，只重新统计受影响的科目，每个科目的统计都在 (车型, 考核项目, 日期) 索引上完成
+调用方负责把写入记录和刷新科目放在同一个事务中
+'''
+
+# 每条统计语句最多包含的科目数量
+SUBJECTS_PER_QUERY = 100
+
+
+# 一个文件已发布的记录涉及的科目
+def file_subjects(file_name):
+    return set(
+        Assessment_Base.objects.published().filter(file_name=file_name)
+        .values_list('train_model', 'assessment_item').distinct().order_by()
+    )
+
+
+# 重新统计给定科目的记录数和日期范围，已经没有记录的科目从目录中删除
+def refresh_subjects(subjects):
+    subjects = list(set(subjects))
+    for start in range(0, len(subjects), SUBJECTS_PER_QUERY):
+        batch = subjects[start:start + SUBJECTS_PER_QUERY]
+        conditions = reduce(operator.or_, (Q(train_model=train_model, assessment_item=assessment_item) for train_model, assessment_item in batch))
+        stats = (
+            Assessment_Base.objects.published().filter(conditions)
+            .values('train_model', 'assessment_item').order_by()
+            .annotate(row_count=Count('id'), first_date=Min('record_date'), last_date=Max('record_date'))
+        )
+        Assessment_Subject.objects.filter(conditions).delete()
+        Assessment_Subject.objects.bulk_create([Assessment_Subject(**row) for row in stats])
+
+
+# 按全部已发布的记录重建科目目录
+def rebuild_subjects():
+    Assessment_Subject.objects.all().delete()
+    Assessment_Subject.objects.bulk_create([
+        Assessment_Subject(**row) for row in
+        Assessment_Base.objects.published().values('train_model', 'assessment_item').order_by()
+        .annotate(row_count=Count('id'), first_date=Min('record_date'), last_date=Max('record_date'))
+    ])
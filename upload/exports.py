@@ -0,0 +1,68 @@
+import csv
+import io
+import itertools
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .serializers import ASSESSMENT_BASE_FIELDS, assessment_base_row, assessment_base_values
+
+'''
+考核信息的流式导出
+原先 unpaged-data 用 AssessmentBaseSerializer(many=True) 把整个查询结果序列化成一个列表再返回，一年的数据要占几百 MB 内存
+这里用 assessment_base_values 的 .iterator() 按块从数据库读取，每读一块就编码成 NDJSON 或 CSV 交给 StreamingHttpResponse 发送
+第一块数据读出后立即开始响应，内存占用只与块的大小有关
+'''
+
+# 每次从数据库读取、编码并发送的记录数
+EXPORT_CHUNK_SIZE = 2000
+
+# 导出的字段，与 AssessmentBaseSerializer 返回的字段一致，trainLines 为车型的前两位，即线路编号
+EXPORT_COLUMNS = ASSESSMENT_BASE_FIELDS
+
+NDJSON_FORMAT = 'ndjson'
+CSV_FORMAT = 'csv'
+EXPORT_CONTENT_TYPES = {
+    NDJSON_FORMAT: 'application/x-ndjson; charset=utf-8',
+    CSV_FORMAT: 'text/csv; charset=utf-8',
+}
+
+
+# 按块读取查询结果，每块为 assessment_base_values 返回的带字段名的元组列表
+def iter_export_chunks(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    rows = assessment_base_values(queryset).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# 每行一个 JSON 对象，日期按 ISO 格式输出，与接口返回的 JSON 一致
+def stream_ndjson(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for chunk in iter_export_chunks(queryset, chunk_size):
+        yield ''.join(encoder.encode(assessment_base_row(row)) + '\n' for row in chunk)
+
+
+# CSV 以 UTF-8 BOM 开头，Excel 直接打开不会乱码；additional_data 按 JSON 文本写入一列
+def stream_csv(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(EXPORT_COLUMNS)
+    yield '\ufeff' + buffer.getvalue()
+    for chunk in iter_export_chunks(queryset, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        for row in chunk:
+            data = assessment_base_row(row)
+            if data['additional_data'] is not None:
+                data['additional_data'] = json.dumps(data['additional_data'], ensure_ascii=False)
+            writer.writerow([data[column] for column in EXPORT_COLUMNS])
+        yield buffer.getvalue()
+
+
+EXPORT_STREAMS = {
+    NDJSON_FORMAT: stream_ndjson,
+    CSV_FORMAT: stream_csv,
+}
@@ -0,0 +1,888 @@
+import hashlib
+import operator
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import closing
+from datetime import date, datetime
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .catalog import file_subjects, refresh_subjects
+from .models import (
+    CLOCK_PATTERN, TIME_COLUMNS, TRAIN_LINE_LENGTH, Assessment_Base, Assessment_File, Assessment_Rejection, Assessment_StepTiming,
+    Assessment_Template, Assessment_UploadJob, data_keys_signature, insert_step_timings, register_data_keys,
+)
+from .readers import (
+    CHUNK_SIZE, PANDAS_ENGINE, PARSE_ERRORS, compute_content_hash, open_source, parse_candidates, read_chunks, read_frame,
+)
+
+'''
+考核文件入库的核心逻辑
+原先在视图里用 df.iterrows() 逐行校验、逐行 Assessment_Base.objects.create()，每条记录一次 INSERT
+这里把工作证编号校验、日期解析、高峰班组归一、考核结果映射都改为整列的 pandas/NumPy 运算
+清洗完成后再用 bulk_create 分批写入数据库
+大文件按分块读取、分块清洗写入，内存占用不随文件大小增长
+'''
+
+# 考核结果文本到数据库整数的映射，未知的考核结果统一记为“其他”
+ASSESSMENT_RESULT_MAPPING = {
+    '优秀': Assessment_Base.EXCELLENT,
+    '合格': Assessment_Base.QUALIFIED,
+    '不合格': Assessment_Base.NOT_QUALIFIED,
+}
+
+# 单科目单人重复填写时用于判重的字段
+DEDUP_COLUMNS = ['姓名', '工作证编号', '车型', '考核项目']
+
+# 文件中必须包含的列，缺少时整个文件不写入，也不替换之前的数据
+REQUIRED_COLUMNS = DEDUP_COLUMNS
+
+# bulk_create 每批写入的记录数
+BATCH_SIZE = 2000
+
+# 上传结果中每个跳过原因最多返回的行号数量
+REJECTION_SAMPLE_SIZE = 20
+# 跳过的行保存的原始值的最大长度
+REJECTION_VALUE_LENGTH = 100
+
+# 跨分块删除重复记录时，每条 DELETE 语句最多包含的判重键数量
+DELETE_KEYS_PER_QUERY = 200
+
+# 发布后删除被替换的旧记录时，每条 DELETE 语句最多删除的记录数
+SUPERSEDED_ROWS_PER_DELETE = 2000
+
+# 批量插入不返回主键时按工作证编号查询刚写入的记录，每条 SQL 语句最多包含的工作证编号数量
+ID_LOOKUP_NUMBERS_PER_QUERY = 500
+
+# 查询文件上次写入的记录时，每条 SQL 语句最多包含的文件名数量，批量导入目录时文件数可能有上万个
+FILE_NAMES_PER_QUERY = 500
+
+# 清洗后的 DataFrame 中步骤用时列的列名前缀，之后是 additional_data 中的步骤名
+STEP_COLUMN_PREFIX = 'step:'
+
+# 并行处理时同时提交给进程池的文件数为进程数的倍数，清洗好等待写入的文件占用内存，不一次提交全部文件
+PARALLEL_FILES_PER_WORKER = 2
+
+
+# 找到"整体耗时"或"整体用时"这一列，返回需要存入 additional_data 的列
+def get_additional_columns(columns):
+    for time_column in TIME_COLUMNS:
+        if time_column in columns:
+            return columns[columns.index(time_column):]
+    # 如果两列都不存在，所有列都已经拆分到模型字段中，additional_data 为空
+    return []
+
+
+# 进程内缓存的考核模板，键为 (考核项目, 表头签名)；模板创建后不再修改，不需要失效
+_template_cache = {}
+
+
+def header_signature(columns):
+    return hashlib.sha256('\x1f'.join(columns).encode('utf-8')).hexdigest()
+
+
+# 取 DataFrame 中第一个非空的考核项目，作为查找考核模板的键
+def first_assessment_item(df):
+    if '考核项目' not in df.columns:
+        return None
+    items = df['考核项目'].dropna()
+    return str(items.iloc[0]) if len(items) else None
+
+
+'''
+按考核项目和表头查找考核模板，依次查找进程内缓存和数据库
+第一次遇到的模板才查找整体用时列，并把得到的列映射保存为新模板，之后同样的文件直接使用
+每次都确认模板中存入 additional_data 的列已经登记为列名字典，之后写入的记录引用这组列名
+'''
+def get_assessment_template(columns, assessment_item):
+    columns = [str(column) for column in columns]
+    key = (assessment_item, header_signature(columns))
+    template = _template_cache.get(key)
+    if template is None:
+        template, _ = Assessment_Template.objects.get_or_create(
+            assessment_item=assessment_item, header_signature=key[1],
+            defaults={'columns': columns, 'additional_columns': get_additional_columns(columns)},
+        )
+        _template_cache[key] = template
+    register_data_keys(template.additional_columns)
+    return template
+
+
+# 已知考核模板的列映射，键为 (考核项目, 表头签名)，可以传给不访问数据库的子进程
+def get_template_columns():
+    return {
+        (template.assessment_item, template.header_signature): template.additional_columns
+        for template in Assessment_Template.objects.all()
+    }
+
+
+# 将一列转换为 object 类型，并把缺失值统一替换为 None
+def _to_python(series):
+    series = series.astype(object)
+    return series.where(series.notna(), None)
+
+
+# 整列处理工作证编号：等价于逐行的 str(int(value)) 再用 ^\d{5,}$ 校验
+def normalize_work_certificate_numbers(series):
+    if series.dtype == object:
+        series = series.astype(str).str.strip()
+    numeric = pd.to_numeric(series, errors='coerce')
+    numeric = numeric.where(np.isfinite(numeric))
+    # int() 对小数是向零截断，至少五位数字即数值不小于 10000
+    numbers = np.trunc(numeric)
+    valid = numbers >= 10000
+    return numbers, valid
+
+
+# 整列解析记录日期：将数据中的 20231110 转换为 2023-11-10
+def parse_record_dates(df):
+    if '记录日期' in df.columns and '日期' in df.columns:
+        raw = df['记录日期'].where(df['记录日期'].notna(), df['日期'])
+    elif '记录日期' in df.columns:
+        raw = df['记录日期']
+    elif '日期' in df.columns:
+        raw = df['日期']
+    else:
+        raw = pd.Series(None, index=df.index, dtype=object)
+
+    present = raw.notna()
+    # Excel 中的日期单元格直接读出为日期类型，不需要再解析
+    if pd.api.types.is_datetime64_any_dtype(raw):
+        dates = raw.dt.normalize()
+        return dates, raw, ~present | dates.notna()
+    cell_dates = None
+    if raw.dtype == object:
+        is_cell_date = raw.map(lambda value: isinstance(value, (date, datetime)))
+        if is_cell_date.any():
+            cell_dates = pd.to_datetime(raw.where(is_cell_date), errors='coerce').dt.normalize()
+            raw = raw.mask(is_cell_date, None)
+
+    # 数字类型的日期列如果含有空值会被 pandas 读成浮点数，这里先还原成整数文本
+    numeric = pd.to_numeric(raw, errors='coerce')
+    integral = numeric.notna() & (numeric == np.trunc(numeric))
+    text = raw.astype(str).str.strip()
+    text = text.where(~integral, numeric.where(integral).astype('Int64').astype(str))
+
+    dates = pd.to_datetime(text.where(raw.notna()), format='%Y%m%d', errors='coerce')
+    if cell_dates is not None:
+        dates = dates.fillna(cell_dates)
+    valid = ~present | dates.notna()
+    return dates, raw, valid
+
+
+# 检查文件是否包含必需的列，缺少时抛出 ValueError
+def check_required_columns(df, file_name):
+    missing = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f'文件 {file_name} 缺少必需的列: {", ".join(missing)}')
+
+
+# 没有数据行的文件不能发布，否则会用一个空版本替换之前的数据
+def check_has_rows(rows_read, file_name):
+    if rows_read == 0:
+        raise ValueError(f'文件 {file_name} 没有数据行!')
+
+
+# 去掉备注列并在当前 DataFrame 内去重
+def prepare_assessment_frame(df):
+    if '备注' in df.columns:
+        df = df.drop('备注', axis=1)
+    '''
+    科目的定义：09A02逃生门释放和收回
+    单科目单人重复填写，只保留最后一次的记录，按文件中的先后顺序保留最后出现的记录
+    判重键与跨分块判重使用的 assessment_frame_keys 相同，工作证编号按入库后的整数比较
+    10001 和 10001.0 是同一个人，去重的结果不随分块的边界变化
+    '''
+    return df[~dedup_key_frame(df).duplicated(keep='last')]
+
+
+# 当前 DataFrame 各行的判重键，工作证编号合法时为入库后的整数文本，不合法的保留去掉首尾空白的原文
+def dedup_key_frame(df):
+    numbers, valid = normalize_work_certificate_numbers(df['工作证编号'])
+    raw_numbers = df['工作证编号'].astype(str).str.strip().where(df['工作证编号'].notna(), None)
+    return pd.DataFrame({
+        'name': _key_text(df['姓名']),
+        'work_certificate_number': numbers.where(valid).astype('Int64').astype(str).where(valid, raw_numbers),
+        'train_model': _key_text(df['车型']),
+        'assessment_item': _key_text(df['考核项目']),
+    }, index=df.index)
+
+
+# 将判重字段统一转换为入库后的文本形式，保证不同分块推断出的列类型不影响判重
+def _key_text(series):
+    return series.astype(str).where(series.notna(), None)
+
+
+# 计算工作证编号合法的行的判重键 (姓名, 工作证编号, 车型, 考核项目)
+def assessment_frame_keys(df):
+    work_certificate_numbers, valid_numbers = normalize_work_certificate_numbers(df['工作证编号'])
+    df = df[valid_numbers]
+    return set(zip(
+        _key_text(df['姓名']), work_certificate_numbers[valid_numbers].astype('int64'),
+        _key_text(df['车型']), _key_text(df['考核项目']),
+    ))
+
+
+class RejectedRows:
+    '''
+    收集一个文件中被跳过的行，代替原先每跳过一行就 print 一次
+    按整列的掩码一次记录一批行号、原因和原始值，文件成功写入后由 save 一次批量写入 Assessment_Rejection
+    同时记录各行的判重键，后续分块中出现同一人同一科目的记录时由 discard_keys 去掉，与整个文件一起判重的结果一致
+    只保存普通的列表，可以从子进程返回给主进程
+    '''
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self._rows = []
+
+    # keys 为 values 各行的 dedup_key_frame
+    def add(self, reason, values, keys):
+        if len(values):
+            text = values.astype(object).where(values.notna(), '').astype(str).str.slice(0, REJECTION_VALUE_LENGTH)
+            self._rows.append((reason, values.index.tolist(), text.tolist(), list(keys.loc[values.index].itertuples(index=False, name=None))))
+
+    # 去掉被后续分块中的记录覆盖的行
+    def discard_keys(self, keys):
+        rows = []
+        for reason, indexes, texts, row_keys in self._rows:
+            kept = [position for position, key in enumerate(row_keys) if key not in keys]
+            if kept:
+                rows.append((reason, [indexes[i] for i in kept], [texts[i] for i in kept], [row_keys[i] for i in kept]))
+        self._rows = rows
+
+    def __len__(self):
+        return sum(len(indexes) for _, indexes, _, _ in self._rows)
+
+    # 各原因跳过的行数，以及每个原因最前面的若干个行号
+    def summary(self, sample_size=REJECTION_SAMPLE_SIZE):
+        reasons = {}
+        for reason, indexes, _, _ in self._rows:
+            entry = reasons.setdefault(reason, {'count': 0, 'rows': []})
+            entry['count'] += len(indexes)
+            entry['rows'].extend(indexes)
+        for entry in reasons.values():
+            entry['rows'] = sorted(entry['rows'])[:sample_size]
+        return {'total': len(self), 'reasons': reasons}
+
+    # 在发布文件的事务中调用，替换该文件之前记录的跳过的行
+    def save(self, batch_size=BATCH_SIZE):
+        Assessment_Rejection.objects.filter(file_name=self.file_name).delete()
+        Assessment_Rejection.objects.bulk_create([
+            Assessment_Rejection(file_name=self.file_name, row_index=index, reason=reason, value=value)
+            for reason, indexes, values, _ in self._rows
+            for index, value in zip(indexes, values)
+        ], batch_size=batch_size)
+
+
+# 对已去重的 DataFrame 进行清洗，返回与 Assessment_Base 字段一一对应的 DataFrame
+# additional_columns 为考核模板中存入 additional_data 的列，没有提供时按表头查找整体用时列
+# rejections 为收集被跳过的行的 RejectedRows
+def clean_assessment_frame(df, file_name, additional_columns=None, rejections=None):
+    work_certificate_numbers, valid_numbers = normalize_work_certificate_numbers(df['工作证编号'])
+    record_dates, raw_dates, valid_dates = parse_record_dates(df)
+
+    # 被跳过的行按原因整列记录，工作证编号不合法的行不再检查日期
+    if rejections is not None:
+        rejected = ~(valid_numbers & valid_dates)
+        keys = dedup_key_frame(df[rejected]) if rejected.any() else None
+        rejections.add(Assessment_Rejection.INVALID_WORK_CERTIFICATE_NUMBER, df['工作证编号'][~valid_numbers], keys)
+        rejections.add(Assessment_Rejection.INVALID_RECORD_DATE, raw_dates[valid_numbers & ~valid_dates], keys)
+
+    keep = valid_numbers & valid_dates
+    df = df[keep]
+
+    cleaned = pd.DataFrame(index=df.index)
+    cleaned['record_date'] = _to_python(record_dates[keep].dt.date)
+
+    crew_group = df['乘务班组'] if '乘务班组' in df.columns else pd.Series(None, index=df.index, dtype=object)
+    peak = crew_group.notna() & crew_group.astype(str).str.contains('高峰', regex=False)
+    cleaned['crew_group'] = _to_python(crew_group.mask(peak, '乘务高峰组'))
+
+    cleaned['name'] = _to_python(df['姓名'])
+    cleaned['work_certificate_number'] = work_certificate_numbers[keep].astype('int64')
+    cleaned['train_model'] = _to_python(df['车型'])
+    # 线路编号整列取车型的前两位，车型不足两位的为空，与 train_line_of 一致
+    train_models = df['车型'].astype('string')
+    has_line = (train_models.str.len() >= TRAIN_LINE_LENGTH).fillna(False).astype(bool)
+    cleaned['train_line'] = _to_python(train_models.str.slice(0, TRAIN_LINE_LENGTH).where(has_line))
+    cleaned['assessment_item'] = _to_python(df['考核项目'])
+
+    results = df['考核结果'] if '考核结果' in df.columns else pd.Series(None, index=df.index, dtype=object)
+    cleaned['assessment_result'] = results.map(ASSESSMENT_RESULT_MAPPING).fillna(Assessment_Base.OTHER).astype('int64')
+
+    # additional_data 按列切片，每行只保存按列顺序排列的值，列名作为列名字典只保存一次，记录中保存其签名
+    if additional_columns is None:
+        additional_columns = get_additional_columns(df.columns.tolist())
+    if additional_columns:
+        additional = df[additional_columns].astype(object)
+        values = additional.where(additional.notna(), None).values.tolist()
+    else:
+        values = [[] for _ in range(len(df))]
+    cleaned['data_keys'] = data_keys_signature(additional_columns)
+    cleaned['data_values'] = pd.Series(values, index=df.index, dtype=object)
+    # 附加数据的第一列是整体用时，换算为秒数单独存一列
+    if additional_columns and additional_columns[0] in TIME_COLUMNS:
+        cleaned['total_seconds'] = _to_python(parse_duration_seconds(df[additional_columns[0]]))
+    else:
+        cleaned['total_seconds'] = pd.Series(None, index=df.index, dtype=object)
+
+    # 其余各列为步骤用时，每个步骤换算为一列秒数，写入记录后由 build_step_timings 展开为步骤用时表
+    steps = [column for column in additional_columns if column not in TIME_COLUMNS]
+    if steps:
+        step_seconds = pd.concat([parse_duration_seconds(df[column]) for column in steps], axis=1)
+        step_seconds.columns = [STEP_COLUMN_PREFIX + column for column in steps]
+        cleaned = pd.concat([cleaned, step_seconds], axis=1)
+
+    return cleaned
+
+
+# 整列换算用时的秒数，规则与 duration_seconds 相同：数字直接作为秒数，分:秒 和 时:分:秒 换算为秒数，其他为 NaN
+def parse_duration_seconds(series):
+    text = series.astype('string').str.strip()
+    seconds = pd.to_numeric(text, errors='coerce').astype('float64')
+    # 步骤用时大多是数字，只对不是数字的值再按 分:秒 和 时:分:秒 匹配
+    clock_text = text[seconds.isna() & text.notna()]
+    if clock_text.empty:
+        return seconds
+    clock = clock_text.str.extract(f'^{CLOCK_PATTERN}$').astype('float64')
+    clock_seconds = clock[0].fillna(0) * 3600 + clock[1] * 60 + clock[2]
+    return seconds.fillna(clock_seconds)
+
+
+# 将清洗后的 DataFrame 转换为未保存的模型实例，extra 为所有记录共用的字段值，例如暂存记录的发布状态和文件版本
+def build_assessment_objects(cleaned, file_name, **extra):
+    return [
+        Assessment_Base(
+            file_name=file_name,
+            record_date=record_date,
+            crew_group=crew_group,
+            name=name,
+            work_certificate_number=int(work_certificate_number),
+            train_model=train_model,
+            train_line=train_line,
+            assessment_item=assessment_item,
+            assessment_result=int(assessment_result),
+            data_keys_id=data_keys,
+            data_values=data_values,
+            total_seconds=total_seconds,
+            **extra,
+        )
+        for record_date, crew_group, name, work_certificate_number, train_model, train_line, assessment_item,
+        assessment_result, data_keys, data_values, total_seconds in zip(
+            cleaned['record_date'], cleaned['crew_group'], cleaned['name'],
+            cleaned['work_certificate_number'], cleaned['train_model'], cleaned['train_line'], cleaned['assessment_item'],
+            cleaned['assessment_result'], cleaned['data_keys'], cleaned['data_values'], cleaned['total_seconds'],
+        )
+    ]
+
+
+# 将清洗后的步骤用时整列展开为 insert_step_timings 的 (记录 id, 步骤, 步骤序号, 秒数)，每个记录每个有用时的步骤一行
+# objects 为 cleaned 各行对应的记录，只有已经写入、带有 id 的记录生成步骤用时，没有返回主键时先由 assign_missing_ids 补上 id
+def build_step_timings(objects, cleaned):
+    columns = [column for column in cleaned.columns if column.startswith(STEP_COLUMN_PREFIX)]
+    written = [index for index, obj in enumerate(objects) if obj.id is not None]
+    if not columns or not written:
+        return []
+    seconds = pd.DataFrame(
+        cleaned[columns].to_numpy(dtype='float64')[written],
+        index=[objects[index].id for index in written], columns=range(1, len(columns) + 1),
+    )
+    # stack 去掉无法换算的空值，索引为 (记录 id, 步骤序号)
+    stacked = seconds.stack()
+    record_ids = stacked.index.get_level_values(0)
+    orders = stacked.index.get_level_values(1)
+    keys = np.array([column[len(STEP_COLUMN_PREFIX):] for column in columns], dtype=object)[orders - 1]
+    return list(zip(record_ids.tolist(), keys.tolist(), orders.tolist(), stacked.tolist()))
+
+
+'''
+为 bulk_create 之后没有 id 的记录补上 id，MySQL 等数据库的批量插入不返回主键
+queryset 为刚写入的记录所在的范围，例如一个文件某个版本的暂存记录，其中每个判重键只有一条记录
+按这批记录的工作证编号查询，再按 (姓名, 工作证编号, 车型, 考核项目) 对应到各条记录
+'''
+def assign_missing_ids(objects, queryset):
+    missing = {}
+    for obj in objects:
+        if obj.id is None:
+            missing[(_field_text(obj.name), obj.work_certificate_number, _field_text(obj.train_model), _field_text(obj.assessment_item))] = obj
+    if not missing:
+        return
+    numbers = sorted({key[1] for key in missing})
+    for start in range(0, len(numbers), ID_LOOKUP_NUMBERS_PER_QUERY):
+        rows = queryset.filter(work_certificate_number__in=numbers[start:start + ID_LOOKUP_NUMBERS_PER_QUERY]).values_list(
+            'id', 'name', 'work_certificate_number', 'train_model', 'assessment_item',
+        )
+        for record_id, *key in rows:
+            obj = missing.get(tuple(key))
+            if obj is not None:
+                obj.id = record_id
+
+
+# 判重键中的空值需要用 isnull 查询
+def _key_condition(key):
+    conditions = {}
+    for field, value in zip(('name', 'work_certificate_number', 'train_model', 'assessment_item'), key):
+        if value is None:
+            conditions[f'{field}__isnull'] = True
+        else:
+            conditions[field] = value
+    return Q(**conditions)
+
+
+class AssessmentFileLoader:
+    '''
+    分块写入同一个文件某个版本的暂存记录
+    每个分块在块内去重后写入，并记录已写入记录的判重键
+    后续分块出现相同的 姓名、工作证编号、车型、考核项目 时，先删除之前写入的记录，保证整个文件仍然只保留最后一次的记录
+    内存中只保留判重键，不随文件行数增长
+    每批记录单独提交，不会长时间占用数据库的写锁，暂存记录在发布之前对读取方不可见
+    '''
+
+    def __init__(self, file_name, file_version, batch_size=BATCH_SIZE):
+        self.file_name = file_name
+        self.file_version = file_version
+        self.batch_size = batch_size
+        # rows_read 为已读取的原始行数，row_count 为当前实际写入数据库的记录数
+        self.rows_read = 0
+        self.row_count = 0
+        self._written_keys = set()
+        # 同一文件的各分块表头相同，第一个分块确定考核模板后后续分块直接使用
+        self.template = None
+        self.rejections = RejectedRows(file_name)
+
+    def add(self, df):
+        if self.template is None:
+            check_required_columns(df, self.file_name)
+        # 只有列名的空分块不登记考核模板，读完后由 check_has_rows 拒绝整个文件
+        if df.empty:
+            return 0
+        self.rows_read += len(df)
+        df = prepare_assessment_frame(df)
+        if self.template is None:
+            self.template = get_assessment_template(df.columns, first_assessment_item(df))
+
+        # 删除之前分块中写入的、被本分块覆盖的记录
+        overlap = self._written_keys & assessment_frame_keys(df)
+        if overlap:
+            self._delete_keys(overlap)
+            self._written_keys -= overlap
+        # 之前分块中被跳过的行同样被本分块的记录覆盖
+        if len(self.rejections):
+            self.rejections.discard_keys(set(dedup_key_frame(df).itertuples(index=False, name=None)))
+
+        self.row_count -= len(overlap)
+        return self.write(clean_assessment_frame(df, self.file_name, self.template.additional_columns, self.rejections))
+
+    # 写入已经清洗好的记录及其步骤用时，每批记录和步骤用时在一个单独的短事务中写入
+    def write(self, cleaned):
+        objects = build_assessment_objects(cleaned, self.file_name, is_published=False, file_version=self.file_version)
+        for start in range(0, len(objects), self.batch_size):
+            batch = objects[start:start + self.batch_size]
+            with transaction.atomic():
+                Assessment_Base.objects.bulk_create(batch)
+                assign_missing_ids(batch, self.staged_rows())
+                insert_step_timings(build_step_timings(batch, cleaned.iloc[start:start + self.batch_size]))
+
+        self.row_count += len(objects)
+        self._written_keys.update(zip(
+            _key_text(cleaned['name']), cleaned['work_certificate_number'],
+            _key_text(cleaned['train_model']), _key_text(cleaned['assessment_item']),
+        ))
+        return len(objects)
+
+    def _delete_keys(self, keys):
+        keys = list(keys)
+        for start in range(0, len(keys), DELETE_KEYS_PER_QUERY):
+            conditions = [_key_condition(key) for key in keys[start:start + DELETE_KEYS_PER_QUERY]]
+            self.staged_rows().filter(reduce(operator.or_, conditions)).delete()
+
+    def staged_rows(self):
+        return Assessment_Base.objects.filter(file_name=self.file_name, file_version=self.file_version, is_published=False)
+
+
+# 流式读取并写入一个文件，返回记录了读取行数和写入记录数的 loader
+# progress 为可选的回调函数，每写完一个分块调用一次，参数为已读取的行数和已写入的记录数
+def ingest_assessment_file(source, file_name, file_version, encoding, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE, progress=None, engine=PANDAS_ENGINE):
+    loader = AssessmentFileLoader(file_name, file_version, batch_size=batch_size)
+    with closing(read_chunks(source, file_name, encoding, chunk_size, engine)) as chunks:
+        for chunk in chunks:
+            loader.add(chunk)
+            if progress:
+                progress(loader.rows_read, loader.row_count)
+    check_has_rows(loader.rows_read, file_name)
+    return loader
+
+
+# 单个文件的处理结果，状态与后台上传任务中文件的状态一致
+# 增量模式下还会附带新增、修改、删除的记录数；rejections 为收集到的被跳过的行，结果中附带各原因的行数和部分行号
+def upload_result(file_name, status, rows_read=0, rows_written=0, error='', rejections=None, **counts):
+    result = {'file_name': file_name, 'status': status, 'rows_read': rows_read, 'rows_written': rows_written, **counts}
+    if rejections is not None:
+        result['rejected'] = rejections.summary()
+    if error:
+        result['error'] = error
+    return result
+
+
+'''
+判断文件内容是否与上次成功写入时完全相同
+除了比较内容哈希，还要确认该文件的记录没有在之后被单独删除过，否则仍需重新写入
+'''
+def is_unchanged(file_record, content_hash):
+    if file_record is None or file_record.content_hash != content_hash:
+        return False
+    return Assessment_Base.objects.published().filter(file_name=file_record.file_name).count() == file_record.row_count
+
+
+# 记录本次成功写入时使用的编码、内容哈希和写入的记录数
+def record_file(file_name, encoding, content_hash, row_count):
+    Assessment_File.objects.filter(file_name=file_name).update(
+        encoding=encoding,
+        content_hash=content_hash,
+        row_count=row_count,
+        uploaded_at=timezone.now(),
+    )
+
+
+# 为一次上传分配新的文件版本号，暂存记录都带有这个版本号
+def allocate_file_version(file_name):
+    with transaction.atomic():
+        file_record, _ = Assessment_File.objects.select_for_update().get_or_create(file_name=file_name)
+        file_record.last_version += 1
+        file_record.save(update_fields=['last_version'])
+    return file_record.last_version
+
+
+'''
+发布一个已经全部写入的文件版本
+在一个短事务中把该文件旧的已发布记录标记为未发布，再把本版本的暂存记录标记为已发布，事务中不删除记录
+如果更新的版本已经先发布，本版本直接丢弃，保证最后一次上传的版本生效
+rejections 为本版本被跳过的行，在同一个事务中替换该文件之前记录的跳过的行
+提交之后再分批删除被替换的旧记录和更早版本遗留的暂存记录，删除大文件的旧记录时不长时间持有文件记录的锁
+'''
+def publish_file_version(file_name, file_version, encoding, content_hash, row_count, rejections=None):
+    with transaction.atomic():
+        file_record = Assessment_File.objects.select_for_update().get(file_name=file_name)
+        if file_record.version > file_version:
+            discard_file_version(file_name, file_version)
+            return False
+        # 替换前后的记录涉及的科目都需要重新统计
+        subjects = file_subjects(file_name)
+        Assessment_Base.objects.published().filter(file_name=file_name).update(is_published=False)
+        Assessment_Base.objects.filter(file_name=file_name, file_version=file_version).update(is_published=True)
+        refresh_subjects(subjects | file_subjects(file_name))
+        file_record.version = file_version
+        file_record.save(update_fields=['version'])
+        record_file(file_name, encoding, content_hash, row_count)
+        if rejections is not None:
+            rejections.save()
+    delete_superseded_rows(file_name, file_version)
+    return True
+
+
+'''
+分批删除文件中比 file_version 更早的版本的未发布记录，每批在各自的事务中提交
+这些记录已经对读取方不可见，删除中断时留下的记录在该文件下次发布时继续删除
+'''
+def delete_superseded_rows(file_name, file_version):
+    superseded = Assessment_Base.objects.filter(file_name=file_name, is_published=False, file_version__lt=file_version)
+    while True:
+        ids = list(superseded.values_list('id', flat=True)[:SUPERSEDED_ROWS_PER_DELETE])
+        if not ids:
+            break
+        Assessment_Base.objects.filter(id__in=ids).delete()
+
+
+# 删除一个未发布版本的暂存记录，在写入失败或解码失败需要重试时调用
+def discard_file_version(file_name, file_version):
+    Assessment_Base.objects.filter(file_name=file_name, file_version=file_version, is_published=False).delete()
+
+
+'''
+完整处理一个上传的文件，同步上传接口和后台上传任务共用
+先计算内容哈希，与上次写入的内容完全相同时直接返回 unchanged，不再解析和重写数据
+否则确定编码后流式写入新版本的暂存记录，全部写完后再发布，替换该文件已有的数据，并记录本次使用的编码和内容哈希
+写入过程中读取方始终看到旧版本的完整数据，任何错误都会删除本版本的暂存记录，不会留下只写入了一部分的文件
+incremental 为 True 时不经过分块写入和暂存发布：整个文件在内存中读取和清洗，再由 upsert_cleaned_file 在一个事务中直接修改已发布的记录
+事务回滚时已发布的记录保持不变，但内存占用随文件大小增长，写完之前不回调 progress，只适合变化很小的重新上传，大文件应使用默认的全量模式
+'''
+def ingest_upload(source, file_name, progress=None, incremental=False):
+    content_hash = compute_content_hash(source)
+    file_record = Assessment_File.objects.filter(file_name=file_name).first()
+    if is_unchanged(file_record, content_hash):
+        return upload_result(file_name, Assessment_UploadJob.UNCHANGED, rows_written=file_record.row_count)
+
+    known_encoding = file_record.encoding if file_record else None
+    if incremental:
+        cleaned_file = clean_upload_file(source, file_name, known_encoding, get_template_columns())
+        get_assessment_template(cleaned_file.columns, cleaned_file.assessment_item)
+        row_count, counts = upsert_cleaned_file(file_name, content_hash, cleaned_file)
+        if progress:
+            progress(cleaned_file.rows_read, row_count)
+        return upload_result(file_name, Assessment_UploadJob.SUCCEEDED, cleaned_file.rows_read, row_count, rejections=cleaned_file.rejections, **counts)
+
+    file_version = allocate_file_version(file_name)
+    try:
+        # 同一来源上次上传时记录的编码优先使用，否则只读取文件开头的样本检测一次编码
+        for encoding, engine in parse_candidates(source, known_encoding, file_name):
+            try:
+                loader = ingest_assessment_file(source, file_name, file_version, encoding, progress=progress, engine=engine)
+                break
+            except PARSE_ERRORS:
+                # 解码或解析错误可能出现在已经写入若干分块之后，删除本次尝试写入的暂存记录后换下一个解析器或编码
+                discard_file_version(file_name, file_version)
+        else:
+            raise ValueError(f'文件 {file_name} 无法解码，请检查文件编码格式!')
+
+        publish_file_version(file_name, file_version, encoding, content_hash, loader.row_count, loader.rejections)
+    except Exception:
+        discard_file_version(file_name, file_version)
+        raise
+    return upload_result(file_name, Assessment_UploadJob.SUCCEEDED, loader.rows_read, loader.row_count, rejections=loader.rejections)
+
+
+# 增量模式下用于比较新旧记录是否变化的字段
+UPSERT_COMPARE_FIELDS = ['record_date', 'crew_group', 'name', 'assessment_result', 'data_keys', 'data_values', 'total_seconds']
+
+
+# 将字符型字段统一转换为入库后的文本形式再比较
+def _field_text(value):
+    return None if value is None else str(value)
+
+
+'''
+增量写入一个重新上传的文件
+按 (文件名, 工作证编号, 车型, 考核项目) 为每条记录定位数据库中已有的记录，分别计算新增、修改和删除的记录
+只对变化的部分执行 bulk_create、bulk_update 和 delete，没有变化的记录及其分类信息保持不变
+变化的部分通常很小，直接在一个事务中对已发布的记录生效
+返回写入后的记录数，以及新增、修改、删除和未变化的记录数
+'''
+def upsert_cleaned_file(file_name, content_hash, cleaned_file, batch_size=BATCH_SIZE):
+    cleaned = cleaned_file.cleaned
+    # 同一工作证编号、车型、考核项目只保留文件中最后出现的记录
+    keys = list(zip(cleaned['work_certificate_number'], _key_text(cleaned['train_model']), _key_text(cleaned['assessment_item'])))
+    cleaned = cleaned[~pd.Series(keys, index=cleaned.index).duplicated(keep='last')]
+
+    with transaction.atomic():
+        file_record, _ = Assessment_File.objects.select_for_update().get_or_create(file_name=file_name)
+        objects = build_assessment_objects(cleaned, file_name, file_version=file_record.version)
+
+        existing = {}
+        duplicate_ids = []
+        # 新旧记录涉及的科目，写入后重新统计
+        subjects = {(obj.train_model, obj.assessment_item) for obj in objects}
+        for row in Assessment_Base.objects.published().filter(file_name=file_name).values('id', 'work_certificate_number', 'train_model', 'assessment_item', *UPSERT_COMPARE_FIELDS):
+            key = (row['work_certificate_number'], row['train_model'], row['assessment_item'])
+            subjects.add((row['train_model'], row['assessment_item']))
+            # 早期全量写入的数据中同一个键可能有多条记录，只保留一条参与比较
+            if key in existing:
+                duplicate_ids.append(row['id'])
+            else:
+                existing[key] = row
+
+        to_create, to_update = [], []
+        unchanged = 0
+        for obj in objects:
+            row = existing.pop((obj.work_certificate_number, _field_text(obj.train_model), _field_text(obj.assessment_item)), None)
+            if row is None:
+                to_create.append(obj)
+                continue
+            if (row['record_date'] == obj.record_date
+                    and row['crew_group'] == _field_text(obj.crew_group)
+                    and row['name'] == _field_text(obj.name)
+                    and row['assessment_result'] == obj.assessment_result
+                    and row['data_keys'] == obj.data_keys_id
+                    and row['data_values'] == obj.data_values):
+                unchanged += 1
+                continue
+            obj.id = row['id']
+            to_update.append(obj)
+
+        # 剩下没有匹配到新文件记录的旧记录需要删除
+        to_delete = duplicate_ids + [row['id'] for row in existing.values()]
+        for start in range(0, len(to_delete), batch_size):
+            Assessment_Base.objects.filter(id__in=to_delete[start:start + batch_size]).delete()
+        Assessment_Base.objects.bulk_update(to_update, UPSERT_COMPARE_FIELDS, batch_size=batch_size)
+        Assessment_Base.objects.bulk_create(to_create, batch_size=batch_size)
+        assign_missing_ids(to_create, Assessment_Base.objects.published().filter(file_name=file_name))
+        # 修改的记录替换原有的步骤用时，没有变化的记录不带 id，不重新生成
+        update_ids = [obj.id for obj in to_update]
+        for start in range(0, len(update_ids), batch_size):
+            Assessment_StepTiming.objects.filter(assessment_base_id__in=update_ids[start:start + batch_size]).delete()
+        insert_step_timings(build_step_timings(objects, cleaned))
+        refresh_subjects(subjects)
+
+        record_file(file_name, cleaned_file.encoding, content_hash, len(objects))
+        cleaned_file.rejections.save(batch_size=batch_size)
+
+    return len(objects), {'inserted': len(to_create), 'updated': len(to_update), 'deleted': len(to_delete), 'unchanged': unchanged}
+
+
+# 查询各文件上次成功写入时的记录
+def get_file_records(file_names):
+    file_names = list(file_names)
+    records = {}
+    for start in range(0, len(file_names), FILE_NAMES_PER_QUERY):
+        for record in Assessment_File.objects.filter(file_name__in=file_names[start:start + FILE_NAMES_PER_QUERY]):
+            records[record.file_name] = record
+    return records
+
+
+# 进程池中的子进程需要先初始化 Django，才能导入模型中定义的常量
+def _init_parallel_worker():
+    import django
+    django.setup()
+
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+'''
+web 进程中各个并行上传请求共用的进程池，第一次使用时创建，不再每个请求启动和关闭一组子进程
+子进程被意外终止后进程池不再接受任务，下一次获取时重新创建
+'''
+def get_process_pool(max_workers):
+    global _process_pool
+    with _process_pool_lock:
+        # ProcessPoolExecutor 没有公开判断进程池是否可用的接口，只能读取 _broken
+        if _process_pool is None or _process_pool._broken:
+            _process_pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_parallel_worker)
+        return _process_pool
+
+
+class CleanedFile:
+    '''
+    在子进程中清洗好的一个文件，返回给主进程登记考核模板并写入数据库
+    包括实际使用的编码、读取的行数、考核项目、表头、清洗后的 DataFrame 和被跳过的行
+    '''
+
+    def __init__(self, encoding, rows_read, assessment_item, columns, cleaned, rejections):
+        self.encoding = encoding
+        self.rows_read = rows_read
+        self.assessment_item = assessment_item
+        self.columns = columns
+        self.cleaned = cleaned
+        self.rejections = rejections
+
+
+'''
+在子进程中读取并清洗一个文件，不访问数据库，返回 CleanedFile
+整个文件在一个子进程中读取，跨分块的判重与单次读取整个文件完全一致
+templates 为 get_template_columns 返回的已知考核模板的列映射
+'''
+def clean_upload_file(source, file_name, known_encoding=None, templates=None):
+    # 内存中的小文件以字节串传入子进程，压缩文件中的文件在子进程中打开并解压
+    with open_source(source) as source:
+        for encoding, engine in parse_candidates(source, known_encoding, file_name):
+            try:
+                df = read_frame(source, file_name, encoding, engine)
+                break
+            except PARSE_ERRORS:
+                continue
+        else:
+            raise ValueError(f'文件 {file_name} 无法解码，请检查文件编码格式!')
+    check_required_columns(df, file_name)
+    rows_read = len(df)
+    check_has_rows(rows_read, file_name)
+    df = prepare_assessment_frame(df)
+    columns = [str(column) for column in df.columns]
+    assessment_item = first_assessment_item(df)
+    # 子进程不访问数据库，已知模板的列映射由主进程传入，未知的表头才查找整体用时列
+    additional_columns = (templates or {}).get((assessment_item, header_signature(columns)))
+    rejections = RejectedRows(file_name)
+    cleaned = clean_assessment_frame(df, file_name, additional_columns, rejections)
+    return CleanedFile(encoding, rows_read, assessment_item, columns, cleaned, rejections)
+
+
+# 在主进程中将子进程清洗好的一个文件分批写入暂存记录，再整体发布替换旧数据
+def write_cleaned_file(file_name, content_hash, cleaned_file, batch_size=BATCH_SIZE):
+    file_version = allocate_file_version(file_name)
+    try:
+        loader = AssessmentFileLoader(file_name, file_version, batch_size=batch_size)
+        loader.write(cleaned_file.cleaned)
+        publish_file_version(file_name, file_version, cleaned_file.encoding, content_hash, loader.row_count, cleaned_file.rejections)
+    except Exception:
+        discard_file_version(file_name, file_version)
+        raise
+    return loader.row_count
+
+
+# 在主进程中写入子进程清洗好的一个文件，返回该文件的处理结果
+def _write_parallel_result(file_name, content_hash, future, batch_size, incremental):
+    try:
+        cleaned_file = future.result()
+        # 子进程中遇到的新表头在主进程中登记为考核模板
+        get_assessment_template(cleaned_file.columns, cleaned_file.assessment_item)
+        counts = {}
+        if incremental:
+            row_count, counts = upsert_cleaned_file(file_name, content_hash, cleaned_file, batch_size=batch_size)
+        else:
+            row_count = write_cleaned_file(file_name, content_hash, cleaned_file, batch_size=batch_size)
+        return upload_result(
+            file_name, Assessment_UploadJob.SUCCEEDED, cleaned_file.rows_read, row_count,
+            rejections=cleaned_file.rejections, **counts,
+        )
+    except Exception as e:
+        return upload_result(file_name, Assessment_UploadJob.FAILED, error=f'处理文件 {file_name} 时发生错误: {str(e)}')
+
+
+'''
+并行处理多个文件，每处理完一个文件就返回 (文件在 sources 中的序号, 处理结果)
+sources 为 (文件名, 读取来源) 的列表，读取来源为文件路径、文件内容的字节串或压缩文件中的文件
+解析和清洗在进程池中进行，每个子进程处理一个文件，哪个文件先清洗完就先由主进程分批写入数据库
+同时提交的文件数有上限，清洗好的文件写入后才提交新的文件，文件再多内存占用也不会持续增长
+每个文件单独返回成功或失败的结果，一个文件失败不影响其他文件
+incremental 为 True 时按增量模式只写入变化的记录
+executor 为 get_process_pool 返回的共用进程池，不传时本次调用创建一个进程池，处理完后关闭
+'''
+def iter_uploads_parallel(sources, max_workers=None, batch_size=BATCH_SIZE, incremental=False, executor=None):
+    max_workers = min(max_workers or os.cpu_count() or 1, len(sources)) or 1
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_parallel_worker) as executor:
+            yield from iter_uploads_parallel(sources, max_workers, batch_size, incremental, executor)
+        return
+
+    file_records = get_file_records(file_name for file_name, _ in sources)
+    templates = get_template_columns()
+    pending = enumerate(sources)
+    futures = {}
+    try:
+        while True:
+            for index, (file_name, source) in pending:
+                # 内容未变化的文件不再交给子进程解析
+                content_hash = compute_content_hash(source)
+                file_record = file_records.get(file_name)
+                if is_unchanged(file_record, content_hash):
+                    yield index, upload_result(file_name, Assessment_UploadJob.UNCHANGED, rows_written=file_record.row_count)
+                    continue
+                known_encoding = file_record.encoding if file_record else None
+                future = executor.submit(clean_upload_file, source, file_name, known_encoding, templates)
+                futures[future] = (index, content_hash)
+                if len(futures) >= max_workers * PARALLEL_FILES_PER_WORKER:
+                    break
+            if not futures:
+                break
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, content_hash = futures.pop(future)
+                yield index, _write_parallel_result(sources[index][0], content_hash, future, batch_size, incremental)
+    finally:
+        # 提前结束时取消还没有开始的任务，共用的进程池不随本次调用关闭
+        for future in futures:
+            future.cancel()
+
+
+# 并行处理多个文件，按上传顺序返回每个文件的处理结果
+def ingest_uploads_parallel(sources, max_workers=None, batch_size=BATCH_SIZE, incremental=False, executor=None):
+    results = [None] * len(sources)
+    for index, result in iter_uploads_parallel(sources, max_workers, batch_size, incremental, executor):
+        results[index] = result
+    return results
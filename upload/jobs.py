@@ -0,0 +1,269 @@
+import hashlib
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .ingestion import ingest_upload
+from .models import Assessment_ChunkedUpload, Assessment_UploadJob, Assessment_UploadJobFile
+from .readers import HASH_BLOCK_SIZE, expand_upload, open_source
+
+'''
+后台上传任务
+上传接口只负责把文件暂存到磁盘并创建任务，立即返回任务编号
+任务记录保存在数据库中，相当于一个不依赖外部消息中间件的队列
+本进程内的线程池负责处理任务，也可以用 manage.py run_upload_jobs 在独立进程中处理积压的任务
+处理任务的进程退出后遗留的处理中任务由 run_upload_jobs 按 updated_at 判断并标记为失败，同时删除暂存文件
+超大文件可以通过分块续传接口逐块写入暂存文件，完成上传后同样创建任务处理
+'''
+
+# 分块上传时每次从请求体读取并写入暂存文件的字节数
+CHUNK_COPY_SIZE = 1024 * 1024
+
+_executor = None
+
+
+# 线程池在第一次提交任务时创建，每个 web 进程各自拥有一个
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'UPLOAD_JOB_WORKERS', 2),
+            thread_name_prefix='upload-job',
+        )
+    return _executor
+
+
+# 将上传的文件按块写入暂存目录，不在内存中保留整个文件
+def spool_upload(file_obj, job_id, index):
+    job_dir = os.path.join(settings.UPLOAD_SPOOL_DIR, str(job_id))
+    os.makedirs(job_dir, exist_ok=True)
+    # 文件名中可能带有目录分隔符，只保留最后一段
+    spool_path = os.path.join(job_dir, f'{index}_{os.path.basename(file_obj.name)}')
+    with open(spool_path, 'wb') as destination:
+        for chunk in file_obj.chunks():
+            destination.write(chunk)
+    return spool_path
+
+
+# 创建任务并暂存全部文件，事务提交后再交给线程池处理
+def create_upload_job(files, user=None):
+    with transaction.atomic():
+        job = Assessment_UploadJob.objects.create(created_by=user if user and user.is_authenticated else None)
+        for index, file_obj in enumerate(files):
+            Assessment_UploadJobFile.objects.create(
+                job=job,
+                file_name=file_obj.name,
+                spool_path=spool_upload(file_obj, job.id, index),
+                size=file_obj.size,
+            )
+        transaction.on_commit(lambda: submit_upload_job(job.id))
+    return job
+
+
+def submit_upload_job(job_id):
+    get_executor().submit(run_upload_job, job_id)
+
+
+# 将任务从等待状态改为处理中，返回 False 说明任务已被其他线程或进程领取
+def claim_upload_job(job_id):
+    now = timezone.now()
+    claimed = Assessment_UploadJob.objects.filter(pk=job_id, status=Assessment_UploadJob.PENDING).update(
+        status=Assessment_UploadJob.RUNNING, started_at=now, updated_at=now,
+    )
+    return claimed == 1
+
+
+# 更新处理中任务的 updated_at，表示处理任务的进程仍在运行
+def touch_upload_job(job_id):
+    Assessment_UploadJob.objects.filter(pk=job_id).update(updated_at=timezone.now())
+
+
+def remove_job_spool(job_id):
+    shutil.rmtree(os.path.join(settings.UPLOAD_SPOOL_DIR, str(job_id)), ignore_errors=True)
+
+
+# 处理任务中的每个文件，单个文件失败不影响其他文件
+def run_upload_job(job_id):
+    try:
+        if not claim_upload_job(job_id):
+            return
+        job = Assessment_UploadJob.objects.get(pk=job_id)
+        failed = False
+        for job_file in job.files.all():
+            failed = not run_upload_job_file(job_file) or failed
+
+        job.status = Assessment_UploadJob.FAILED if failed else Assessment_UploadJob.SUCCEEDED
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'finished_at', 'updated_at'])
+        remove_job_spool(job_id)
+    finally:
+        # 线程池中的线程会一直存在，处理完任务后关闭本线程的数据库连接
+        connection.close()
+
+
+def run_upload_job_file(job_file):
+    close_old_connections()
+    job_file.status = Assessment_UploadJob.RUNNING
+    job_file.save(update_fields=['status'])
+    touch_upload_job(job_file.job_id)
+
+    # 压缩包中的各个文件依次导入，行数累计到同一条任务文件记录上
+    rows_read = rows_written = 0
+    member_name = job_file.file_name
+
+    # 每写完一个分块保存一次进度，暂存记录分批提交，进度可以被状态查询接口实时看到
+    def progress(member_rows_read, member_rows_written):
+        job_file.rows_read = rows_read + member_rows_read
+        job_file.rows_written = rows_written + member_rows_written
+        job_file.save(update_fields=['rows_read', 'rows_written'])
+        touch_upload_job(job_file.job_id)
+
+    try:
+        statuses = set()
+        for member_name, member in expand_upload(job_file.spool_path, job_file.file_name):
+            with open_source(member) as source:
+                result = ingest_upload(source, member_name, progress=progress)
+            statuses.add(result['status'])
+            rows_read += result['rows_read']
+            rows_written += result['rows_written']
+        # 所有文件的内容都没有变化时整个任务文件记为 unchanged
+        job_file.status = Assessment_UploadJob.UNCHANGED if statuses == {Assessment_UploadJob.UNCHANGED} else Assessment_UploadJob.SUCCEEDED
+        job_file.rows_read = rows_read
+        job_file.rows_written = rows_written
+    except Exception as e:
+        job_file.status = Assessment_UploadJob.FAILED
+        job_file.error = f'处理文件 {member_name} 时发生错误: {str(e)}'
+    job_file.save(update_fields=['status', 'rows_read', 'rows_written', 'error'])
+    return job_file.status != Assessment_UploadJob.FAILED
+
+
+'''
+将超过 stale_seconds 秒没有更新的处理中任务标记为失败，并删除这些任务的暂存文件，返回被标记的任务编号
+处理任务的 web 进程重启或崩溃后，任务会一直停在处理中，暂存文件也不会被删除
+这些任务中没有处理完的文件标记为失败，已经写入的暂存记录不会发布，在该文件的下一个版本发布时删除
+'''
+def fail_stale_upload_jobs(stale_seconds):
+    now = timezone.now()
+    stale = Assessment_UploadJob.objects.filter(status=Assessment_UploadJob.RUNNING, updated_at__lt=now - timedelta(seconds=stale_seconds))
+    failed_ids = []
+    for job_id in list(stale.values_list('id', flat=True)):
+        with transaction.atomic():
+            # 只标记判断之后仍然没有更新的任务，正在处理的任务不受影响
+            if not stale.filter(pk=job_id).update(status=Assessment_UploadJob.FAILED, finished_at=now, updated_at=now):
+                continue
+            Assessment_UploadJobFile.objects.filter(
+                job_id=job_id, status__in=[Assessment_UploadJob.PENDING, Assessment_UploadJob.RUNNING],
+            ).update(status=Assessment_UploadJob.FAILED, error='任务处理中断，请重新上传。')
+        remove_job_spool(job_id)
+        failed_ids.append(job_id)
+    return failed_ids
+
+
+# 创建分块上传会话和对应的空暂存文件
+def create_chunked_upload(file_name, size=None, user=None):
+    upload = Assessment_ChunkedUpload.objects.create(
+        file_name=file_name, size=size, created_by=user if user and user.is_authenticated else None,
+    )
+    upload_dir = os.path.join(settings.UPLOAD_SPOOL_DIR, 'chunked')
+    os.makedirs(upload_dir, exist_ok=True)
+    upload.spool_path = os.path.join(upload_dir, str(upload.id))
+    open(upload.spool_path, 'wb').close()
+    upload.save(update_fields=['spool_path'])
+    return upload
+
+
+'''
+将请求体中的一个分块从 offset 处写入暂存文件，边读边写，不在内存中保留整个分块
+调用方需要先确认 offset 等于已接收的字节数；之前中断的分块可能在文件末尾留下了未确认的内容，写入后截断
+写入前先用带偏移量条件的 UPDATE 锁住会话行，同一偏移量的并发请求在锁上等待，拿到锁后条件不再成立，不会再写文件
+连接中途断开时已经读到的部分仍然有效，按实际写入的字节数推进偏移量，客户端从新的偏移量继续上传
+返回新的偏移量，会话已被其他请求推进或已完成时返回 None
+'''
+def append_chunk(upload, offset, stream):
+    received = 0
+    interrupted = None
+    with transaction.atomic():
+        locked = Assessment_ChunkedUpload.objects.filter(
+            pk=upload.pk, status=Assessment_ChunkedUpload.UPLOADING, offset=offset,
+        ).update(updated_at=timezone.now())
+        if not locked:
+            return None
+        with open(upload.spool_path, 'r+b') as destination:
+            destination.seek(offset)
+            try:
+                for block in iter(lambda: stream.read(CHUNK_COPY_SIZE), b''):
+                    destination.write(block)
+                    received += len(block)
+            except OSError as exc:
+                interrupted = exc
+            destination.truncate()
+        Assessment_ChunkedUpload.objects.filter(pk=upload.pk).update(offset=offset + received, updated_at=timezone.now())
+    # 偏移量提交之后再把连接中断的异常抛给调用方
+    if interrupted is not None:
+        raise interrupted
+    return offset + received
+
+
+# 计算分块上传已确认的内容的 SHA-256，不包括中断的分块在偏移量之后留下的内容
+def chunked_upload_sha256(upload):
+    digest = hashlib.sha256()
+    remaining = upload.offset
+    with open(upload.spool_path, 'rb') as file:
+        while remaining:
+            block = file.read(min(HASH_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+'''
+删除超过 expire_seconds 秒没有追加内容的未完成上传会话及其暂存文件，返回被删除的会话编号
+客户端放弃上传后会话会一直停在上传中，暂存文件占用磁盘空间；过期后再上传需要重新创建会话
+'''
+def expire_chunked_uploads(expire_seconds):
+    expired = Assessment_ChunkedUpload.objects.filter(
+        status=Assessment_ChunkedUpload.UPLOADING, updated_at__lt=timezone.now() - timedelta(seconds=expire_seconds),
+    )
+    expired_ids = []
+    for upload in list(expired):
+        # 判断之后又追加了内容或已完成的会话不删除
+        if not expired.filter(pk=upload.pk, offset=upload.offset).delete()[0]:
+            continue
+        if upload.spool_path and os.path.exists(upload.spool_path):
+            os.remove(upload.spool_path)
+        expired_ids.append(upload.pk)
+    return expired_ids
+
+
+# 完成分块上传：把暂存文件移入任务目录并创建后台上传任务，事务提交后交给线程池处理
+def finalize_chunked_upload(upload):
+    with transaction.atomic():
+        # 只有一个请求能把会话改为已完成，重复提交不会创建两个任务
+        finalized = Assessment_ChunkedUpload.objects.filter(
+            pk=upload.pk, status=Assessment_ChunkedUpload.UPLOADING,
+        ).update(status=Assessment_ChunkedUpload.FINALIZED)
+        if not finalized:
+            return None
+
+        job = Assessment_UploadJob.objects.create(created_by=upload.created_by)
+        job_dir = os.path.join(settings.UPLOAD_SPOOL_DIR, str(job.id))
+        os.makedirs(job_dir, exist_ok=True)
+        spool_path = os.path.join(job_dir, f'0_{os.path.basename(upload.file_name)}')
+        Assessment_UploadJobFile.objects.create(job=job, file_name=upload.file_name, spool_path=spool_path, size=upload.offset)
+
+        # 去掉中断的分块可能在已确认的偏移量之后留下的内容
+        os.truncate(upload.spool_path, upload.offset)
+        os.replace(upload.spool_path, spool_path)
+        upload.status = Assessment_ChunkedUpload.FINALIZED
+        upload.spool_path = spool_path
+        upload.job = job
+        upload.save(update_fields=['status', 'spool_path', 'job'])
+        transaction.on_commit(lambda: submit_upload_job(job.id))
+    return job
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from upload.models import Assessment_Base, decode_additional_data, replace_step_timings
+
+# 每批读取并回填步骤用时的记录数
+BACKFILL_BATCH_SIZE = 2000
+
+
+'''
+按已有记录的 additional_data 回填步骤用时表，例如：python manage.py backfill_step_timings
+按 id 分段读取记录，每批在一个事务中替换这些记录的步骤用时，重复运行的结果相同
+中断后可以用 --start-id 从输出的最后一个 id 继续
+'''
+class Command(BaseCommand):
+    help = '回填步骤用时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE, help='每批处理的记录数')
+        parser.add_argument('--start-id', type=int, default=0, help='从 id 大于该值的记录开始')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = options['start_id']
+        records = timings = 0
+        rows = Assessment_Base.objects.order_by('id').values_list('id', 'data_keys', 'data_values')
+        while True:
+            batch = list(rows.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                timings += replace_step_timings(
+                    (record_id, decode_additional_data(data_keys, data_values)) for record_id, data_keys, data_values in batch
+                )
+            last_id = batch[-1][0]
+            records += len(batch)
+            self.stdout.write(f'已处理到 id {last_id}，累计 {records} 条记录，{timings} 条步骤用时')
+        self.stdout.write(f'完成: 共 {records} 条记录，{timings} 条步骤用时')
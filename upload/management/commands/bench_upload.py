@@ -0,0 +1,92 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from upload.benchmarks.bench_read import run_read_case
+from upload.benchmarks.bench_upload import (
+    DEFAULT_ENCODINGS, DEFAULT_SIZES, find_regressions, load_results, run_case, run_parse_case, save_results,
+)
+
+
+'''
+上传接口的性能基准，在单独创建的测试数据库中运行，不会影响现有数据
+例如：python manage.py bench_upload --rows 1000 10000 100000 1000000 --output bench.json
+之后修改了上传逻辑再用 --compare bench.json 比较，每秒行数下降或 SQL 语句数增加超过 --tolerance 时命令返回错误
+加上 --parse 只比较各 CSV 解析器的解析耗时，例如：python manage.py bench_upload --parse --rows 100000 --steps 40
+加上 --read 比较列表接口原先的序列化器与快速序列化的耗时，例如：python manage.py bench_upload --read --rows 1000 100000
+'''
+class Command(BaseCommand):
+    help = '运行上传接口的性能基准'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_SIZES, help='各用例的总行数')
+        parser.add_argument('--encodings', nargs='+', default=DEFAULT_ENCODINGS, help='每个用例中各文件依次使用的编码')
+        parser.add_argument('--steps', type=int, default=10, help='步骤用时列的数量')
+        parser.add_argument('--seed', type=int, default=0, help='随机种子')
+        parser.add_argument('--no-memory', action='store_true', help='不单独测量内存峰值')
+        parser.add_argument('--output', help='将结果保存为 JSON 文件')
+        parser.add_argument('--compare', help='与之前保存的 JSON 结果比较')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='允许的性能下降比例')
+        parser.add_argument('--parse', action='store_true', help='只运行 CSV 解析基准')
+        parser.add_argument('--read', action='store_true', help='只运行列表序列化基准')
+
+    def handle(self, *args, **options):
+        if options['parse']:
+            return self.handle_parse(options)
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            if options['read']:
+                return self.handle_read(options)
+            results = []
+            for rows in options['rows']:
+                result = run_case(rows, options['encodings'], options['steps'], options['seed'], not options['no_memory'])
+                results.append(result)
+                self.stdout.write(
+                    f"{result['rows']:>8} 行 {result['files']} 个文件: {result['seconds']:.2f} 秒, "
+                    f"{result['rows_per_second']} 行/秒, {result['queries']} 条 SQL, "
+                    f"写入 {result['written_rows']}/{result['expected_rows']} 条, "
+                    f"内存峰值 {result['peak_memory_mb']} MB, 进程最大常驻内存 {result['max_rss_mb']} MB"
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['output']:
+            save_results(results, options['output'])
+        if options['compare']:
+            regressions = find_regressions(results, load_results(options['compare']), options['tolerance'])
+            if regressions:
+                raise CommandError('性能下降：\n' + '\n'.join(regressions))
+            self.stdout.write('与基准结果相比没有明显的性能下降')
+
+    # 解析基准不访问数据库，每个用例规模对每种编码各生成一个文件
+    def handle_parse(self, options):
+        results = []
+        for rows in options['rows']:
+            for encoding in options['encodings']:
+                result = run_parse_case(rows, options['steps'], encoding, options['seed'])
+                results.append(result)
+                timings = ', '.join(
+                    f"{name} {result[name]['seconds']:.3f} 秒 ({result[name]['rows_per_second']} 行/秒)"
+                    for name in ('pandas_inferred', 'pandas_schema', 'pyarrow') if name in result
+                )
+                self.stdout.write(f"{rows:>8} 行 {result['steps']} 个步骤 {encoding} {result['megabytes']} MB: {timings}")
+        if options['output']:
+            save_results(results, options['output'])
+
+    # 列表序列化基准需要先写入记录，与上传基准一样在单独创建的测试数据库中运行
+    def handle_read(self, options):
+        results = []
+        for rows in options['rows']:
+            result = run_read_case(rows, options['steps'], options['seed'])
+            results.append(result)
+            self.stdout.write(
+                f"{result['records']:>8} 条记录 {result['steps']} 个步骤: "
+                f"序列化器 {result['serializer']['seconds']:.3f} 秒 ({result['serializer']['rows_per_second']} 条/秒), "
+                f"快速序列化 {result['values']['seconds']:.3f} 秒 ({result['values']['rows_per_second']} 条/秒), "
+                f"加速 {result['speedup']} 倍"
+            )
+        if options['output']:
+            save_results(results, options['output'])
@@ -0,0 +1,106 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from upload.ingestion import iter_uploads_parallel
+from upload.models import Assessment_UploadJob
+from upload.readers import IMPORT_EXTENSIONS, ZIP_EXTENSION, expand_upload
+
+# 批量导入时 bulk_create 每批写入的记录数，比网页上传大，减少大量历史文件的写入语句数
+IMPORT_BATCH_SIZE = 10000
+
+
+# 递归收集目录中可以导入的文件，按路径排序，返回 (文件名, 文件路径) 的列表
+def find_import_files(directory, relative_names=False):
+    files = []
+    for root, dirs, names in os.walk(directory):
+        dirs.sort()
+        for name in sorted(names):
+            if not name.lower().endswith(IMPORT_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            file_name = os.path.relpath(path, directory).replace(os.sep, '/') if relative_names else name
+            files.append((file_name, path))
+    return files
+
+
+'''
+离线批量导入一个目录中的历史考核文件，不经过 HTTP 上传，使用与上传接口相同的清洗和入库逻辑
+例如：python manage.py import_assessments /data/history --workers 8
+目录中的 CSV、Excel 文件和 .gz、.zip 压缩文件在多个子进程中并行解析清洗，由主进程按 --batch-size 分批写入
+每个文件写入成功后才记录内容哈希，中断或有文件失败时重新运行同样的命令即可续传：已经导入且内容未变化的文件直接跳过
+默认以文件名（不含目录）作为入库的文件名，与网页上传一致；不同子目录中有同名文件时用 --relative-names 改用相对路径
+'''
+class Command(BaseCommand):
+    help = '从目录批量导入考核文件'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='要导入的目录，包括所有子目录')
+        parser.add_argument('--workers', type=int, default=settings.UPLOAD_PARALLEL_WORKERS, help='解析清洗文件的进程数')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='每批写入的记录数')
+        parser.add_argument('--incremental', action='store_true', help='增量模式，只写入变化的记录')
+        parser.add_argument('--relative-names', action='store_true', help='以相对于导入目录的路径作为文件名')
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not os.path.isdir(directory):
+            raise CommandError(f'目录 {directory} 不存在')
+
+        sources = self.collect_sources(directory, options['relative_names'])
+        if not sources:
+            self.stdout.write('目录中没有可以导入的文件')
+            return
+        self.stdout.write(f'共 {len(sources)} 个文件，使用 {options["workers"]} 个进程')
+
+        start = time.perf_counter()
+        counts = {}
+        rows_read = rows_written = 0
+        failed = []
+        results = iter_uploads_parallel(sources, options['workers'], options['batch_size'], options['incremental'])
+        for done, (_, result) in enumerate(results, 1):
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+            if result['status'] == Assessment_UploadJob.FAILED:
+                failed.append(result['error'])
+            # 跳过的文件没有读取，不计入吞吐量
+            rows_read += result['rows_read']
+            if result['status'] == Assessment_UploadJob.SUCCEEDED:
+                rows_written += result['rows_written']
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"[{done}/{len(sources)}] {result['file_name']}: {result['status']}, "
+                f"读取 {result['rows_read']} 行, 写入 {result['rows_written']} 条; "
+                f"累计 {rows_read} 行, {round(rows_read / elapsed) if elapsed else 0} 行/秒"
+            )
+
+        elapsed = time.perf_counter() - start
+        summary = ', '.join(f'{status} {count} 个' for status, count in sorted(counts.items()))
+        self.stdout.write(
+            f'完成: {summary}; 读取 {rows_read} 行, 写入 {rows_written} 条, 耗时 {elapsed:.1f} 秒, '
+            f'{round(rows_read / elapsed) if elapsed else 0} 行/秒'
+        )
+        if failed:
+            raise CommandError(f'{len(failed)} 个文件导入失败，修正后重新运行即可续传：\n' + '\n'.join(failed))
+
+    # 展开压缩文件，入库的文件名重复时后导入的文件会替换先导入的文件，直接报错
+    def collect_sources(self, directory, relative_names):
+        sources = []
+        for file_name, path in find_import_files(directory, relative_names):
+            try:
+                members = expand_upload(path, file_name)
+            except Exception as e:
+                raise CommandError(f'读取压缩包 {path} 时发生错误: {str(e)}')
+            # 使用相对路径时 .zip 中的文件名也加上压缩包的路径
+            if relative_names and file_name.lower().endswith(ZIP_EXTENSION):
+                members = [(f'{file_name}/{member_name}', source) for member_name, source in members]
+            sources.extend(members)
+
+        seen, duplicates = set(), set()
+        for file_name, _ in sources:
+            (duplicates if file_name in seen else seen).add(file_name)
+        if duplicates:
+            raise CommandError(
+                '以下文件名重复，请使用 --relative-names：\n' + '\n'.join(sorted(duplicates))
+            )
+        return sources
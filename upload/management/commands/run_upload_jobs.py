@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from upload.jobs import expire_chunked_uploads, fail_stale_upload_jobs, run_upload_job
+from upload.models import Assessment_UploadJob
+
+
+# 在独立进程中处理数据库中等待处理的上传任务，例如 web 进程重启后遗留的任务
+# 每轮先把长时间没有进度的处理中任务标记为失败并删除其暂存文件，再删除已放弃的分块上传会话
+class Command(BaseCommand):
+    help = '处理等待中的后台上传任务'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='持续轮询新的任务，而不是处理完当前积压后退出')
+        parser.add_argument('--interval', type=float, default=5, help='轮询间隔（秒）')
+        parser.add_argument('--stale-after', type=float, default=settings.UPLOAD_JOB_STALE_SECONDS,
+                            help='处理中的任务超过该秒数没有进度时标记为失败')
+        parser.add_argument('--expire-uploads-after', type=float, default=settings.CHUNKED_UPLOAD_EXPIRE_SECONDS,
+                            help='分块上传会话超过该秒数没有追加内容时删除')
+
+    def handle(self, *args, **options):
+        while True:
+            for job_id in fail_stale_upload_jobs(options['stale_after']):
+                self.stdout.write(f'任务 {job_id}: 处理中断，已标记为失败')
+            for upload_id in expire_chunked_uploads(options['expire_uploads_after']):
+                self.stdout.write(f'分块上传 {upload_id}: 已过期，已删除')
+            job_ids = list(Assessment_UploadJob.objects.filter(status=Assessment_UploadJob.PENDING)
+                           .order_by('id').values_list('id', flat=True))
+            for job_id in job_ids:
+                run_upload_job(job_id)
+                job = Assessment_UploadJob.objects.get(pk=job_id)
+                self.stdout.write(f'任务 {job_id}: {job.get_status_display()}')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
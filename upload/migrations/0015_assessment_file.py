@@ -0,0 +1,26 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload', '0014_assessment_classification_file_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Assessment_File',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=100, unique=True, verbose_name='文件名')),
+                ('encoding', models.CharField(blank=True, max_length=20, null=True, verbose_name='文件编码')),
+                ('uploaded_at', models.DateTimeField(auto_now=True, verbose_name='上传时间')),
+            ],
+            options={
+                'verbose_name': '文件信息',
+                'verbose_name_plural': '文件信息',
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload', '0015_assessment_file'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Assessment_UploadJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', '等待处理'), ('running', '处理中'), ('succeeded', '处理成功'), ('failed', '处理失败')], default='pending', max_length=20, verbose_name='任务状态')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='开始时间')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完成时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='上传用户')),
+            ],
+            options={
+                'verbose_name': '上传任务',
+                'verbose_name_plural': '上传任务',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Assessment_UploadJobFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=100, verbose_name='文件名')),
+                ('spool_path', models.CharField(max_length=500, verbose_name='暂存路径')),
+                ('size', models.BigIntegerField(default=0, verbose_name='文件大小')),
+                ('status', models.CharField(choices=[('pending', '等待处理'), ('running', '处理中'), ('succeeded', '处理成功'), ('failed', '处理失败')], default='pending', max_length=20, verbose_name='处理状态')),
+                ('rows_read', models.IntegerField(default=0, verbose_name='已读取行数')),
+                ('rows_written', models.IntegerField(default=0, verbose_name='已写入记录数')),
+                ('error', models.TextField(blank=True, default='', verbose_name='错误信息')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='files', to='upload.assessment_uploadjob')),
+            ],
+            options={
+                'verbose_name': '上传任务文件',
+                'verbose_name_plural': '上传任务文件',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload', '0016_assessment_uploadjob_assessment_uploadjobfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assessment_file',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='内容哈希'),
+        ),
+        migrations.AddField(
+            model_name='assessment_file',
+            name='row_count',
+            field=models.IntegerField(default=0, verbose_name='记录数'),
+        ),
+        migrations.AlterField(
+            model_name='assessment_uploadjob',
+            name='status',
+            field=models.CharField(choices=[('pending', '等待处理'), ('running', '处理中'), ('succeeded', '处理成功'), ('failed', '处理失败'), ('unchanged', '内容未变化')], default='pending', max_length=20, verbose_name='任务状态'),
+        ),
+        migrations.AlterField(
+            model_name='assessment_uploadjobfile',
+            name='status',
+            field=models.CharField(choices=[('pending', '等待处理'), ('running', '处理中'), ('succeeded', '处理成功'), ('failed', '处理失败'), ('unchanged', '内容未变化')], default='pending', max_length=20, verbose_name='处理状态'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload', '0017_assessment_file_content_hash_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assessment_base',
+            name='file_version',
+            field=models.IntegerField(default=0, verbose_name='文件版本'),
+        ),
+        migrations.AddField(
+            model_name='assessment_base',
+            name='is_published',
+            field=models.BooleanField(default=True, verbose_name='已发布'),
+        ),
+        migrations.AddField(
+            model_name='assessment_file',
+            name='last_version',
+            field=models.IntegerField(default=0, verbose_name='最新版本'),
+        ),
+        migrations.AddField(
+            model_name='assessment_file',
+            name='version',
+            field=models.IntegerField(default=0, verbose_name='已发布版本'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload', '0018_assessment_base_file_version_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Assessment_ChunkedUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=100, verbose_name='文件名')),
+                ('size', models.BigIntegerField(blank=True, null=True, verbose_name='文件大小')),
+                ('offset', models.BigIntegerField(default=0, verbose_name='已接收字节数')),
+                ('spool_path', models.CharField(max_length=500, verbose_name='暂存路径')),
+                ('status', models.CharField(choices=[('uploading', '上传中'), ('finalized', '已完成')], default='uploading', max_length=20, verbose_name='上传状态')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='上传用户')),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chunked_uploads', to='upload.assessment_uploadjob', verbose_name='上传任务')),
+            ],
+            options={
+                'verbose_name': '分块上传',
+                'verbose_name_plural': '分块上传',
+                'ordering': ['-id'],
+            },
+        ),
+    ]
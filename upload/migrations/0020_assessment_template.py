@@ -0,0 +1,29 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload', '0019_assessment_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Assessment_Template',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assessment_item', models.CharField(blank=True, max_length=100, null=True, verbose_name='考核项目')),
+                ('header_signature', models.CharField(max_length=64, verbose_name='表头签名')),
+                ('columns', models.JSONField(default=list, verbose_name='表头')),
+                ('additional_columns', models.JSONField(default=list, verbose_name='附加数据列')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '考核模板',
+                'verbose_name_plural': '考核模板',
+                'unique_together': {('assessment_item', 'header_signature')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload', '0020_assessment_template'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Assessment_Rejection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(db_index=True, max_length=100, verbose_name='文件名')),
+                ('row_index', models.IntegerField(verbose_name='行号')),
+                ('reason', models.CharField(choices=[('invalid_work_certificate_number', '工作证编号不是大于四位数的数字'), ('invalid_record_date', '记录日期格式错误')], max_length=40, verbose_name='跳过原因')),
+                ('value', models.CharField(blank=True, default='', max_length=100, verbose_name='原始值')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='记录时间')),
+            ],
+            options={
+                'verbose_name': '跳过的行',
+                'verbose_name_plural': '跳过的行',
+                'ordering': ['file_name', 'row_index'],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload', '0021_assessment_rejection'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assessment_base',
+            index=models.Index(fields=['is_published', 'record_date'], name='base_published_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assessment_base',
+            index=models.Index(fields=['is_published', 'train_model', 'assessment_item', 'record_date'], name='base_model_item_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assessment_base',
+            index=models.Index(fields=['is_published', 'assessment_item', 'record_date'], name='base_item_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assessment_base',
+            index=models.Index(fields=['file_name', 'is_published', 'file_version'], name='base_file_version_idx'),
+        ),
+    ]
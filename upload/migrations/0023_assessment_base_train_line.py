@@ -0,0 +1,34 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:49
+
+from django.db import migrations, models
+from django.db.models import Case, When
+from django.db.models.functions import Length, Substr
+from django.db.models.lookups import GreaterThanOrEqual
+
+
+# 已有记录的线路编号用一条 UPDATE 语句按车型的前两位回填，车型不足两位时为空
+def backfill_train_line(apps, schema_editor):
+    Assessment_Base = apps.get_model('upload', 'Assessment_Base')
+    Assessment_Base.objects.update(
+        train_line=Case(When(GreaterThanOrEqual(Length('train_model'), 2), then=Substr('train_model', 1, 2)), default=None),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload', '0022_assessment_base_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assessment_base',
+            name='train_line',
+            field=models.CharField(blank=True, max_length=2, null=True, verbose_name='线路'),
+        ),
+        migrations.RunPython(backfill_train_line, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='assessment_base',
+            index=models.Index(fields=['is_published', 'train_line', 'record_date'], name='base_line_date_idx'),
+        ),
+    ]
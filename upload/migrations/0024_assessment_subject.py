@@ -0,0 +1,44 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:51
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+# 按已有的已发布记录生成科目目录
+def build_subjects(apps, schema_editor):
+    Assessment_Base = apps.get_model('upload', 'Assessment_Base')
+    Assessment_Subject = apps.get_model('upload', 'Assessment_Subject')
+    Assessment_Subject.objects.bulk_create([
+        Assessment_Subject(**row) for row in
+        Assessment_Base.objects.filter(is_published=True).values('train_model', 'assessment_item').order_by()
+        .annotate(row_count=Count('id'), first_date=Min('record_date'), last_date=Max('record_date'))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload', '0023_assessment_base_train_line'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Assessment_Subject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('train_model', models.CharField(blank=True, max_length=20, null=True, verbose_name='车型')),
+                ('assessment_item', models.CharField(blank=True, max_length=100, null=True, verbose_name='考核项目')),
+                ('row_count', models.IntegerField(default=0, verbose_name='记录数')),
+                ('first_date', models.DateField(blank=True, null=True, verbose_name='最早日期')),
+                ('last_date', models.DateField(blank=True, null=True, verbose_name='最晚日期')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '科目',
+                'verbose_name_plural': '科目',
+                'ordering': ['train_model', 'assessment_item'],
+                'unique_together': {('train_model', 'assessment_item')},
+            },
+        ),
+        migrations.RunPython(build_subjects, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:53
+
+import re
+
+from django.db import migrations, models
+
+# 回填时每批读取和更新的记录数
+BACKFILL_BATCH_SIZE = 2000
+
+# 以下换算规则复制自编写本迁移时的 upload.models，之后模型中的规则变化不影响本迁移的结果
+TIME_COLUMNS = ['整体耗时', '整体用时']
+
+CLOCK_PATTERN = r'(?:(\d+):)?(\d+):(\d+(?:\.\d+)?)'
+
+
+def duration_seconds(value):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if value != value else float(value)
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    match = re.fullmatch(CLOCK_PATTERN, text)
+    if match is None:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def total_seconds_of(additional_data):
+    for time_column in TIME_COLUMNS:
+        if additional_data and time_column in additional_data:
+            return duration_seconds(additional_data[time_column])
+    return None
+
+
+# 按已有记录的 additional_data 分批回填整体用时的秒数，按 id 分段读取，不在读取游标未关闭时更新同一张表
+def backfill_total_seconds(apps, schema_editor):
+    Assessment_Base = apps.get_model('upload', 'Assessment_Base')
+    rows = Assessment_Base.objects.exclude(additional_data=None).order_by('id')
+    last_id = 0
+    while True:
+        batch = list(rows.filter(id__gt=last_id).values_list('id', 'additional_data')[:BACKFILL_BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        Assessment_Base.objects.bulk_update([
+            Assessment_Base(id=record_id, total_seconds=total_seconds_of(additional_data))
+            for record_id, additional_data in batch
+        ], ['total_seconds'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload', '0024_assessment_subject'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assessment_base',
+            name='total_seconds',
+            field=models.FloatField(blank=True, null=True, verbose_name='整体用时（秒）'),
+        ),
+        migrations.RunPython(backfill_total_seconds, migrations.RunPython.noop),
+    ]
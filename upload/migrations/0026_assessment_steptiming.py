@@ -0,0 +1,30 @@
+# Generated by Django 4.2.6 on 2026-10-18 21:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload', '0025_assessment_base_total_seconds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Assessment_StepTiming',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('step_key', models.CharField(max_length=255, verbose_name='步骤')),
+                ('step_order', models.IntegerField(verbose_name='步骤序号')),
+                ('seconds', models.FloatField(verbose_name='用时（秒）')),
+                ('assessment_base', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='step_timings', to='upload.assessment_base', verbose_name='考核信息')),
+            ],
+            options={
+                'verbose_name': '步骤用时',
+                'verbose_name_plural': '步骤用时',
+                'ordering': ['assessment_base', 'step_order'],
+                'indexes': [models.Index(fields=['step_key', 'assessment_base', 'seconds'], name='step_key_base_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 4.2.6 on 2026-10-18 22:06
+
+import hashlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# 转换时每批读取和更新的记录数
+CONVERT_BATCH_SIZE = 2000
+
+# 列名签名的算法复制自编写本迁移时的 upload.models，之后模型中的算法变化不影响本迁移写入的主键
+DATA_KEYS_SIGNATURE_LENGTH = 32
+
+
+def data_keys_signature(keys):
+    return hashlib.sha256('\x1f'.join(str(key) for key in keys).encode('utf-8')).hexdigest()[:DATA_KEYS_SIGNATURE_LENGTH]
+
+
+# 按 id 分段读取记录，每批转换后用 bulk_update 写回
+def _convert_in_batches(Assessment_Base, fields, convert):
+    last_id = 0
+    while True:
+        batch = list(Assessment_Base.objects.filter(id__gt=last_id).order_by('id').values_list('id', *fields)[:CONVERT_BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        objects = [convert(Assessment_Base(id=row[0]), *row[1:]) for row in batch]
+        Assessment_Base.objects.bulk_update(objects, convert.update_fields)
+
+
+# 将已有记录的 additional_data 拆分为列名字典和按顺序排列的值，不是字典的值原样保存
+def split_additional_data(apps, schema_editor):
+    Assessment_Base = apps.get_model('upload', 'Assessment_Base')
+    Assessment_DataKeys = apps.get_model('upload', 'Assessment_DataKeys')
+    registered = set(Assessment_DataKeys.objects.values_list('signature', flat=True))
+
+    def convert(obj, additional_data):
+        if isinstance(additional_data, dict):
+            keys = list(additional_data)
+            signature = data_keys_signature(keys)
+            if signature not in registered:
+                Assessment_DataKeys.objects.create(signature=signature, keys=keys)
+                registered.add(signature)
+            obj.data_keys_id, obj.data_values = signature, list(additional_data.values())
+        else:
+            obj.data_keys_id, obj.data_values = None, additional_data
+        return obj
+    convert.update_fields = ['data_keys', 'data_values']
+    _convert_in_batches(Assessment_Base, ['additional_data'], convert)
+
+
+# 回退时按列名字典还原 additional_data
+def join_additional_data(apps, schema_editor):
+    Assessment_Base = apps.get_model('upload', 'Assessment_Base')
+    Assessment_DataKeys = apps.get_model('upload', 'Assessment_DataKeys')
+    keys = dict(Assessment_DataKeys.objects.values_list('signature', 'keys'))
+
+    def convert(obj, data_keys, data_values):
+        obj.additional_data = data_values if data_keys is None else dict(zip(keys[data_keys], data_values))
+        return obj
+    convert.update_fields = ['additional_data']
+    _convert_in_batches(Assessment_Base, ['data_keys', 'data_values'], convert)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload', '0026_assessment_steptiming'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Assessment_DataKeys',
+            fields=[
+                ('signature', models.CharField(max_length=32, primary_key=True, serialize=False, verbose_name='列名签名')),
+                ('keys', models.JSONField(default=list, verbose_name='列名')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '附加数据列名',
+                'verbose_name_plural': '附加数据列名',
+            },
+        ),
+        migrations.AddField(
+            model_name='assessment_base',
+            name='data_values',
+            field=models.JSONField(blank=True, null=True, verbose_name='动态数据值'),
+        ),
+        migrations.AddField(
+            model_name='assessment_base',
+            name='data_keys',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='upload.assessment_datakeys', verbose_name='动态数据列名'),
+        ),
+        migrations.RunPython(split_additional_data, join_additional_data),
+        migrations.RemoveField(
+            model_name='assessment_base',
+            name='additional_data',
+        ),
+    ]
@@ -1,4 +1,9 @@
-from django.db import models
+import hashlib
+import re
+
+from django.conf import settings
+from django.db import connection, models
+from django.db.models import Value
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import UserManager
 from django.utils.translation import gettext_lazy as _
@@ -21,6 +26,115 @@ class NewUser(AbstractUser):
         verbose_name_plural = verbose_name  
         swappable = 'AUTH_USER_MODEL'
 
+# 考核信息查询集，读取数据时只返回已发布的记录
+class AssessmentBaseQuerySet(models.QuerySet):
+    # 用 Value(True) 生成 is_published = 1 的等值条件，Django 对布尔字段默认生成的 WHERE "is_published" 在 SQLite 中用不上以它开头的索引
+    def published(self):
+        return self.filter(is_published=Value(True))
+
+# 线路编号的长度，车型的前两位即线路编号
+TRAIN_LINE_LENGTH = 2
+
+# 根据车型得到线路编号
+def train_line_of(train_model):
+    if train_model and len(train_model) >= TRAIN_LINE_LENGTH:
+        return train_model[:TRAIN_LINE_LENGTH]
+    return None
+
+# 整体用时所在列的列名，该列及其之后的列都存入 additional_data
+TIME_COLUMNS = ['整体耗时', '整体用时']
+
+# 整体用时的 分:秒 或 时:分:秒 写法
+CLOCK_PATTERN = r'(?:(\d+):)?(\d+):(\d+(?:\.\d+)?)'
+
+# 将整体用时换算为秒数：数字直接作为秒数，分:秒 和 时:分:秒 换算为秒数，其他无法解析的为空
+def duration_seconds(value):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if value != value else float(value)
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    match = re.fullmatch(CLOCK_PATTERN, text)
+    if match is None:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + float(seconds)
+
+# additional_data 中的整体用时
+def total_seconds_of(additional_data):
+    for time_column in TIME_COLUMNS:
+        if additional_data and time_column in additional_data:
+            return duration_seconds(additional_data[time_column])
+    return None
+
+# additional_data 中各步骤的用时：整体用时之外的各列按顺序从 1 开始编号，返回能换算为秒数的 (序号, 步骤, 秒数)
+def step_seconds_of(additional_data):
+    if not isinstance(additional_data, dict):
+        return []
+    steps = [key for key in additional_data if key not in TIME_COLUMNS]
+    timings = []
+    for order, key in enumerate(steps, 1):
+        seconds = duration_seconds(additional_data[key])
+        if seconds is not None:
+            timings.append((order, key, seconds))
+    return timings
+
+# 列名字典主键的长度，取列名列表 SHA-256 的前 32 位十六进制数字
+DATA_KEYS_SIGNATURE_LENGTH = 32
+
+# 一组有序列名的签名，同样的列名总是得到同样的签名，不访问数据库就能算出
+def data_keys_signature(keys):
+    return hashlib.sha256('\x1f'.join(str(key) for key in keys).encode('utf-8')).hexdigest()[:DATA_KEYS_SIGNATURE_LENGTH]
+
+# 附加数据的列名字典：同一个文件（同一考核模板）的记录，additional_data 的键完全相同
+# 键的列表在这里只保存一次，每条记录只保存列名字典的主键和按顺序排列的值
+# 主键就是列名的签名，子进程不访问数据库也能为清洗好的记录填写；同一个主键的列名永远不变，按主键缓存不需要失效
+class Assessment_DataKeys(models.Model):
+    signature = models.CharField(max_length=DATA_KEYS_SIGNATURE_LENGTH, primary_key=True, verbose_name="列名签名")
+    keys = models.JSONField(default=list, verbose_name="列名")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+
+    class Meta:
+        verbose_name = "附加数据列名"
+        verbose_name_plural = verbose_name
+
+    def __str__(self):
+        return f"{self.signature[:8]}: {', '.join(self.keys)}"
+
+# 进程内缓存的列名字典，键为签名
+_data_keys_cache = {}
+
+# 登记一组列名，返回其签名；写入引用这组列名的记录之前调用
+def register_data_keys(keys):
+    keys = [str(key) for key in keys]
+    signature = data_keys_signature(keys)
+    Assessment_DataKeys.objects.get_or_create(signature=signature, defaults={'keys': keys})
+    _data_keys_cache[signature] = keys
+    return signature
+
+# 按签名取列名，依次查找进程内缓存和数据库
+def data_keys_of(signature):
+    keys = _data_keys_cache.get(signature)
+    if keys is None:
+        keys = _data_keys_cache[signature] = Assessment_DataKeys.objects.get(signature=signature).keys
+    return keys
+
+# 将 additional_data 拆分为 (列名签名, 值的列表)；不是字典的 JSON 值没有列名，原样保存为值
+def encode_additional_data(additional_data):
+    if isinstance(additional_data, dict):
+        return register_data_keys(additional_data), list(additional_data.values())
+    return None, additional_data
+
+# 由列名签名和值的列表还原 additional_data，与拆分前的字典完全相同，包括键的顺序
+def decode_additional_data(signature, values):
+    if signature is None:
+        return values
+    return dict(zip(data_keys_of(signature), values))
+
 # 定义基础考核信息模型
 class Assessment_Base(models.Model):
     file_name = models.CharField(max_length=100, null=True, blank=True)
@@ -29,6 +143,8 @@ class Assessment_Base(models.Model):
     name = models.CharField(max_length=100, verbose_name="姓名", null=True, blank=True)
     work_certificate_number = models.IntegerField(verbose_name="工作证编号", null=True, blank=True)
     train_model = models.CharField(max_length=20, verbose_name="车型", null=True, blank=True)
+    # 线路编号，即车型的前两位，车型不足两位时为空；入库时填写，按线路筛选时直接用索引等值查找
+    train_line = models.CharField(max_length=TRAIN_LINE_LENGTH, verbose_name="线路", null=True, blank=True)
     assessment_item = models.CharField(max_length=100, verbose_name="考核项目", null=True, blank=True)
     # 考核结果的选择字段
     EXCELLENT = 3
@@ -47,13 +163,60 @@ class Assessment_Base(models.Model):
         default=OTHER,  # 默认值设置为0，对应于“其他”
         verbose_name="考核结果"
     )
-    # 动态数据字段存储整体用时和每个步骤的用时
-    additional_data = models.JSONField(verbose_name="动态数据", blank=True, null=True)  # 用于存储额外的动态数据
+    # 动态数据 additional_data 存储整体用时和每个步骤的用时，拆分为列名字典和按顺序排列的值两列保存，通过同名属性读写完整的字典
+    # 列名字典从不删除，也不按它查询记录，不需要为这一列建立索引
+    data_keys = models.ForeignKey(Assessment_DataKeys, on_delete=models.PROTECT, db_index=False, null=True, blank=True, related_name='+', verbose_name="动态数据列名")
+    data_values = models.JSONField(verbose_name="动态数据值", blank=True, null=True)
+    # additional_data 中的整体用时换算成的秒数，入库时填写，统计接口直接在 SQL 中按列计算平均值
+    total_seconds = models.FloatField(verbose_name="整体用时（秒）", null=True, blank=True)
+    # 上传时先以未发布状态写入暂存记录，整个文件写完后在一个短事务中发布，读取方不会看到只写入了一部分的文件
+    is_published = models.BooleanField(default=True, verbose_name="已发布")
+    # 记录所属的文件版本，与 Assessment_File.version 对应
+    file_version = models.IntegerField(default=0, verbose_name="文件版本")
+
+    objects = AssessmentBaseQuerySet.as_manager()
 
     class Meta:
         verbose_name = "考核信息"
         verbose_name_plural = verbose_name
         ordering = ['id']
+        # 与 AssessmentBaseViewSet 的筛选和排序对应：列表只查已发布的记录，按日期范围筛选并按日期排序
+        # 已发布的条件作为各索引的第一列；不使用部分索引，生产环境的 MySQL 不支持带条件的索引，Django 会跳过创建
+        # 选择了科目（车型和考核项目）或只选择了考核项目时，等值条件之后的日期列直接提供有序的范围扫描
+        # 按文件名删除、发布和丢弃暂存记录时使用 (file_name, is_published, file_version)，按文件名查询已发布的记录时两个等值条件都在索引上
+        indexes = [
+            models.Index(fields=['is_published', 'record_date'], name='base_published_date_idx'),
+            models.Index(fields=['is_published', 'train_model', 'assessment_item', 'record_date'], name='base_model_item_date_idx'),
+            models.Index(fields=['is_published', 'assessment_item', 'record_date'], name='base_item_date_idx'),
+            models.Index(fields=['is_published', 'train_line', 'record_date'], name='base_line_date_idx'),
+            models.Index(fields=['file_name', 'is_published', 'file_version'], name='base_file_version_idx'),
+        ]
+
+    @property
+    def additional_data(self):
+        return decode_additional_data(self.data_keys_id, self.data_values)
+
+    @additional_data.setter
+    def additional_data(self, value):
+        self.data_keys_id, self.data_values = encode_additional_data(value)
+
+    # 通过接口或管理后台保存时根据车型填写线路编号、根据动态数据填写整体用时的秒数并重新生成步骤用时，批量写入时由入库逻辑整列填写
+    # update_fields 中的 additional_data 对应实际保存的列名字典和值两列
+    def save(self, *args, **kwargs):
+        additional_data = self.additional_data
+        self.train_line = train_line_of(self.train_model)
+        self.total_seconds = total_seconds_of(additional_data)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'train_model' in update_fields:
+                update_fields.add('train_line')
+            if 'additional_data' in update_fields:
+                update_fields = (update_fields - {'additional_data'}) | {'data_keys', 'data_values', 'total_seconds'}
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+        if update_fields is None or 'data_values' in update_fields:
+            replace_step_timings([(self.id, additional_data)])
 
     def __str__(self):
         # 显示车型信息-文件名-姓名
@@ -71,4 +234,213 @@ class Assessment_Classification(models.Model):
         verbose_name_plural = verbose_name
 
     def __str__(self):
-        return f"{self.assessment_base.file_name}: {self.category}"
\ No newline at end of file
+        return f"{self.assessment_base.file_name}: {self.category}"
+
+# 步骤用时事实表，additional_data 中整体用时之外每个能换算为秒数的步骤一行
+# 入库时整列写入，存量数据由 manage.py backfill_step_timings 回填；按步骤统计用时直接在 SQL 中对数值列聚合，不再逐条解析 JSON
+class Assessment_StepTiming(models.Model):
+    assessment_base = models.ForeignKey(Assessment_Base, on_delete=models.CASCADE, related_name='step_timings', verbose_name="考核信息")
+    step_key = models.CharField(max_length=255, verbose_name="步骤")  # additional_data 中的列名
+    step_order = models.IntegerField(verbose_name="步骤序号")  # 在 additional_data 中的顺序，从 1 开始
+    seconds = models.FloatField(verbose_name="用时（秒）")
+
+    class Meta:
+        verbose_name = "步骤用时"
+        verbose_name_plural = verbose_name
+        ordering = ['assessment_base', 'step_order']
+        # 按步骤统计时先按步骤等值查找，再关联考核信息按班组、科目等分组，用时列也在索引中
+        indexes = [
+            models.Index(fields=['step_key', 'assessment_base', 'seconds'], name='step_key_base_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.assessment_base_id} - {self.step_key}: {self.seconds}"
+
+# 写入步骤用时，rows 为 (记录 id, 步骤, 步骤序号, 秒数)
+# 一个文件有几十万条步骤用时，逐个构造模型实例再由 bulk_create 编译 SQL 的开销远大于写入本身，这里直接用 executemany 批量插入
+def insert_step_timings(rows):
+    rows = list(rows)
+    if rows:
+        opts = Assessment_StepTiming._meta
+        quote_name = connection.ops.quote_name
+        columns = ', '.join(quote_name(opts.get_field(name).column) for name in ('assessment_base', 'step_key', 'step_order', 'seconds'))
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {quote_name(opts.db_table)} ({columns}) VALUES (%s, %s, %s, %s)', rows)
+    return len(rows)
+
+# 按 additional_data 重新生成记录的步骤用时，rows 为 (记录 id, additional_data)
+# 通过接口或管理后台保存记录、回填存量数据时使用，入库时由 ingestion.build_step_timings 整列生成
+def replace_step_timings(rows):
+    rows = list(rows)
+    Assessment_StepTiming.objects.filter(assessment_base_id__in=[record_id for record_id, _ in rows]).delete()
+    return insert_step_timings(
+        (record_id, key, order, seconds)
+        for record_id, additional_data in rows for order, key, seconds in step_seconds_of(additional_data)
+    )
+
+# 上传文件信息模型，按文件名记录每个来源文件的元数据
+class Assessment_File(models.Model):
+    file_name = models.CharField(max_length=100, unique=True, verbose_name="文件名")
+    # 上次成功解析时使用的编码，同一来源再次上传时直接使用，跳过编码检测
+    encoding = models.CharField(max_length=20, verbose_name="文件编码", null=True, blank=True)
+    # 上次成功写入时文件内容的 SHA-256 和写入的记录数，内容相同的重复上传直接跳过
+    content_hash = models.CharField(max_length=64, verbose_name="内容哈希", null=True, blank=True)
+    row_count = models.IntegerField(default=0, verbose_name="记录数")
+    # version 为当前已发布的文件版本，last_version 为最近一次上传分配的版本
+    version = models.IntegerField(default=0, verbose_name="已发布版本")
+    last_version = models.IntegerField(default=0, verbose_name="最新版本")
+    uploaded_at = models.DateTimeField(auto_now=True, verbose_name="上传时间")
+
+    class Meta:
+        verbose_name = "文件信息"
+        verbose_name_plural = verbose_name
+
+    def __str__(self):
+        return f"{self.file_name} ({self.encoding})"
+
+
+# 考核模板：同一考核项目、同样表头的文件共用一份预先计算好的列映射，入库时不再逐个文件查找整体用时列
+class Assessment_Template(models.Model):
+    assessment_item = models.CharField(max_length=100, null=True, blank=True, verbose_name="考核项目")
+    # 表头各列名的 SHA-256
+    header_signature = models.CharField(max_length=64, verbose_name="表头签名")
+    columns = models.JSONField(default=list, verbose_name="表头")
+    # 整体用时列及其之后的各列，存入 additional_data
+    additional_columns = models.JSONField(default=list, verbose_name="附加数据列")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+
+    class Meta:
+        verbose_name = "考核模板"
+        verbose_name_plural = verbose_name
+        unique_together = [('assessment_item', 'header_signature')]
+
+    def __str__(self):
+        return f"{self.assessment_item} ({self.header_signature[:8]})"
+
+
+# 科目目录，每个车型和考核项目的组合一行，记录已发布的记录数和最早、最晚日期
+# 入库和通过接口增删改记录时由 catalog.refresh_subjects 增量更新，为前端的科目选项框提供数据
+class Assessment_Subject(models.Model):
+    train_model = models.CharField(max_length=20, null=True, blank=True, verbose_name="车型")
+    assessment_item = models.CharField(max_length=100, null=True, blank=True, verbose_name="考核项目")
+    row_count = models.IntegerField(default=0, verbose_name="记录数")
+    first_date = models.DateField(null=True, blank=True, verbose_name="最早日期")
+    last_date = models.DateField(null=True, blank=True, verbose_name="最晚日期")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "科目"
+        verbose_name_plural = verbose_name
+        unique_together = [('train_model', 'assessment_item')]
+        ordering = ['train_model', 'assessment_item']
+
+    def __str__(self):
+        return f"{self.train_model}-{self.assessment_item}"
+
+
+# 后台上传任务模型，一次上传请求对应一个任务，任务本身就是数据库中的待处理队列
+class Assessment_UploadJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    UNCHANGED = 'unchanged'
+    STATUS_CHOICES = [
+        (PENDING, '等待处理'),
+        (RUNNING, '处理中'),
+        (SUCCEEDED, '处理成功'),
+        (FAILED, '处理失败'),  # 至少有一个文件处理失败
+        (UNCHANGED, '内容未变化'),  # 仅用于文件，与上次上传的内容完全相同，未重新写入
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING, verbose_name="任务状态")
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="上传用户")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="开始时间")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="完成时间")
+    # 处理中的任务每写完一个分块更新一次，长时间没有更新说明处理任务的进程已经退出
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "上传任务"
+        verbose_name_plural = verbose_name
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"{self.id} - {self.status}"
+
+
+# 上传任务中的单个文件，记录暂存路径、处理进度和错误信息
+class Assessment_UploadJobFile(models.Model):
+    job = models.ForeignKey(Assessment_UploadJob, on_delete=models.CASCADE, related_name='files')
+    file_name = models.CharField(max_length=100, verbose_name="文件名")
+    spool_path = models.CharField(max_length=500, verbose_name="暂存路径")
+    size = models.BigIntegerField(default=0, verbose_name="文件大小")
+    status = models.CharField(max_length=20, choices=Assessment_UploadJob.STATUS_CHOICES, default=Assessment_UploadJob.PENDING, verbose_name="处理状态")
+    rows_read = models.IntegerField(default=0, verbose_name="已读取行数")
+    rows_written = models.IntegerField(default=0, verbose_name="已写入记录数")
+    error = models.TextField(blank=True, default='', verbose_name="错误信息")
+
+    class Meta:
+        verbose_name = "上传任务文件"
+        verbose_name_plural = verbose_name
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.job_id} - {self.file_name}"
+
+
+# 分块续传的上传会话，客户端按偏移量分多次追加文件内容，网络中断后从已接收的字节数继续上传
+class Assessment_ChunkedUpload(models.Model):
+    UPLOADING = 'uploading'
+    FINALIZED = 'finalized'
+    STATUS_CHOICES = [
+        (UPLOADING, '上传中'),
+        (FINALIZED, '已完成'),
+    ]
+
+    file_name = models.CharField(max_length=100, verbose_name="文件名")
+    # 客户端声明的文件总大小，完成上传时校验已接收的字节数
+    size = models.BigIntegerField(null=True, blank=True, verbose_name="文件大小")
+    # 已接收的字节数，下一个分块必须从这个偏移量开始
+    offset = models.BigIntegerField(default=0, verbose_name="已接收字节数")
+    spool_path = models.CharField(max_length=500, verbose_name="暂存路径")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=UPLOADING, verbose_name="上传状态")
+    # 完成上传后创建的后台上传任务
+    job = models.ForeignKey(Assessment_UploadJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='chunked_uploads', verbose_name="上传任务")
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="上传用户")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "分块上传"
+        verbose_name_plural = verbose_name
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"{self.id} - {self.file_name} ({self.offset}/{self.size})"
+
+
+# 入库时被跳过的行，每次成功写入一个文件时整体替换该文件之前的记录
+class Assessment_Rejection(models.Model):
+    INVALID_WORK_CERTIFICATE_NUMBER = 'invalid_work_certificate_number'
+    INVALID_RECORD_DATE = 'invalid_record_date'
+    REASON_CHOICES = [
+        (INVALID_WORK_CERTIFICATE_NUMBER, '工作证编号不是大于四位数的数字'),
+        (INVALID_RECORD_DATE, '记录日期格式错误'),
+    ]
+
+    file_name = models.CharField(max_length=100, db_index=True, verbose_name="文件名")
+    # 数据行的序号，从列名之后的第一行开始为 0
+    row_index = models.IntegerField(verbose_name="行号")
+    reason = models.CharField(max_length=40, choices=REASON_CHOICES, verbose_name="跳过原因")
+    value = models.CharField(max_length=100, blank=True, default='', verbose_name="原始值")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="记录时间")
+
+    class Meta:
+        verbose_name = "跳过的行"
+        verbose_name_plural = verbose_name
+        ordering = ['file_name', 'row_index']
+
+    def __str__(self):
+        return f"{self.file_name} 第 {self.row_index} 行: {self.get_reason_display()}"
@@ -0,0 +1,446 @@
+import codecs
+import csv
+import gzip
+import hashlib
+import io
+import itertools
+import zipfile
+from contextlib import ExitStack, contextmanager
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    from pyarrow import compute as pa_compute
+    from pyarrow import csv as pa_csv
+except ImportError:
+    # pyarrow 是可选依赖，没有安装时只使用 pandas 的解析器
+    pa = pa_compute = pa_csv = None
+
+'''
+考核文件的读取逻辑
+原先逐个尝试九种编码，每次都完整解码整个文件并重新解析，而且 latin1 从不失败，后面的编码永远用不到
+这里只读取文件开头的一小段字节，先检查 BOM，再依次尝试少量候选编码，一次确定编码后直接交给解析器
+Excel 文件用 openpyxl 的只读模式逐行读取，同样按分块交给清洗和写入逻辑，不会把整个工作簿读入内存
+.gz 文件和 .zip 压缩包在读取时流式解压，压缩包中的每个文件都作为单独的文件导入
+CSV 的固定列按声明的类型读取，不再逐列推断；安装了 pyarrow 时直接在原始字节上用 pyarrow 的流式 CSV 解析器，遇到它处理不了的文件再用 pandas 重新解析
+'''
+
+# 流式读取 CSV 时每个分块的行数
+CHUNK_SIZE = 20000
+
+# 固定列的声明类型：姓名、工作证编号按文本读取，车型、考核项目重复值很多，按分类读取
+STRING_COLUMNS = ['姓名', '工作证编号']
+CATEGORY_COLUMNS = ['车型', '考核项目']
+# 日期列读成整数；含有无法转换为整数的日期时保留原文，由清洗逻辑给出跳过原因
+DATE_COLUMNS = ['日期', '记录日期']
+
+# pandas 解析时固定列的类型
+PANDAS_DTYPES = {**{column: str for column in STRING_COLUMNS}, **{column: 'category' for column in CATEGORY_COLUMNS}}
+
+# 与 pandas 默认一致的空值文本，pyarrow 解析时同样按空值处理
+NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+]
+
+# CSV 解析器：pyarrow 更快，pandas 能处理列数不一致等不规范的文件
+PYARROW_ENGINE = 'pyarrow'
+PANDAS_ENGINE = 'pandas'
+
+# 换下一个解析器或编码重新解析的错误
+PARSE_ERRORS = (UnicodeDecodeError,) + ((pa.ArrowInvalid,) if pa else ())
+
+# 按 Excel 读取的文件扩展名，其余文件都按 CSV 读取
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+
+# 压缩文件的扩展名
+GZIP_EXTENSION = '.gz'
+ZIP_EXTENSION = '.zip'
+
+# 批量导入目录时收集的文件扩展名
+IMPORT_EXTENSIONS = ('.csv',) + EXCEL_EXTENSIONS + (GZIP_EXTENSION, ZIP_EXTENSION)
+
+# 计算内容哈希时每次读取的字节数
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# 编码检测时读取的文件开头字节数
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+# 按 BOM 判断编码，UTF-32 的 BOM 以 UTF-16 的 BOM 开头，必须先判断
+BOM_ENCODINGS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+'''
+没有 BOM 时依次尝试的编码
+'gb18030'：简体中文字符集，兼容 GBK 和 GB2312
+'latin1'：任何字节序列都能解码，作为最后的兜底
+不尝试 big5：gb18030 几乎能解码任意双字节内容，big5 文件会被当作 gb18030 读成乱码，排在后面的 big5 永远不会被选中
+考核表的列名是简体中文，big5 也无法编码其中的 证、编、号 等字，这里不支持 big5 文件
+'''
+SAMPLE_ENCODINGS = ['utf-8', 'gb18030']
+FALLBACK_ENCODING = 'latin1'
+
+
+# 获取上传文件的读取来源：大文件已由 Django 写入临时文件，直接按路径读取；小文件在内存中，直接读取文件对象
+def get_upload_source(file_obj):
+    if hasattr(file_obj, 'temporary_file_path'):
+        return file_obj.temporary_file_path()
+    # pandas 只把 BytesIO 等已知的二进制对象当作字节流按指定编码解码，因此传入底层的文件对象
+    file_obj.file.seek(0)
+    return file_obj.file
+
+
+# 获取可以传给子进程的读取来源：临时文件传路径，内存中的小文件传字节串
+def get_parallel_source(file_obj):
+    if hasattr(file_obj, 'temporary_file_path'):
+        return file_obj.temporary_file_path()
+    file_obj.seek(0)
+    return file_obj.read()
+
+
+'''
+压缩文件中的一个文件
+只记录压缩文件的读取来源和成员名，可以传给子进程，在 open_source 中才打开并流式解压
+成员名为 None 表示 .gz 文件中唯一的文件
+'''
+class ArchiveMember:
+    def __init__(self, archive, archive_name, member_name=None):
+        self.archive = archive
+        self.archive_name = archive_name
+        self.member_name = member_name
+
+    def open(self, stack):
+        archive = self.archive
+        if isinstance(archive, bytes):
+            archive = io.BytesIO(archive)
+        elif not isinstance(archive, str):
+            archive.seek(0)
+        if self.member_name is None:
+            return stack.enter_context(gzip.open(archive, 'rb'))
+        bundle = stack.enter_context(zipfile.ZipFile(archive))
+        return stack.enter_context(bundle.open(self.member_name))
+
+
+def _is_archive_entry(info):
+    # 跳过目录、macOS 压缩时附带的 __MACOSX 目录以及隐藏文件
+    base_name = info.filename.rsplit('/', 1)[-1]
+    return not info.is_dir() and not info.filename.startswith('__MACOSX/') and not base_name.startswith('.')
+
+
+'''
+展开上传的文件，返回 (文件名, 读取来源) 的列表
+普通文件原样返回；.gz 文件去掉 .gz 后缀作为文件名，与直接上传解压后的文件对应同一份数据
+.zip 压缩包中的每个文件各作为一个文件，以压缩包内的路径作为文件名
+这里只读取压缩包的目录，不解压任何内容
+'''
+def expand_upload(source, file_name):
+    lower_name = file_name.lower()
+    if lower_name.endswith(GZIP_EXTENSION):
+        return [(file_name[:-len(GZIP_EXTENSION)], ArchiveMember(source, file_name))]
+    if not lower_name.endswith(ZIP_EXTENSION):
+        return [(file_name, source)]
+
+    with ExitStack() as stack:
+        archive = source
+        if isinstance(archive, bytes):
+            archive = io.BytesIO(archive)
+        elif not isinstance(archive, str):
+            archive.seek(0)
+        bundle = stack.enter_context(zipfile.ZipFile(archive))
+        members = [info.filename for info in bundle.infolist() if _is_archive_entry(info)]
+    if not members:
+        raise ValueError(f'压缩包 {file_name} 中没有可以导入的文件!')
+    return [(member, ArchiveMember(source, file_name, member)) for member in members]
+
+
+# 打开读取来源：压缩文件中的文件在这里打开，退出时关闭；子进程收到的字节串包装为文件对象；其余来源原样返回
+@contextmanager
+def open_source(source):
+    with ExitStack() as stack:
+        if isinstance(source, ArchiveMember):
+            yield source.open(stack)
+        elif isinstance(source, bytes):
+            yield io.BytesIO(source)
+        else:
+            yield source
+
+
+# 按块计算文件内容的 SHA-256，读取来源可以是文件路径、文件对象、字节串或压缩文件中的文件
+# 压缩文件中的文件按解压后的内容计算，与直接上传解压后的文件哈希相同
+def compute_content_hash(source):
+    digest = hashlib.sha256()
+    if isinstance(source, ArchiveMember):
+        with open_source(source) as file:
+            return compute_content_hash(file)
+    if isinstance(source, bytes):
+        digest.update(source)
+    elif isinstance(source, str):
+        with open(source, 'rb') as file:
+            for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+    else:
+        source.seek(0)
+        for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+        source.seek(0)
+    return digest.hexdigest()
+
+
+# 读取来源开头的字节，文件对象读取后需要回到开头
+def read_sample(source, size=ENCODING_SAMPLE_SIZE):
+    if isinstance(source, str):
+        with open(source, 'rb') as file:
+            return file.read(size)
+    source.seek(0)
+    sample = source.read(size)
+    source.seek(0)
+    return sample
+
+
+# 根据文件开头的字节判断编码
+def detect_encoding(sample):
+    for bom, encoding in BOM_ENCODINGS:
+        if sample.startswith(bom):
+            return encoding
+    for encoding in SAMPLE_ENCODINGS:
+        # 样本可能在多字节字符中间截断，用增量解码器且不作为最终输入，末尾不完整的字符不算解码失败
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            decoder.decode(sample, final=False)
+        except UnicodeDecodeError:
+            continue
+        return encoding
+    return FALLBACK_ENCODING
+
+
+def is_excel_file(file_name):
+    return file_name.lower().endswith(EXCEL_EXTENSIONS)
+
+
+'''
+依次给出解析时要使用的编码
+已知编码（例如同一来源上次上传时记录的编码）优先使用，不需要检测
+只有在前一个编码解析失败时才会读取样本进行检测，样本之后的内容仍可能解码失败，因此最后用兜底编码
+'''
+def encoding_candidates(source, known_encoding=None, file_name=''):
+    # Excel 文件不需要编码
+    if is_excel_file(file_name):
+        yield None
+        return
+    if known_encoding:
+        yield known_encoding
+    detected = detect_encoding(read_sample(source))
+    for encoding in dict.fromkeys([detected, 'gb18030', FALLBACK_ENCODING]):
+        if encoding != known_encoding:
+            yield encoding
+
+
+'''
+依次给出解析时要使用的 (编码, 解析器)
+每个编码先用 pyarrow 解析，失败后用 pandas 以同一编码重新解析，pandas 也解码失败时才换下一个编码
+Excel 文件不区分解析器
+'''
+def parse_candidates(source, known_encoding=None, file_name=''):
+    for encoding in encoding_candidates(source, known_encoding, file_name):
+        if encoding is not None and pa_csv is not None:
+            yield encoding, PYARROW_ENGINE
+        yield encoding, PANDAS_ENGINE
+
+
+# 按分块流式读取 CSV，第一行是表格标题，第二行才是列名
+def read_csv_chunks(source, encoding, chunk_size=CHUNK_SIZE):
+    if not isinstance(source, str):
+        source.seek(0)
+    return pd.read_csv(source, header=1, encoding=encoding, dtype=PANDAS_DTYPES, chunksize=chunk_size)
+
+
+# 一次读取整个 CSV 文件
+def read_csv_frame(source, encoding):
+    if not isinstance(source, str):
+        source.seek(0)
+    return pd.read_csv(source, header=1, encoding=encoding, dtype=PANDAS_DTYPES)
+
+
+# 从文件开头的样本中读取列名，样本中没有完整的列名行时交给 pandas 解析
+def _read_csv_header(source, encoding):
+    sample = read_sample(source)
+    text = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+    records = list(itertools.islice(csv.reader(io.StringIO(text)), 3))
+    complete = len(records) == 3 or len(sample) < ENCODING_SAMPLE_SIZE
+    if len(records) < 2 or not records[0] or not records[1] or not complete:
+        raise pa.ArrowInvalid('无法从文件开头读取列名')
+    return _mangle_columns(records[1])
+
+
+def _open_arrow_csv(source, encoding, columns, column_types):
+    if isinstance(source, str):
+        # 不按扩展名自动解压，压缩文件已经在 open_source 中打开为解压后的文件对象
+        source = pa.input_stream(source, compression=None)
+    else:
+        source.seek(0)
+    # UTF-8 由 pyarrow 直接解析，其他编码由 pyarrow 调用 Python 的解码器转换
+    arrow_encoding = 'utf8' if codecs.lookup(encoding).name in ('utf-8', 'utf-8-sig') else encoding
+    return pa_csv.open_csv(
+        source,
+        read_options=pa_csv.ReadOptions(encoding=arrow_encoding, skip_rows=2, column_names=columns),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=column_types, null_values=NA_VALUES,
+            strings_can_be_null=True, quoted_strings_can_be_null=True,
+        ),
+    )
+
+
+'''
+打开 pyarrow 的流式 CSV 解析器，用完后必须调用 close()，否则后台读取线程可能导致进程退出时异常终止
+列名按 pandas 的规则处理，固定列按声明的类型读取，其余列（整体用时和各步骤用时）由 pyarrow 按第一块数据推断类型
+pyarrow 会把形如日期、时间的文本推断为日期时间类型，转换回文本后与原文不一定相同，这些列改为按文本读取
+'''
+def open_arrow_reader(source, encoding):
+    columns = _read_csv_header(source, encoding)
+    column_types = {}
+    for column in columns:
+        if column in STRING_COLUMNS or column in DATE_COLUMNS:
+            column_types[column] = pa.string()
+        elif column in CATEGORY_COLUMNS:
+            column_types[column] = pa.dictionary(pa.int32(), pa.string())
+
+    reader = _open_arrow_csv(source, encoding, columns, column_types)
+    temporal = [field.name for field in reader.schema if pa.types.is_temporal(field.type)]
+    if temporal:
+        reader.close()
+        column_types.update({column: pa.string() for column in temporal})
+        reader = _open_arrow_csv(source, encoding, columns, column_types)
+    return reader
+
+
+# 日期列全部是整数时转换为整数列，与 pandas 推断的类型一致（有空值时同样转换为浮点数）；否则保留原文
+def _integer_dates(table):
+    for column in DATE_COLUMNS:
+        index = table.schema.get_field_index(column)
+        if index < 0:
+            continue
+        try:
+            table = table.set_column(index, column, pa_compute.cast(table.column(index), pa.int64()))
+        except pa.ArrowInvalid:
+            continue
+    return table
+
+
+def _arrow_frame(table, start):
+    df = _integer_dates(table).to_pandas()
+    df.index = pd.RangeIndex(start, start + len(df))
+    return df
+
+
+# 用 pyarrow 按分块流式读取 CSV，每 chunk_size 行生成一个 DataFrame，行号与 pandas 分块读取时一致
+def read_arrow_chunks(source, encoding, chunk_size=CHUNK_SIZE):
+    reader = open_arrow_reader(source, encoding)
+    try:
+        start = 0
+        pending = []
+        pending_rows = 0
+        for batch in reader:
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows < chunk_size:
+                continue
+            table = pa.Table.from_batches(pending)
+            while table.num_rows >= chunk_size:
+                yield _arrow_frame(table.slice(0, chunk_size), start)
+                table = table.slice(chunk_size)
+                start += chunk_size
+            pending = table.to_batches()
+            pending_rows = table.num_rows
+        # 没有数据行的文件与 pandas 一样生成一个只有列名的空分块
+        if pending_rows or start == 0:
+            yield _arrow_frame(pa.Table.from_batches(pending, schema=reader.schema), start)
+    finally:
+        reader.close()
+
+
+# 用 pyarrow 一次读取整个 CSV 文件
+def read_arrow_frame(source, encoding):
+    reader = open_arrow_reader(source, encoding)
+    try:
+        table = reader.read_all()
+    finally:
+        reader.close()
+    return _arrow_frame(table, 0)
+
+
+# 与 pandas 读取 CSV 时一致：空列名记为 Unnamed: 序号，重复的列名依次加上 .1、.2 后缀
+def _mangle_columns(header):
+    columns = []
+    seen = {}
+    for index, value in enumerate(header):
+        column = f'Unnamed: {index}' if value is None else str(value)
+        if column in seen:
+            seen[column] += 1
+            column = f'{column}.{seen[column]}'
+        else:
+            seen[column] = 0
+        columns.append(column)
+    return columns
+
+
+'''
+以只读模式逐行读取 Excel 工作簿的第一个工作表，每 chunk_size 行生成一个 DataFrame
+第一行是表格标题，第二行才是列名，与 CSV 的 header=1 一致
+整行为空的行会被跳过，分块的行号连续编号，与 CSV 分块读取时一致
+与 read_arrow_chunks 一样，没有数据行的工作簿生成一个只有列名的空分块，连列名行都没有的工作簿生成一个没有列的空分块
+'''
+def read_excel_chunks(source, chunk_size=CHUNK_SIZE):
+    from openpyxl import load_workbook
+
+    if not isinstance(source, str):
+        source.seek(0)
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        next(rows, None)
+        header = next(rows, None)
+        if header is None:
+            yield pd.DataFrame()
+            return
+        columns = _mangle_columns(header)
+        width = len(columns)
+
+        start = 0
+        buffer = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            # 只读模式下各行的长度可能不一致，按列名的数量补齐或截断
+            buffer.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=columns, index=range(start, start + len(buffer)))
+                start += len(buffer)
+                buffer = []
+        if buffer or start == 0:
+            yield pd.DataFrame(buffer, columns=columns, index=range(start, start + len(buffer)))
+    finally:
+        workbook.close()
+
+
+# 按文件类型和解析器分块读取，返回的对象可以用 contextlib.closing 关闭
+def read_chunks(source, file_name, encoding, chunk_size=CHUNK_SIZE, engine=PANDAS_ENGINE):
+    if is_excel_file(file_name):
+        return read_excel_chunks(source, chunk_size)
+    if engine == PYARROW_ENGINE:
+        return read_arrow_chunks(source, encoding, chunk_size)
+    return read_csv_chunks(source, encoding, chunk_size)
+
+
+# 按文件类型和解析器一次读取整个文件
+def read_frame(source, file_name, encoding, engine=PANDAS_ENGINE):
+    if is_excel_file(file_name):
+        return pd.concat(list(read_excel_chunks(source)))
+    if engine == PYARROW_ENGINE:
+        return read_arrow_frame(source, encoding)
+    return read_csv_frame(source, encoding)
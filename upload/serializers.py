@@ -1,5 +1,12 @@
+from django.db.models import F
 from rest_framework import serializers
-from .models import Assessment_Base, Assessment_Classification
+from .models import Assessment_Base, Assessment_ChunkedUpload, Assessment_Classification, Assessment_UploadJob, Assessment_UploadJobFile, decode_additional_data
+
+# 考核信息接口返回的字段和顺序，AssessmentBaseSerializer 和只读列表的快速序列化共用
+ASSESSMENT_BASE_FIELDS = [
+    'id', 'trainLines', 'file_name', 'record_date', 'crew_group', 'name', 'work_certificate_number',
+    'train_model', 'assessment_item', 'assessment_result', 'additional_data',
+]
 
 # 考核信息序列化器
 class AssessmentBaseSerializer(serializers.ModelSerializer):
@@ -19,20 +26,77 @@ class AssessmentBaseSerializer(serializers.ModelSerializer):
             return ...  # Calculate some data to return.
     """
     trainLines = serializers.SerializerMethodField()
+    # additional_data 是模型上由列名字典和值还原的属性，保存时再拆分
+    additional_data = serializers.JSONField(label='动态数据', required=False, allow_null=True)
 
     class Meta:
         model = Assessment_Base
-        fields = '__all__'  # 确保包含所有模型字段以及新添加的trainLines字段
+        # 除上传内部使用的发布状态和文件版本之外的模型字段，以及新添加的trainLines字段，字段和顺序见 ASSESSMENT_BASE_FIELDS
+        # 线路编号已经作为 trainLines 返回，入库时填写的 train_line 列不再单独返回；total_seconds 由 additional_data 换算，也不单独返回
+        fields = ASSESSMENT_BASE_FIELDS
 
-    # 定义一个方法来获取train_model字段的前两位 即线路编号
+    # 线路编号即train_model字段的前两位，入库时已经存入train_line列，直接返回
     def get_trainLines(self, obj):
-        # 如果train_model字段存在且长度大于等于2, 则返回其前两位
-        if obj.train_model and len(obj.train_model) >= 2:
-            return obj.train_model[:2]
-        return None  # 如果条件不满足，返回None或者一个默认值
-    
+        return obj.train_line
+
+'''
+AssessmentBaseSerializer 对每条记录都要构造模型实例，并逐个字段调用 DRF 的字段转换，列表和全量数据接口的大部分时间都花在这里
+只读接口改为直接从数据库读取需要的列，trainLines 直接读取入库时填写的 train_line 列
+返回带字段名的元组，分页器可以按属性取游标字段，再由 assessment_base_data 转为字典
+additional_data 读取列名字典的签名和值两列，由 assessment_base_row 按缓存的列名还原为字典
+日期交给 DRF 的 JSON 编码器输出为 ISO 格式，与 DateField 的输出一致
+'''
+def assessment_base_values(queryset):
+    return queryset.annotate(trainLines=F('train_line')).values_list(*ASSESSMENT_BASE_FIELDS[:-1], 'data_keys', 'data_values', named=True)
+
+
+# 将 assessment_base_values 返回的一行转为与 AssessmentBaseSerializer 相同的字典
+def assessment_base_row(row):
+    data = row._asdict()
+    data['additional_data'] = decode_additional_data(data.pop('data_keys'), data.pop('data_values'))
+    return data
+
+
+def assessment_base_data(rows):
+    return [assessment_base_row(row) for row in rows]
+
 # 分类信息序列化器
 class AssessmentClassificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Assessment_Classification
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+# 上传任务文件序列化器
+class UploadJobFileSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Assessment_UploadJobFile
+        fields = ['id', 'file_name', 'size', 'status', 'rows_read', 'rows_written', 'error']
+
+# 上传任务序列化器，返回任务状态以及每个文件的进度、记录数和错误信息
+class UploadJobSerializer(serializers.ModelSerializer):
+    files = UploadJobFileSerializer(many=True, read_only=True)
+    files_total = serializers.SerializerMethodField()
+    files_done = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Assessment_UploadJob
+        fields = ['id', 'status', 'created_at', 'started_at', 'finished_at', 'files_total', 'files_done', 'files']
+
+    def get_files_total(self, obj):
+        return len(obj.files.all())
+
+    # 已经处理结束（成功、失败或内容未变化）的文件数
+    def get_files_done(self, obj):
+        return sum(1 for job_file in obj.files.all() if job_file.status not in (Assessment_UploadJob.PENDING, Assessment_UploadJob.RUNNING))
+
+# 分块上传会话序列化器，创建会话时只需要文件名和可选的文件总大小
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Assessment_ChunkedUpload
+        fields = ['id', 'file_name', 'size', 'offset', 'status', 'job', 'created_at', 'updated_at']
+        read_only_fields = ['offset', 'status', 'job', 'created_at', 'updated_at']
+
+    def validate_size(self, value):
+        if value is not None and value < 0:
+            raise serializers.ValidationError('文件大小不能小于 0。')
+        return value
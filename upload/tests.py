@@ -1,3 +1,1287 @@
-from django.test import TestCase
+import codecs
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Avg
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import ingestion
+from .benchmarks.bench_read import run_read_case
+from .benchmarks.bench_upload import find_regressions, run_case
+from .benchmarks.synthetic import generate_assessment_csv, step_columns
+from .catalog import rebuild_subjects
+from .exports import EXPORT_COLUMNS, stream_ndjson
+from .ingestion import (
+    RejectedRows, allocate_file_version, assessment_frame_keys, clean_assessment_frame, clean_upload_file, delete_superseded_rows,
+    get_assessment_template, get_process_pool, get_template_columns, ingest_assessment_file, ingest_upload, prepare_assessment_frame,
+    publish_file_version, upsert_cleaned_file,
+)
+from .jobs import append_chunk
+from .models import (
+    Assessment_Base, Assessment_ChunkedUpload, Assessment_Classification, Assessment_DataKeys, Assessment_File, Assessment_Rejection,
+    Assessment_StepTiming, Assessment_Subject, Assessment_Template, Assessment_UploadJob, data_keys_signature, step_seconds_of,
+)
+from .readers import detect_encoding, encoding_candidates, pa_csv, read_arrow_chunks, read_csv_chunks
+from .serializers import AssessmentBaseSerializer
+from .views import AssessmentBaseViewSet
+
+
+# 合成考核 CSV 生成器
+class SyntheticAssessmentCsvTests(TestCase):
+    def test_two_row_header_and_time_columns(self):
+        content, stats = generate_assessment_csv(50, steps=3, seed=1)
+        lines = content.decode('utf-8').splitlines()
+        self.assertTrue(lines[0].startswith('乘务考核记录表'))
+        self.assertEqual(lines[1].split(','), ['日期', '乘务班组', '姓名', '工作证编号', '车型', '考核项目', '考核结果', '备注', '整体用时'] + step_columns(3))
+        self.assertEqual(len(lines), 52)
+        self.assertEqual(stats['rows'], 50)
+
+    def test_same_seed_generates_same_content(self):
+        self.assertEqual(generate_assessment_csv(200, seed=7), generate_assessment_csv(200, seed=7))
+        self.assertNotEqual(generate_assessment_csv(200, seed=7)[0], generate_assessment_csv(200, seed=8)[0])
+
+    def test_encoding(self):
+        content, _ = generate_assessment_csv(20, encoding='gb18030')
+        self.assertIn('整体用时', content.decode('gb18030'))
+        self.assertRaises(UnicodeDecodeError, content.decode, 'utf-8')
+
+    # 生成器按入库规则算出的记录数与实际上传写入的记录数一致
+    def test_expected_rows_match_upload(self):
+        files, expected_rows = [], 0
+        for index, encoding in enumerate(['utf-8-sig', 'gb18030']):
+            content, stats = generate_assessment_csv(600, seed=index, encoding=encoding, duplicate_ratio=0.2, bad_number_ratio=0.05, bad_date_ratio=0.05)
+            self.assertGreater(stats['duplicates'], 0)
+            self.assertGreater(stats['bad_numbers'], 0)
+            self.assertGreater(stats['bad_dates'], 0)
+            files.append(SimpleUploadedFile(f'{encoding}.csv', content))
+            expected_rows += stats['expected_rows']
+
+        response = APIClient().post('/api/upload-assessment/', {'file': files}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Assessment_Base.objects.count(), expected_rows)
+        # 入库时整列填写的线路编号与车型一致
+        for train_model, train_line in Assessment_Base.objects.values_list('train_model', 'train_line').distinct():
+            self.assertEqual(train_line, train_model[:2])
+
+
+# 被跳过的行写入 Assessment_Rejection，上传结果中附带各原因的行数和部分行号
+class RejectedRowsTests(TestCase):
+    def upload(self, content):
+        return APIClient().post('/api/upload-assessment/', {'file': SimpleUploadedFile('rejected.csv', content)}, format='multipart')
+
+    def test_rejections_recorded_and_summarised(self):
+        content, stats = generate_assessment_csv(400, seed=3, duplicate_ratio=0, bad_number_ratio=0.05, bad_date_ratio=0.05)
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 201)
+
+        rejected = response.data['files'][0]['rejected']
+        self.assertEqual(rejected['total'], Assessment_Rejection.objects.filter(file_name='rejected.csv').count())
+        # 同一人同一科目的重复记录先判重，被覆盖的不合法记录不计入
+        self.assertGreater(rejected['total'], 0)
+        self.assertLessEqual(rejected['total'], stats['bad_numbers'] + stats['bad_dates'])
+        numbers = rejected['reasons'][Assessment_Rejection.INVALID_WORK_CERTIFICATE_NUMBER]
+        self.assertLessEqual(numbers['count'], stats['bad_numbers'])
+        self.assertEqual(numbers['rows'], sorted(numbers['rows']))
+        self.assertLessEqual(len(numbers['rows']), 20)
+
+        # 被跳过的行号对应文件中的同一行（前两行为标题和列名），N/A 等读取为空值的原始值记为空字符串
+        rejection = Assessment_Rejection.objects.filter(reason=Assessment_Rejection.INVALID_WORK_CERTIFICATE_NUMBER).exclude(value='').first()
+        line = content.decode('utf-8').splitlines()[rejection.row_index + 2]
+        self.assertEqual(line.split(',')[3], rejection.value)
+
+    def test_reupload_replaces_rejections(self):
+        content, _ = generate_assessment_csv(200, seed=4, duplicate_ratio=0, bad_number_ratio=0.1)
+        self.upload(content)
+        self.assertGreater(Assessment_Rejection.objects.count(), 0)
+        content, _ = generate_assessment_csv(200, seed=4, duplicate_ratio=0, bad_number_ratio=0, bad_date_ratio=0)
+        response = self.upload(content)
+        self.assertEqual(response.data['files'][0]['rejected'], {'total': 0, 'reasons': {}})
+        self.assertEqual(Assessment_Rejection.objects.count(), 0)
+
+
+# xlsx 文件的上传：只有列名或完全为空的工作簿不写入也不替换之前的数据
+class ExcelUploadTests(TestCase):
+    HEADER = ['日期', '乘务班组', '姓名', '工作证编号', '车型', '考核项目', '考核结果', '整体用时']
+
+    def workbook(self, rows, header=HEADER, title=True):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        if title:
+            sheet.append(['考核记录表'])
+        if header:
+            sheet.append(header)
+        for row in rows:
+            sheet.append(row)
+        output = io.BytesIO()
+        workbook.save(output)
+        return output.getvalue()
+
+    def upload(self, content, parallel=False):
+        url = '/api/upload-assessment/?parallel=1' if parallel else '/api/upload-assessment/'
+        return APIClient().post(url, {'file': SimpleUploadedFile('records.xlsx', content)}, format='multipart')
+
+    def test_normal_workbook(self):
+        rows = [
+            [20230105, '一班', '张三', 10001, '01A', '紧急制动', '优秀', 30],
+            [20230106, '二班', '李四', 10002, '02B', '紧急制动', '不合格', 45],
+        ]
+        response = self.upload(self.workbook(rows))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['files'][0]['rows_written'], 2)
+        self.assertEqual(
+            sorted(Assessment_Base.objects.values_list('name', 'work_certificate_number', 'record_date', 'assessment_result')),
+            [('张三', 10001, date(2023, 1, 5), Assessment_Base.EXCELLENT), ('李四', 10002, date(2023, 1, 6), Assessment_Base.NOT_QUALIFIED)],
+        )
+
+    def test_empty_workbooks_rejected(self):
+        self.upload(self.workbook([[20230105, '一班', '张三', 10001, '01A', '紧急制动', '优秀', 30]]))
+        published = list(Assessment_Base.objects.values_list('id', flat=True))
+        cases = [
+            (self.workbook([]), '没有数据行'),
+            (self.workbook([], header=None, title=False), '缺少必需的列'),
+            (self.workbook([[20230105, '张三']], header=['日期', '姓名']), '缺少必需的列'),
+        ]
+        for content, message in cases:
+            response = self.upload(content)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(message, response.data['detail'])
+
+            response = self.upload(content, parallel=True)
+            self.assertEqual(response.status_code, 207)
+            self.assertEqual(response.data['files'][0]['status'], 'failed')
+            self.assertIn(message, response.data['files'][0]['error'])
+
+            # 之前发布的记录保持不变，也没有留下暂存记录
+            self.assertEqual(list(Assessment_Base.objects.values_list('id', flat=True)), published)
+            self.assertFalse(Assessment_Base.objects.filter(is_published=False).exists())
+
+
+# 暂存写入与发布：发布之前读取方只看到旧版本，写入失败时旧版本保持发布，较新的版本总是生效
+class StagedPublishTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.old_content, old_stats = generate_assessment_csv(120, seed=1, duplicate_ratio=0)
+        self.new_content, new_stats = generate_assessment_csv(80, seed=2, duplicate_ratio=0)
+        self.old_rows, self.new_rows = old_stats['expected_rows'], new_stats['expected_rows']
+        ingest_upload(io.BytesIO(self.old_content), 'staged.csv')
+        self.published_ids = self.ids()
+
+    def ids(self):
+        return list(Assessment_Base.objects.published().values_list('id', flat=True))
+
+    def visible_count(self):
+        cache.clear()
+        listed = self.client.get('/api/assessment-base/').data['count']
+        exported = b''.join(self.client.get('/api/assessment-base/export/').streaming_content).decode('utf-8').count('\n')
+        self.assertEqual(listed, exported)
+        return listed
+
+    def stage(self, content):
+        file_version = allocate_file_version('staged.csv')
+        loader = ingest_assessment_file(io.BytesIO(content), 'staged.csv', file_version, 'utf-8')
+        return file_version, loader
+
+    def test_staged_rows_invisible_until_published(self):
+        file_version, loader = self.stage(self.new_content)
+        self.assertEqual(Assessment_Base.objects.filter(is_published=False).count(), self.new_rows)
+        self.assertEqual(self.visible_count(), self.old_rows)
+
+        self.assertTrue(publish_file_version('staged.csv', file_version, 'utf-8', 'hash', loader.row_count))
+        self.assertEqual(self.visible_count(), self.new_rows)
+        self.assertFalse(Assessment_Base.objects.filter(is_published=False).exists())
+        self.assertEqual(Assessment_File.objects.get(file_name='staged.csv').version, file_version)
+
+    def test_failure_mid_load_keeps_previous_version(self):
+        def fail(rows_read, rows_written):
+            # 失败时本版本已经写入了一部分暂存记录
+            self.assertGreater(Assessment_Base.objects.filter(is_published=False).count(), 0)
+            raise RuntimeError('写入中断')
+
+        with self.assertRaises(RuntimeError):
+            ingest_upload(io.BytesIO(self.new_content), 'staged.csv', progress=fail)
+        self.assertEqual(self.ids(), self.published_ids)
+        self.assertFalse(Assessment_Base.objects.filter(is_published=False).exists())
+        self.assertEqual(self.visible_count(), self.old_rows)
+
+    def test_newer_version_replaces_older(self):
+        older_version, older = self.stage(self.old_content)
+        newer_version, newer = self.stage(self.new_content)
+        self.assertTrue(publish_file_version('staged.csv', newer_version, 'utf-8', 'new', newer.row_count))
+        # 较早的版本后写完时直接丢弃，不覆盖已经发布的较新版本
+        self.assertFalse(publish_file_version('staged.csv', older_version, 'utf-8', 'old', older.row_count))
+        self.assertEqual(self.visible_count(), self.new_rows)
+        self.assertEqual(set(Assessment_Base.objects.values_list('file_version', flat=True)), {newer_version})
+        self.assertEqual(Assessment_File.objects.get(file_name='staged.csv').content_hash, 'new')
+
+    def test_superseded_rows_deleted_in_batches(self):
+        file_version, loader = self.stage(self.new_content)
+
+        def delete_after_publish(file_name, version):
+            # 删除之前新版本已经发布，旧记录只是不再可见
+            self.assertEqual(self.visible_count(), self.new_rows)
+            self.assertEqual(Assessment_Base.objects.filter(is_published=False).count(), self.old_rows)
+            with CaptureQueriesContext(connection) as queries:
+                delete_superseded_rows(file_name, version)
+            deletes = [query for query in queries if query['sql'].startswith('DELETE FROM "upload_assessment_base"')]
+            self.assertEqual(len(deletes), -(-self.old_rows // 50))
+
+        with mock.patch('upload.ingestion.SUPERSEDED_ROWS_PER_DELETE', 50), \
+                mock.patch('upload.ingestion.delete_superseded_rows', side_effect=delete_after_publish):
+            self.assertTrue(publish_file_version('staged.csv', file_version, 'utf-8', 'hash', loader.row_count))
+        self.assertEqual(set(Assessment_Base.objects.values_list('file_version', flat=True)), {file_version})
+        self.assertFalse(Assessment_StepTiming.objects.exclude(assessment_base__file_version=file_version).exists())
+
+
+# 并行上传时单个文件失败不影响其他文件，返回 207 和每个文件各自的结果
+class ParallelUploadTests(TestCase):
+    def test_partial_failure(self):
+        files, expected = [], {}
+        for index in range(2):
+            content, stats = generate_assessment_csv(150, seed=index)
+            files.append(SimpleUploadedFile(f'ok{index}.csv', content))
+            expected[f'ok{index}.csv'] = stats['expected_rows']
+        files.insert(1, SimpleUploadedFile('broken.csv', '考核记录表\n日期,姓名\n20230101,王伟\n'.encode('utf-8')))
+
+        response = APIClient().post('/api/upload-assessment/?parallel=1', {'file': files}, format='multipart')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['detail'], '1 个文件处理失败。')
+        results = {result['file_name']: result for result in response.data['files']}
+        self.assertEqual(list(results), ['ok0.csv', 'broken.csv', 'ok1.csv'])
+        self.assertEqual(results['broken.csv']['status'], Assessment_UploadJob.FAILED)
+        self.assertIn('缺少必需的列', results['broken.csv']['error'])
+        for file_name, rows in expected.items():
+            self.assertEqual(results[file_name]['status'], Assessment_UploadJob.SUCCEEDED)
+            self.assertEqual(results[file_name]['rows_written'], rows)
+            self.assertEqual(Assessment_Base.objects.published().filter(file_name=file_name).count(), rows)
+        self.assertFalse(Assessment_File.objects.filter(file_name='broken.csv', row_count__gt=0).exists())
+
+    # 并行上传请求共用进程池，进程池不可用后重新创建
+    def test_requests_share_process_pool(self):
+        self.addCleanup(setattr, ingestion, '_process_pool', None)
+        ingestion._process_pool = None
+        for seed in range(2):
+            content, _ = generate_assessment_csv(50, seed=seed)
+            response = APIClient().post('/api/upload-assessment/?parallel=1', {'file': SimpleUploadedFile(f'pool{seed}.csv', content)}, format='multipart')
+            self.assertEqual(response.status_code, 201)
+            if seed == 0:
+                pool = ingestion._process_pool
+                self.addCleanup(pool.shutdown)
+        self.assertIs(ingestion._process_pool, pool)
+
+        with mock.patch.object(pool, '_broken', 'worker terminated'):
+            replaced = get_process_pool(1)
+        self.addCleanup(replaced.shutdown)
+        self.assertIsNot(replaced, pool)
+        self.assertIs(get_process_pool(1), replaced)
+
+
+# 增量写入：只新增、修改和删除有变化的记录，没有变化和修改的记录保留 id 以及关联的分类信息
+class UpsertCleanedFileTests(TestCase):
+    HEADER = '考核记录表\n日期,乘务班组,姓名,工作证编号,车型,考核项目,考核结果,整体用时\n'
+
+    def upsert(self, rows):
+        content = (self.HEADER + ''.join(f'{row}\n' for row in rows)).encode('utf-8')
+        cleaned_file = clean_upload_file(content, 'upsert.csv', templates=get_template_columns())
+        get_assessment_template(cleaned_file.columns, cleaned_file.assessment_item)
+        return upsert_cleaned_file('upsert.csv', hashlib.sha256(content).hexdigest(), cleaned_file)
+
+    def ids(self):
+        return dict(Assessment_Base.objects.values_list('work_certificate_number', 'id'))
+
+    def test_counts_ids_and_classifications(self):
+        row_count, counts = self.upsert([
+            '20230101,一班,张三,10001,01A,紧急制动,优秀,30',
+            '20230101,一班,李四,10002,01A,紧急制动,合格,40',
+            '20230101,二班,王五,10003,01A,紧急制动,合格,50',
+        ])
+        self.assertEqual((row_count, counts), (3, {'inserted': 3, 'updated': 0, 'deleted': 0, 'unchanged': 0}))
+        before = self.ids()
+        for number in [10001, 10002, 10003]:
+            Assessment_Classification.objects.create(assessment_base_id=before[number], file_name='upsert.csv', data_key='整体用时', category='识故')
+
+        # 10001 不变，10002 修改了考核结果，10003 被删除，10004 为新增
+        row_count, counts = self.upsert([
+            '20230101,一班,张三,10001,01A,紧急制动,优秀,30',
+            '20230101,一班,李四,10002,01A,紧急制动,不合格,40',
+            '20230102,二班,赵六,10004,01A,紧急制动,优秀,25',
+        ])
+        self.assertEqual((row_count, counts), (3, {'inserted': 1, 'updated': 1, 'deleted': 1, 'unchanged': 1}))
+        after = self.ids()
+        self.assertEqual(set(after), {10001, 10002, 10004})
+        self.assertEqual(after[10001], before[10001])
+        self.assertEqual(after[10002], before[10002])
+        self.assertEqual(Assessment_Base.objects.get(pk=after[10002]).assessment_result, Assessment_Base.NOT_QUALIFIED)
+        self.assertEqual(
+            sorted(Assessment_Classification.objects.values_list('assessment_base_id', flat=True)),
+            sorted([before[10001], before[10002]]),
+        )
+        self.assertEqual(Assessment_File.objects.get(file_name='upsert.csv').row_count, 3)
+
+    # 增量模式整个文件一次读取和清洗，与全量模式分块写入的结果一致
+    def test_incremental_matches_streamed_ingest(self):
+        content, stats = generate_assessment_csv(300, seed=4, duplicate_ratio=0.3, bad_number_ratio=0.05, bad_date_ratio=0.05)
+        progress = mock.Mock()
+        ingest_upload(io.BytesIO(content), 'full.csv')
+        result = ingest_upload(io.BytesIO(content), 'incremental.csv', progress=progress, incremental=True)
+        self.assertEqual(result['rows_written'], stats['expected_rows'])
+        progress.assert_called_once_with(result['rows_read'], stats['expected_rows'])
+
+        fields = CrossChunkDedupTests.FIELDS
+        rows = {
+            file_name: sorted(Assessment_Base.objects.published().filter(file_name=file_name).values_list(*fields), key=repr)
+            for file_name in ['full.csv', 'incremental.csv']
+        }
+        self.assertEqual(rows['incremental.csv'], rows['full.csv'])
+
+    # 增量模式不经过暂存记录，写入失败时整个事务回滚，已发布的记录保持不变
+    def test_failed_upsert_keeps_published_rows(self):
+        self.upsert(['20230101,一班,张三,10001,01A,紧急制动,优秀,30'])
+        before = list(Assessment_Base.objects.values_list('id', 'assessment_result'))
+        with mock.patch('upload.ingestion.refresh_subjects', side_effect=RuntimeError('写入中断')):
+            with self.assertRaises(RuntimeError):
+                self.upsert([
+                    '20230101,一班,张三,10001,01A,紧急制动,不合格,30',
+                    '20230102,二班,赵六,10004,01A,紧急制动,优秀,25',
+                ])
+        self.assertEqual(list(Assessment_Base.objects.values_list('id', 'assessment_result')), before)
+        self.assertEqual(Assessment_File.objects.get(file_name='upsert.csv').row_count, 1)
+
+
+# 内容与上次上传完全相同的文件直接返回 unchanged，不写入数据库；同名文件内容变化时重新写入
+class UnchangedUploadTests(TestCase):
+    def upload(self, content):
+        return APIClient().post('/api/upload-assessment/', {'file': SimpleUploadedFile('same.csv', content)}, format='multipart')
+
+    def test_identical_reupload_writes_nothing(self):
+        content, stats = generate_assessment_csv(150, seed=1)
+        self.assertEqual(self.upload(content).data['files'][0]['status'], Assessment_UploadJob.SUCCEEDED)
+        ids = list(Assessment_Base.objects.values_list('id', flat=True))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload(content)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['files'][0]['status'], Assessment_UploadJob.UNCHANGED)
+        self.assertEqual(response.data['files'][0]['rows_written'], stats['expected_rows'])
+        writes = [query['sql'] for query in queries if query['sql'].split(' ', 1)[0] in ('INSERT', 'UPDATE', 'DELETE')]
+        self.assertEqual(writes, [])
+        self.assertEqual(list(Assessment_Base.objects.values_list('id', flat=True)), ids)
+
+    def test_changed_content_reingested(self):
+        content, _ = generate_assessment_csv(150, seed=1)
+        self.upload(content)
+        ids = set(Assessment_Base.objects.values_list('id', flat=True))
+
+        content, stats = generate_assessment_csv(100, seed=2)
+        response = self.upload(content)
+        self.assertEqual(response.data['files'][0]['status'], Assessment_UploadJob.SUCCEEDED)
+        self.assertEqual(Assessment_Base.objects.published().filter(file_name='same.csv').count(), stats['expected_rows'])
+        self.assertFalse(ids & set(Assessment_Base.objects.values_list('id', flat=True)))
+        self.assertEqual(Assessment_File.objects.get(file_name='same.csv').content_hash, hashlib.sha256(content).hexdigest())
+
+
+# 考核模板：表头相同的文件共用一个模板，步骤布局不同时登记新的模板
+class AssessmentTemplateTests(TestCase):
+    def upload(self, file_name, steps, rows):
+        header = ['日期', '乘务班组', '姓名', '工作证编号', '车型', '考核项目', '考核结果', '整体用时', *steps]
+        lines = ['考核记录表', ','.join(header)]
+        for index in range(rows):
+            lines.append(','.join(['20230101', '一班', f'王{index}', str(20001 + index), '03A', '模板复用', '合格', '60'] + [str(index + 1)] * len(steps)))
+        content = '\n'.join(lines).encode('utf-8')
+        response = APIClient().post('/api/upload-assessment/', {'file': SimpleUploadedFile(file_name, content)}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+
+    def templates(self):
+        return Assessment_Template.objects.filter(assessment_item='模板复用')
+
+    def test_reuse_and_register(self):
+        self.upload('a.csv', ['步骤1确认信号', '步骤2复位'], 3)
+        self.upload('b.csv', ['步骤1确认信号', '步骤2复位'], 5)
+        self.assertEqual(self.templates().count(), 1)
+        template = self.templates().get()
+        self.assertEqual(template.additional_columns, ['整体用时', '步骤1确认信号', '步骤2复位'])
+
+        # 步骤的数量或顺序不同时是另一种表头
+        self.upload('c.csv', ['步骤2复位', '步骤1确认信号'], 2)
+        self.upload('d.csv', ['步骤1确认信号', '步骤2复位', '步骤3报告'], 2)
+        self.assertEqual(self.templates().count(), 3)
+        self.assertEqual(
+            sorted(template.additional_columns for template in self.templates()),
+            sorted([
+                ['整体用时', '步骤1确认信号', '步骤2复位'],
+                ['整体用时', '步骤2复位', '步骤1确认信号'],
+                ['整体用时', '步骤1确认信号', '步骤2复位', '步骤3报告'],
+            ]),
+        )
+        record = Assessment_Base.objects.get(file_name='d.csv', work_certificate_number=20002)
+        self.assertEqual(record.additional_data, {'整体用时': 60, '步骤1确认信号': 2, '步骤2复位': 2, '步骤3报告': 2})
+
+
+# 压缩上传：.gz 文件按去掉后缀的文件名入库，.zip 压缩包中的每个文件按包内路径各自入库
+class CompressedUploadTests(TestCase):
+    def setUp(self):
+        self.contents, self.expected = {}, {}
+        for index, name in enumerate(['a.csv', 'sub/b.csv', 'c.csv']):
+            self.contents[name], stats = generate_assessment_csv(120, seed=index)
+            self.expected[name] = stats['expected_rows']
+
+    def files(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as bundle:
+            bundle.writestr('sub/b.csv', self.contents['sub/b.csv'])
+            bundle.writestr('c.csv', self.contents['c.csv'])
+        return [
+            SimpleUploadedFile('a.csv.gz', gzip.compress(self.contents['a.csv'])),
+            SimpleUploadedFile('bundle.zip', archive.getvalue()),
+        ]
+
+    def assertStored(self, response):
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([result['file_name'] for result in response.data['files']], list(self.expected))
+        for result in response.data['files']:
+            self.assertEqual(result['rows_written'], self.expected[result['file_name']])
+        stored = dict(Assessment_File.objects.values_list('file_name', 'row_count'))
+        self.assertEqual(stored, self.expected)
+        for file_name, rows in self.expected.items():
+            self.assertEqual(Assessment_Base.objects.published().filter(file_name=file_name).count(), rows)
+
+    def test_sequential(self):
+        self.assertStored(APIClient().post('/api/upload-assessment/', {'file': self.files()}, format='multipart'))
+
+    def test_parallel(self):
+        self.assertStored(APIClient().post('/api/upload-assessment/?parallel=1', {'file': self.files()}, format='multipart'))
+
+    # 解压后的内容与直接上传的文件相同时视为未变化
+    def test_same_content_as_plain_upload(self):
+        APIClient().post('/api/upload-assessment/', {'file': self.files()}, format='multipart')
+        response = APIClient().post('/api/upload-assessment/', {'file': SimpleUploadedFile('a.csv', self.contents['a.csv'])}, format='multipart')
+        self.assertEqual(response.data['files'][0]['status'], Assessment_UploadJob.UNCHANGED)
+
+
+# 跨分块判重：后面分块中的记录覆盖前面分块已写入的同一人同一科目的记录，结果与整个文件作为一个分块写入相同
+class CrossChunkDedupTests(TestCase):
+    FIELDS = ['record_date', 'crew_group', 'name', 'work_certificate_number', 'train_model', 'assessment_item', 'assessment_result', 'data_values', 'total_seconds']
+
+    def ingest(self, content, file_name, **kwargs):
+        file_version = allocate_file_version(file_name)
+        loader = ingest_assessment_file(io.BytesIO(content), file_name, file_version, 'utf-8', **kwargs)
+        publish_file_version(file_name, file_version, 'utf-8', file_name, loader.row_count, loader.rejections)
+        return loader
+
+    def rows(self, file_name):
+        records = Assessment_Base.objects.published().filter(file_name=file_name)
+        return sorted(records.values_list(*self.FIELDS), key=repr)
+
+    def test_small_chunks_match_single_chunk(self):
+        content, stats = generate_assessment_csv(300, seed=4, duplicate_ratio=0.3, bad_number_ratio=0.05, bad_date_ratio=0.05)
+        # 同一人的工作证编号分别写成 10001 和 10001.0，落在不同的分块中
+        lines = content.decode('utf-8').splitlines()
+        fields = lines[2].split(',')
+        fields[3] += '.0'
+        fields[6] = '不合格' if fields[6] != '不合格' else '优秀'
+        content = '\n'.join(lines + [','.join(fields)]).encode('utf-8') + b'\n'
+
+        whole = self.ingest(content, 'whole.csv')
+        small = self.ingest(content, 'small.csv', chunk_size=2, batch_size=3)
+        self.assertEqual(small.row_count, whole.row_count)
+        self.assertEqual(whole.row_count, stats['expected_rows'])
+        self.assertEqual(self.rows('small.csv'), self.rows('whole.csv'))
+        self.assertEqual(
+            Assessment_StepTiming.objects.filter(assessment_base__file_name='small.csv').count(),
+            Assessment_StepTiming.objects.filter(assessment_base__file_name='whole.csv').count(),
+        )
+        # 被后续分块覆盖的不合法记录也不计入跳过的行
+        rejections = {
+            file_name: sorted(Assessment_Rejection.objects.filter(file_name=file_name).values_list('row_index', 'reason', 'value'))
+            for file_name in ['whole.csv', 'small.csv']
+        }
+        self.assertEqual(rejections['small.csv'], rejections['whole.csv'])
+        self.assertGreater(len(rejections['whole.csv']), 0)
+        # 最后一行覆盖了文件第一条记录，无论分块边界在哪里
+        number = int(float(fields[3]))
+        for file_name in ['whole.csv', 'small.csv']:
+            record = Assessment_Base.objects.get(file_name=file_name, name=fields[2], work_certificate_number=number, train_model=fields[4], assessment_item=fields[5])
+            self.assertEqual(record.get_assessment_result_display(), fields[6])
+
+
+# 后台上传任务：提交后由 run_upload_jobs 处理，通过任务接口查询状态；中断的任务标记为失败并删除暂存文件
+class UploadJobTests(TestCase):
+    def setUp(self):
+        self.spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.spool_dir.cleanup)
+        settings = self.settings(UPLOAD_SPOOL_DIR=self.spool_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+
+    # 提交任务，不交给本进程的线程池，由 run_upload_jobs 处理
+    def submit(self, *files):
+        with self.captureOnCommitCallbacks():
+            response = self.client.post('/api/upload-jobs/', {'file': list(files)}, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], Assessment_UploadJob.PENDING)
+        self.assertEqual(response.data['files_done'], 0)
+        return response.data['id']
+
+    def poll(self, job_id):
+        response = self.client.get(f'/api/upload-jobs/{job_id}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_submit_poll_done(self):
+        content, stats = generate_assessment_csv(150, seed=1)
+        job_id = self.submit(SimpleUploadedFile('job.csv', content))
+        self.assertTrue(os.listdir(os.path.join(self.spool_dir.name, str(job_id))))
+
+        call_command('run_upload_jobs', stdout=io.StringIO())
+        job = self.poll(job_id)
+        self.assertEqual(job['status'], Assessment_UploadJob.SUCCEEDED)
+        self.assertEqual(job['files_done'], 1)
+        self.assertEqual(job['files'][0]['rows_written'], stats['expected_rows'])
+        self.assertEqual(Assessment_Base.objects.published().count(), stats['expected_rows'])
+        self.assertFalse(os.path.exists(os.path.join(self.spool_dir.name, str(job_id))))
+
+    def test_failed_file(self):
+        content, stats = generate_assessment_csv(100, seed=2)
+        job_id = self.submit(SimpleUploadedFile('good.csv', content), SimpleUploadedFile('broken.csv', '考核记录表\n日期,姓名\n20230101,王伟\n'.encode('utf-8')))
+        call_command('run_upload_jobs', stdout=io.StringIO())
+        job = self.poll(job_id)
+        self.assertEqual(job['status'], Assessment_UploadJob.FAILED)
+        self.assertEqual([job_file['status'] for job_file in job['files']], [Assessment_UploadJob.SUCCEEDED, Assessment_UploadJob.FAILED])
+        self.assertIn('缺少必需的列', job['files'][1]['error'])
+        self.assertEqual(Assessment_Base.objects.published().count(), stats['expected_rows'])
+
+    def test_stale_running_job_failed(self):
+        content, _ = generate_assessment_csv(50, seed=3)
+        job_id = self.submit(SimpleUploadedFile('stale.csv', content))
+        # 模拟处理任务的进程在处理过程中退出
+        Assessment_UploadJob.objects.filter(pk=job_id).update(
+            status=Assessment_UploadJob.RUNNING, updated_at=timezone.now() - timedelta(hours=2),
+        )
+        fresh_id = self.submit(SimpleUploadedFile('fresh.csv', content))
+        Assessment_UploadJob.objects.filter(pk=fresh_id).update(status=Assessment_UploadJob.RUNNING)
+
+        output = io.StringIO()
+        call_command('run_upload_jobs', '--stale-after', '3600', stdout=output)
+        self.assertIn(f'任务 {job_id}: 处理中断', output.getvalue())
+        job = self.poll(job_id)
+        self.assertEqual(job['status'], Assessment_UploadJob.FAILED)
+        self.assertEqual(job['files'][0]['status'], Assessment_UploadJob.FAILED)
+        self.assertFalse(os.path.exists(os.path.join(self.spool_dir.name, str(job_id))))
+        # 仍在更新的处理中任务不受影响
+        self.assertEqual(self.poll(fresh_id)['status'], Assessment_UploadJob.RUNNING)
+        self.assertTrue(os.path.exists(os.path.join(self.spool_dir.name, str(fresh_id))))
+
+
+# 分块续传：偏移量不一致时返回 409，中断后从已接收的字节数继续，完成时校验大小和 sha256
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.spool_dir.cleanup)
+        settings = self.settings(UPLOAD_SPOOL_DIR=self.spool_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.content, self.stats = generate_assessment_csv(200, seed=1)
+
+    def create(self, size=None):
+        response = self.client.post('/api/chunked-uploads/', {'file_name': 'chunked.csv', 'size': len(self.content) if size is None else size})
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def put(self, upload_id, offset, data):
+        return self.client.put(f'/api/chunked-uploads/{upload_id}/chunk/?offset={offset}', data, content_type='application/octet-stream')
+
+    def finalize(self, upload_id, sha256=None):
+        with self.captureOnCommitCallbacks():
+            return self.client.post(f'/api/chunked-uploads/{upload_id}/finalize/', {'sha256': sha256} if sha256 else {})
+
+    def test_offset_conflict(self):
+        upload_id = self.create()
+        self.assertEqual(self.put(upload_id, 0, self.content[:100]).data['offset'], 100)
+        for offset in [0, 50, 200]:
+            response = self.put(upload_id, offset, self.content[offset:offset + 100])
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.data['offset'], 100)
+
+    def test_resume_and_finalize(self):
+        upload_id = self.create()
+        half = len(self.content) // 2
+        self.assertEqual(self.put(upload_id, 0, self.content[:half]).status_code, 200)
+        # 中断的分块在暂存文件末尾留下了未确认的内容
+        with open(Assessment_ChunkedUpload.objects.get(pk=upload_id).spool_path, 'ab') as spool:
+            spool.write(b'partial chunk')
+
+        # 网络恢复后查询已接收的字节数，从该位置继续上传
+        offset = self.client.get(f'/api/chunked-uploads/{upload_id}/').data['offset']
+        self.assertEqual(offset, half)
+        self.assertEqual(self.put(upload_id, offset, self.content[offset:]).data['offset'], len(self.content))
+
+        response = self.finalize(upload_id, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['files'][0]['size'], len(self.content))
+        self.assertEqual(self.finalize(upload_id).status_code, 409)
+
+        call_command('run_upload_jobs', stdout=io.StringIO())
+        self.assertEqual(self.client.get(f'/api/upload-jobs/{response.data["id"]}/').data['status'], Assessment_UploadJob.SUCCEEDED)
+        self.assertEqual(Assessment_Base.objects.published().count(), self.stats['expected_rows'])
+
+    def test_finalize_mismatch(self):
+        upload_id = self.create()
+        self.put(upload_id, 0, self.content[:-10])
+        response = self.finalize(upload_id)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['offset'], len(self.content) - 10)
+
+        self.put(upload_id, len(self.content) - 10, self.content[-10:])
+        response = self.finalize(upload_id, hashlib.sha256(self.content + b'x').hexdigest())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sha256', response.data['detail'])
+        self.assertEqual(Assessment_ChunkedUpload.objects.get(pk=upload_id).status, Assessment_ChunkedUpload.UPLOADING)
+        self.assertFalse(Assessment_UploadJob.objects.exists())
+
+    def test_abandoned_upload_expired(self):
+        abandoned_id, active_id = self.create(), self.create()
+        self.put(abandoned_id, 0, self.content[:100])
+        self.put(active_id, 0, self.content[:100])
+        spool_path = Assessment_ChunkedUpload.objects.get(pk=abandoned_id).spool_path
+        Assessment_ChunkedUpload.objects.filter(pk=abandoned_id).update(updated_at=timezone.now() - timedelta(days=2))
+
+        output = io.StringIO()
+        call_command('run_upload_jobs', '--expire-uploads-after', '86400', stdout=output)
+        self.assertIn(f'分块上传 {abandoned_id}: 已过期', output.getvalue())
+        self.assertFalse(os.path.exists(spool_path))
+        self.assertEqual(self.client.get(f'/api/chunked-uploads/{abandoned_id}/').status_code, 404)
+        self.assertEqual(self.put(active_id, 100, self.content[100:200]).data['offset'], 200)
+
+    def test_stale_chunk_not_written(self):
+        upload_id = self.create()
+        # 两个请求都通过了视图里的偏移量检查，先拿到行锁的请求写入并推进偏移量
+        stale = Assessment_ChunkedUpload.objects.get(pk=upload_id)
+        self.assertEqual(self.put(upload_id, 0, self.content[:100]).data['offset'], 100)
+        self.assertIsNone(append_chunk(stale, 0, io.BytesIO(b'x' * 50)))
+        with open(stale.spool_path, 'rb') as spool:
+            self.assertEqual(spool.read(), self.content[:100])
+
+    def test_interrupted_chunk(self):
+        upload_id = self.create()
+        upload = Assessment_ChunkedUpload.objects.get(pk=upload_id)
+        stream = mock.Mock()
+        stream.read.side_effect = [self.content[:30], self.content[30:60], OSError('connection reset')]
+        with self.assertRaises(OSError):
+            append_chunk(upload, 0, stream)
+        # 已经写入的部分仍然有效，从新的偏移量继续上传
+        self.assertEqual(self.client.get(f'/api/chunked-uploads/{upload_id}/').data['offset'], 60)
+        self.assertEqual(self.put(upload_id, 60, self.content[60:]).data['offset'], len(self.content))
+
+
+# 整列清洗的结果与固定的预期记录逐行一致：空值和 N/A 步骤、重复记录、日期解析、工作证编号和考核结果的转换
+class CleanAssessmentFrameTests(SimpleTestCase):
+    CONTENT = """考核记录表
+日期,乘务班组,姓名,工作证编号,车型,考核项目,考核结果,备注,整体用时,步骤1,步骤2
+20230105,高峰一组,张三,10001,01A,紧急制动,优秀,,02:05,30,
+20230106,一班,李四,10002.0,1,紧急制动,良好,补考,45,,1:10
+2023-01-07,一班,王五,10003,01A,紧急制动,合格,,,10,
+,早高峰,赵六,10004,02B,紧急制动,不合格,,60,N/A,40
+20230108,一班,孙七,12,01A,紧急制动,优秀,,30,10,20
+20230109,一班,张三,10001,01A,紧急制动,合格,重复,50,25,25
+"""
+    COLUMNS = [
+        'record_date', 'crew_group', 'name', 'work_certificate_number', 'train_model', 'train_line', 'assessment_item',
+        'assessment_result', 'data_values', 'total_seconds', 'step:步骤1', 'step:步骤2',
+    ]
+    # 第一列为数据行的行号；张三的第一条记录被文件中后出现的同一科目记录覆盖，王五的日期和孙七的工作证编号不合法被跳过
+    EXPECTED = [
+        (1, date(2023, 1, 6), '一班', '李四', 10002, '1', None, '紧急制动', Assessment_Base.OTHER, ['45', None, '1:10'], 45.0, None, 70.0),
+        (3, None, '乘务高峰组', '赵六', 10004, '02B', '02', '紧急制动', Assessment_Base.NOT_QUALIFIED, ['60', None, '40'], 60.0, None, 40.0),
+        (5, date(2023, 1, 9), '一班', '张三', 10001, '01A', '01', '紧急制动', Assessment_Base.QUALIFIED, ['50', 25.0, '25'], 50.0, 25.0, 25.0),
+    ]
+
+    def test_expected_rows(self):
+        df = next(read_csv_chunks(io.BytesIO(self.CONTENT.encode('utf-8')), 'utf-8'))
+        rejections = RejectedRows('clean.csv')
+        cleaned = clean_assessment_frame(prepare_assessment_frame(df), 'clean.csv', None, rejections)
+
+        self.assertEqual(set(cleaned['data_keys']), {data_keys_signature(['整体用时', '步骤1', '步骤2'])})
+        rows = cleaned[self.COLUMNS].astype(object)
+        rows = rows.where(rows.notna(), None)
+        actual = [(index, *values) for index, values in zip(rows.index, rows.values.tolist())]
+        self.assertEqual(len(actual), len(self.EXPECTED))
+        for actual_row, expected_row in zip(actual, self.EXPECTED):
+            self.assertEqual(actual_row, expected_row)
+        self.assertEqual(rejections.summary(), {'total': 2, 'reasons': {
+            Assessment_Rejection.INVALID_WORK_CERTIFICATE_NUMBER: {'count': 1, 'rows': [4]},
+            Assessment_Rejection.INVALID_RECORD_DATE: {'count': 1, 'rows': [2]},
+        }})
+
+    # 工作证编号按入库后的整数判重，10001、10001.0 和带空白的 10001 是同一个人，与跨分块判重的键一致
+    def test_dedup_normalized_numbers(self):
+        content = '考核记录表\n日期,姓名,工作证编号,车型,考核项目,考核结果\n'
+        content += '20230101,张三,10001,01A,紧急制动,合格\n20230102,张三,10001.0,01A,紧急制动,优秀\n'
+        content += '20230103,张三, 10001 ,01A,紧急制动,不合格\n20230104,张三,10001,01B,紧急制动,合格\n'
+        df = next(read_csv_chunks(io.BytesIO(content.encode('utf-8')), 'utf-8'))
+        prepared = prepare_assessment_frame(df)
+        self.assertEqual(list(prepared.index), [2, 3])
+        self.assertEqual(len(assessment_frame_keys(df)), len(prepared))
+
+
+# 编码检测：按 BOM 和样本依次判断，同一来源上次记录的编码优先使用，不再检测
+class EncodingDetectionTests(TestCase):
+    TEXT = '考核记录表\n日期,姓名,工作证编号,车型,考核项目\n20230101,张三,10001,01A,紧急制动\n'
+
+    def test_detect_encoding(self):
+        cases = [
+            (codecs.BOM_UTF8 + self.TEXT.encode('utf-8'), 'utf-8-sig'),
+            (self.TEXT.encode('utf-16'), 'utf-16'),
+            (self.TEXT.encode('utf-8'), 'utf-8'),
+            # 样本在多字节字符中间截断时仍判断为 utf-8
+            (self.TEXT.encode('utf-8')[:4], 'utf-8'),
+            (self.TEXT.encode('gb18030'), 'gb18030'),
+            (b'\x80abc', 'latin1'),
+        ]
+        for sample, encoding in cases:
+            self.assertEqual(detect_encoding(sample), encoding, sample)
+
+    def test_encoding_candidates(self):
+        source = io.BytesIO(self.TEXT.encode('gb18030'))
+        self.assertEqual(list(encoding_candidates(source)), ['gb18030', 'latin1'])
+        self.assertEqual(list(encoding_candidates(source, 'utf-8')), ['utf-8', 'gb18030', 'latin1'])
+        self.assertEqual(list(encoding_candidates(io.BytesIO(self.TEXT.encode('utf-8')))), ['utf-8', 'gb18030', 'latin1'])
+        self.assertEqual(list(encoding_candidates(source, 'gb18030', 'a.xlsx')), [None])
+
+        # 已知编码先给出，只有它解析失败、继续取下一个编码时才读取样本检测
+        with mock.patch('upload.readers.detect_encoding', wraps=detect_encoding) as detect:
+            candidates = encoding_candidates(source, 'gb18030')
+            self.assertEqual(next(candidates), 'gb18030')
+            detect.assert_not_called()
+            self.assertEqual(next(candidates), 'latin1')
+            detect.assert_called_once()
+
+    def test_recorded_encoding_reused(self):
+        client = APIClient()
+        content, _ = generate_assessment_csv(60, seed=1, encoding='gb18030')
+        client.post('/api/upload-assessment/', {'file': SimpleUploadedFile('gbk.csv', content)}, format='multipart')
+        self.assertEqual(Assessment_File.objects.get(file_name='gbk.csv').encoding, 'gb18030')
+
+        content, stats = generate_assessment_csv(80, seed=2, encoding='gb18030')
+        with mock.patch('upload.readers.detect_encoding', wraps=detect_encoding) as detect:
+            response = client.post('/api/upload-assessment/', {'file': SimpleUploadedFile('gbk.csv', content)}, format='multipart')
+        self.assertEqual(response.data['files'][0]['rows_written'], stats['expected_rows'])
+        detect.assert_not_called()
+        self.assertIn(f",{Assessment_Base.objects.filter(file_name='gbk.csv').first().name},", content.decode('gb18030'))
+
+
+# 从目录批量导入考核文件，失败的文件修正后重新运行续传，已导入的文件跳过
+class ImportAssessmentsCommandTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.expected_rows = 0
+        for index, (path, encoding) in enumerate([('2022/a.csv', 'gb18030'), ('2023/b.csv', 'utf-8-sig')]):
+            content, stats = generate_assessment_csv(300, seed=index, encoding=encoding)
+            self.write(path, content)
+            self.expected_rows += stats['expected_rows']
+        content, stats = generate_assessment_csv(300, seed=5)
+        with zipfile.ZipFile(os.path.join(self.directory.name, '2023', 'c.zip'), 'w') as archive:
+            archive.writestr('c.csv', content)
+        self.expected_rows += stats['expected_rows']
+        self.write('readme.txt', b'not an assessment file')
+
+    def write(self, path, content):
+        path = os.path.join(self.directory.name, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(content)
+
+    def run_import(self, *args):
+        output = io.StringIO()
+        call_command('import_assessments', self.directory.name, '--workers', '2', *args, stdout=output)
+        return output.getvalue()
+
+    def test_import_and_resume(self):
+        self.write('2023/broken.csv', '乘务考核记录表\n日期,姓名\n20230101,王伟\n'.encode('utf-8'))
+        with self.assertRaises(CommandError):
+            self.run_import()
+        self.assertEqual(Assessment_Base.objects.count(), self.expected_rows)
+        self.assertEqual(set(Assessment_File.objects.values_list('file_name', flat=True)), {'a.csv', 'b.csv', 'c.csv'})
+
+        # 修正失败的文件后重新运行，只处理该文件
+        content, stats = generate_assessment_csv(100, seed=9)
+        self.write('2023/broken.csv', content)
+        output = self.run_import()
+        self.assertIn('succeeded 1 个, unchanged 3 个', output)
+        self.assertEqual(Assessment_Base.objects.count(), self.expected_rows + stats['expected_rows'])
+
+    def test_duplicate_names(self):
+        self.write('2024/a.csv', generate_assessment_csv(10)[0])
+        with self.assertRaises(CommandError):
+            self.run_import()
+        self.run_import('--relative-names')
+        self.assertEqual(
+            set(Assessment_File.objects.values_list('file_name', flat=True)),
+            {'2022/a.csv', '2023/b.csv', '2023/c.zip/c.csv', '2024/a.csv'},
+        )
+
+
+# 考核信息列表的各种筛选都走索引，表增长到几百万行后不会退化为全表扫描
+@skipUnless(connection.vendor == 'sqlite', '查询计划的格式与数据库有关，只检查 SQLite')
+class AssessmentBaseIndexTests(TestCase):
+    def plan(self, params):
+        view = AssessmentBaseViewSet(request=Request(APIRequestFactory().get('/', params)), format_kwarg=None)
+        return view.filter_queryset(view.get_queryset()).explain()
+
+    def assertPlan(self, params, index, sorted_by_index=True):
+        plan = self.plan(params)
+        self.assertIn(f'USING INDEX {index}', plan)
+        if sorted_by_index:
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_list_paths(self):
+        self.assertPlan({}, 'base_published_date_idx')
+        self.assertPlan({'start_date': '2023-01-01', 'end_date': '2023-06-30'}, 'base_published_date_idx')
+        self.assertPlan({'end_date': '2023-06-30'}, 'base_published_date_idx')
+        self.assertPlan({'train_model': '01A', 'assessment_item': '紧急制动', 'start_date': '2023-01-01'}, 'base_model_item_date_idx')
+        self.assertPlan({'assessment_item': '紧急制动', 'end_date': '2023-06-30'}, 'base_item_date_idx')
+        self.assertPlan({'train_model_line': '01', 'start_date': '2023-01-01'}, 'base_line_date_idx')
+        # 其他长度的线路前缀先在索引上缩小范围，再对筛选出的记录按日期排序
+        self.assertPlan({'train_model_line': '010'}, 'base_model_item_date_idx', sorted_by_index=False)
+
+    # 已发布的条件生成等值比较，作为普通复合索引的第一列使用，MySQL 不支持部分索引
+    def test_published_condition_in_index(self):
+        self.assertIn('"is_published" = ', str(Assessment_Base.objects.published().query))
+        for params in [{}, {'train_model': '01A'}, {'assessment_item': '紧急制动', 'end_date': '2023-06-30'}]:
+            self.assertIn('(is_published=?', self.plan(params))
+        for index in Assessment_Base._meta.indexes:
+            self.assertIsNone(index.condition, index.name)
+
+    def test_file_paths(self):
+        self.assertIn('USING INDEX base_file_version_idx', Assessment_Base.objects.published().filter(file_name='a.csv').explain())
+        self.assertIn('USING INDEX base_file_version_idx', Assessment_Base.objects.filter(file_name='a.csv', file_version=2).explain())
+
+    def test_train_model_line_prefix(self):
+        for train_model in ['01A', '01B', '010', '02A', '0']:
+            Assessment_Base.objects.create(train_model=train_model)
+        for line, expected in [('01', ['010', '01A', '01B']), ('010', ['010']), ('0', ['0', '010', '01A', '01B', '02A'])]:
+            view = AssessmentBaseViewSet(request=Request(APIRequestFactory().get('/', {'train_model_line': line})), format_kwarg=None)
+            self.assertEqual(sorted(view.get_queryset().values_list('train_model', flat=True)), expected)
+        self.assertEqual(Assessment_Base.objects.get(train_model='0').train_line, None)
+
+        # 通过模型保存修改车型时线路编号随之更新
+        record = Assessment_Base.objects.get(train_model='02A')
+        record.train_model = '05C'
+        record.save(update_fields=['train_model'])
+        record.refresh_from_db()
+        self.assertEqual(record.train_line, '05')
+
+
+# 考核信息列表的游标分页
+class AssessmentCursorPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        # 同一天有多条记录，还有日期为空的记录和未发布的暂存记录
+        for index in range(25):
+            Assessment_Base.objects.create(record_date=f'2023-01-{index % 4 + 1:02d}', train_model='01A', assessment_item='紧急制动')
+        Assessment_Base.objects.create(record_date=None, assessment_item='紧急制动')
+        Assessment_Base.objects.create(record_date='2023-01-01', is_published=False, assessment_item='紧急制动')
+        self.client = APIClient()
+
+    def test_pages_cover_all_records_in_order(self):
+        expected = list(Assessment_Base.objects.published().order_by('record_date', 'id').values_list('id', flat=True))
+        ids, pages = [], 1
+        response = self.client.get('/api/assessment-base/', {'pagination': 'cursor', 'page_size': 4, 'assessment_item': '紧急制动'})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['count'], 26)
+            ids.extend(row['id'] for row in response.data['results'])
+            if response.data['next'] is None:
+                break
+            response, pages = self.client.get(response.data['next']), pages + 1
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 7)
+
+    def test_count_cached_across_pages(self):
+        response = self.client.get('/api/assessment-base/', {'pagination': 'cursor'})
+        Assessment_Base.objects.create(record_date='2023-02-01')
+        with self.assertNumQueries(1):
+            response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['count'], 26)
+        # 筛选条件不同的总数单独缓存
+        self.assertEqual(self.client.get('/api/assessment-base/', {'pagination': 'cursor', 'end_date': '2023-01-01'}).data['count'], 7)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/assessment-base/', {'cursor': 'bm90LWEtY3Vyc29y'}).status_code, 404)
+
+    # 游标分页固定按日期、id 排序，不支持的 ordering 返回 400，与固定排序一致的 ordering 可以使用
+    def test_unsupported_ordering(self):
+        for ordering in ['-record_date', 'name', 'record_date,-id']:
+            response = self.client.get('/api/assessment-base/', {'pagination': 'cursor', 'ordering': ordering})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('ordering', response.data)
+        for ordering in ['record_date', 'record_date,id']:
+            self.assertEqual(self.client.get('/api/assessment-base/', {'pagination': 'cursor', 'ordering': ordering}).status_code, 200)
+        self.assertEqual(self.client.get('/api/assessment-base/', {'ordering': '-record_date'}).status_code, 200)
+
+    def test_page_number_pagination_unchanged(self):
+        response = self.client.get('/api/assessment-base/', {'page': 2})
+        self.assertEqual(response.data['count'], 26)
+        self.assertIn('previous', response.data)
+
+
+# 列表和全量数据接口的快速序列化与 AssessmentBaseSerializer 渲染出的 JSON 完全相同
+class AssessmentBaseFastSerializationTests(TestCase):
+    def setUp(self):
+        for index, train_model in enumerate(['01A', '5', '', None, '一号线A', '10B']):
+            Assessment_Base.objects.create(
+                record_date=f'2023-04-{index + 1:02d}' if index != 2 else None, name=f'李{index}', train_model=train_model,
+                work_certificate_number=10000 + index, assessment_item='逃生门释放', assessment_result=index % 4,
+                additional_data={'整体用时': index * 10, '步骤1确认故障信息': index} if index != 1 else None,
+            )
+        self.client = APIClient()
+
+    def expected(self, queryset):
+        return JSONRenderer().render(AssessmentBaseSerializer(queryset, many=True).data)
+
+    def test_unpaged_data(self):
+        response = self.client.get('/api/assessment-base/unpaged-data/', {'format': 'json'})
+        self.assertEqual(response.content, self.expected(Assessment_Base.objects.published()))
+
+    def test_list_pages(self):
+        queryset = Assessment_Base.objects.published().order_by('record_date')
+        response = self.client.get('/api/assessment-base/', {'format': 'json', 'page_size': 4, 'page': 2})
+        self.assertEqual(JSONRenderer().render(response.data['results']), self.expected(queryset[4:]))
+        response = self.client.get('/api/assessment-base/', {'format': 'json', 'pagination': 'cursor', 'page_size': 4})
+        self.assertEqual(JSONRenderer().render(response.data['results']), self.expected(queryset[:4]))
+
+
+# 科目目录随入库和接口增删改增量更新，与按全部记录重新统计的结果一致
+class SubjectCatalogTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def catalog(self):
+        return list(Assessment_Subject.objects.values_list('train_model', 'assessment_item', 'row_count', 'first_date', 'last_date'))
+
+    def assertCatalogCurrent(self):
+        catalog = self.catalog()
+        rebuild_subjects()
+        self.assertEqual(catalog, self.catalog())
+
+    def upload(self, name, seed, rows=300, mode=None):
+        content, _ = generate_assessment_csv(rows, seed=seed)
+        url = '/api/upload-assessment/' + ('?mode=incremental' if mode else '')
+        response = self.client.post(url, {'file': SimpleUploadedFile(name, content)}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+
+    def test_ingestion_updates_catalog(self):
+        self.upload('a.csv', seed=1)
+        self.upload('b.csv', seed=2)
+        self.assertGreater(len(self.catalog()), 0)
+        self.assertCatalogCurrent()
+        # 重新上传更少的记录，原有的科目计数随之减少
+        self.upload('a.csv', seed=3, rows=20)
+        self.assertCatalogCurrent()
+        self.upload('b.csv', seed=4, rows=50, mode='incremental')
+        self.assertCatalogCurrent()
+
+    def test_api_changes_update_catalog(self):
+        # 直接写入的记录在同一科目的下一次统计时计入
+        Assessment_Base.objects.create(record_date='2023-05-01', train_model='01A', assessment_item='紧急制动')
+        response = self.client.post('/api/assessment-base/', {'record_date': '2023-05-02', 'train_model': '01A', 'assessment_item': '紧急制动', 'assessment_result': 2})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.catalog(), [('01A', '紧急制动', 2, date(2023, 5, 1), date(2023, 5, 2))])
+        self.client.patch(f'/api/assessment-base/{response.data["id"]}/', {'assessment_item': '逃生门释放'})
+        self.assertEqual(self.catalog(), [
+            ('01A', '紧急制动', 1, date(2023, 5, 1), date(2023, 5, 1)),
+            ('01A', '逃生门释放', 1, date(2023, 5, 2), date(2023, 5, 2)),
+        ])
+        self.client.delete(f'/api/assessment-base/{response.data["id"]}/')
+        self.assertEqual(self.catalog(), [('01A', '紧急制动', 1, date(2023, 5, 1), date(2023, 5, 1))])
+
+    def test_dropdown(self):
+        Assessment_Base.objects.create(record_date='2023-05-01', train_model='01A', assessment_item='车门-旁路操作')
+        Assessment_Base.objects.create(record_date='2023-06-01', train_model='05C', assessment_item='紧急制动')
+        rebuild_subjects()
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/assessment-base/all-train-and-assessment/')
+        self.assertEqual([(row['train_model'], row['assessment_item'], row['row_count']) for row in response.data],
+                         [('01A', '车门-旁路操作', 1), ('05C', '紧急制动', 1)])
+        # 带筛选条件时按筛选后的记录返回科目
+        response = self.client.get('/api/assessment-base/all-train-and-assessment/', {'start_date': '2023-06-01'})
+        self.assertEqual(response.data, [{'train_model': '05C', 'assessment_item': '紧急制动'}])
+
+
+# 流式导出与原先 unpaged-data 返回的数据一致
+class AssessmentExportTests(TestCase):
+    def setUp(self):
+        for index in range(7):
+            Assessment_Base.objects.create(
+                record_date=f'2023-03-{index + 1:02d}', name=f'王{index}', train_model='01A' if index % 2 else '5',
+                assessment_item='紧急制动', additional_data={'整体用时': index * 10, '步骤1确认故障信息': index},
+            )
+        Assessment_Base.objects.create(record_date='2023-03-01', is_published=False)
+        self.client = APIClient()
+
+    def export(self, **params):
+        response = self.client.get('/api/assessment-base/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_ndjson_matches_serializer(self):
+        lines = self.export(end_date='2023-03-05').splitlines()
+        queryset = Assessment_Base.objects.published().filter(record_date__lte='2023-03-05').order_by('record_date')
+        expected = json.loads(json.dumps(AssessmentBaseSerializer(queryset, many=True).data))
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+    def test_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.export(export_format='csv').lstrip('\ufeff'))))
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(list(rows[0]), EXPORT_COLUMNS)
+        self.assertEqual(json.loads(rows[3]['additional_data']), {'整体用时': 30, '步骤1确认故障信息': 3})
+        self.assertEqual([row['trainLines'] for row in rows[:2]], ['', '01'])
+
+    def test_chunks(self):
+        chunks = list(stream_ndjson(Assessment_Base.objects.published(), chunk_size=3))
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [3, 3, 1])
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get('/api/assessment-base/export/', {'export_format': 'xml'}).status_code, 400)
+
+
+# 分组统计接口按筛选条件在数据库中计算合格率和整体用时
+class AssessmentAggregateTests(TestCase):
+    def setUp(self):
+        rows = [
+            ('2023-01-05', '一组', '01A', 3, '1:30'),
+            ('2023-01-20', '一组', '01A', 2, 120),
+            ('2023-02-03', '一组', '01B', 1, '0:03:00'),
+            ('2023-02-10', '二组', '05C', 0, None),
+            ('2023-02-11', '二组', '05C', 3, '45'),
+        ]
+        for record_date, crew_group, train_model, result, total in rows:
+            Assessment_Base.objects.create(
+                record_date=record_date, crew_group=crew_group, train_model=train_model, assessment_item='紧急制动',
+                assessment_result=result, additional_data={'整体用时': total} if total is not None else None,
+            )
+        Assessment_Base.objects.create(record_date='2023-01-05', crew_group='一组', is_published=False, additional_data={'整体用时': 999})
+        self.client = APIClient()
+
+    def aggregate(self, **params):
+        response = self.client.get('/api/assessment-base/aggregate/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['groups']
+
+    def test_total_seconds_column(self):
+        self.assertEqual(
+            list(Assessment_Base.objects.published().order_by('record_date').values_list('total_seconds', flat=True)),
+            [90.0, 120.0, 180.0, None, 45.0],
+        )
+
+    def test_group_by_crew_group(self):
+        groups = self.aggregate(group_by='crew_group')
+        self.assertEqual([(group['crew_group'], group['count']) for group in groups], [('一组', 3), ('二组', 2)])
+        first = groups[0]
+        self.assertEqual(first['results'], {'优秀': 1, '合格': 1, '不合格': 1, '其他': 0})
+        self.assertEqual((first['pass_rate'], first['excellent_rate']), (0.6667, 0.3333))
+        self.assertEqual(first['total_seconds'], {'count': 3, 'mean': 130.0, 'min': 90.0, 'max': 180.0, 'p50': 120.0, 'p90': 168.0})
+        self.assertEqual(groups[1]['total_seconds']['count'], 1)
+
+    def test_group_by_line_and_month_with_filters(self):
+        groups = self.aggregate(group_by='train_line,month', metrics='count', train_model_line='01')
+        self.assertEqual(groups, [
+            {'train_line': '01', 'month': '2023-01', 'count': 2},
+            {'train_line': '01', 'month': '2023-02', 'count': 1},
+        ])
+
+    def test_without_group_by(self):
+        groups = self.aggregate(metrics='total_seconds', percentiles='0,100')
+        self.assertEqual(groups, [{'count': 5, 'total_seconds': {'count': 4, 'mean': 108.75, 'min': 45.0, 'max': 180.0, 'p0': 45.0, 'p100': 180.0}}])
+
+    def test_invalid_params(self):
+        for params in [{'group_by': 'name'}, {'metrics': 'sum'}, {'percentiles': '120'}, {'percentiles': 'x'}]:
+            response = self.client.get('/api/assessment-base/aggregate/', params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('detail', response.data)
+
+
+# 步骤用时表随入库、增量写入和接口修改更新，与按 additional_data 逐条换算的结果一致
+class StepTimingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def timings(self):
+        return sorted(Assessment_StepTiming.objects.values_list('assessment_base_id', 'step_order', 'step_key', 'seconds'))
+
+    def expected(self):
+        return sorted(
+            (record.id, order, key, seconds)
+            for record in Assessment_Base.objects.all()
+            for order, key, seconds in step_seconds_of(record.additional_data)
+        )
+
+    def upload(self, name, seed, rows=200, mode=None):
+        content, _ = generate_assessment_csv(rows, steps=3, seed=seed)
+        url = '/api/upload-assessment/' + ('?mode=incremental' if mode else '')
+        response = self.client.post(url, {'file': SimpleUploadedFile(name, content)}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+
+    def test_step_seconds_of(self):
+        self.assertEqual(
+            step_seconds_of({'整体用时': '3:00', '步骤1确认故障信息': '12', '步骤2报告行车调度': '', '步骤3试拉确认': '1:05'}),
+            [(1, '步骤1确认故障信息', 12.0), (3, '步骤3试拉确认', 65.0)],
+        )
+        self.assertEqual(step_seconds_of(None), [])
+
+    def test_ingestion(self):
+        self.upload('a.csv', seed=1)
+        self.assertEqual(Assessment_StepTiming.objects.count(), Assessment_Base.objects.count() * 3)
+        self.assertEqual(self.timings(), self.expected())
+        # 重新上传替换整个文件，旧记录的步骤用时随之删除
+        self.upload('a.csv', seed=2, rows=50)
+        self.assertEqual(self.timings(), self.expected())
+        self.upload('a.csv', seed=3, rows=80, mode='incremental')
+        self.assertEqual(self.timings(), self.expected())
+
+    # MySQL 的 bulk_create 不返回主键，写入后按判重键查询补上 id，同样生成全部步骤用时
+    def test_ingestion_without_returned_ids(self):
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            self.upload('a.csv', seed=1)
+            self.assertEqual(Assessment_StepTiming.objects.count(), Assessment_Base.objects.count() * 3)
+            self.assertEqual(self.timings(), self.expected())
+            # 增量模式新增的记录同样补上 id 后生成步骤用时
+            self.upload('a.csv', seed=3, rows=80, mode='incremental')
+            self.assertEqual(self.timings(), self.expected())
+
+    def test_api_save(self):
+        response = self.client.post('/api/assessment-base/', {'assessment_item': '紧急制动', 'assessment_result': 2, 'additional_data': json.dumps({'整体用时': 20, '步骤1': 8, '步骤2': 12})})
+        self.assertEqual(response.status_code, 201)
+        self.client.patch(f'/api/assessment-base/{response.data["id"]}/', {'additional_data': json.dumps({'整体用时': 9, '步骤1': 9})})
+        self.assertEqual(self.timings(), [(response.data['id'], 1, '步骤1', 9.0)])
+
+    def test_backfill_command(self):
+        self.upload('a.csv', seed=1, rows=60)
+        expected = self.timings()
+        Assessment_StepTiming.objects.all().delete()
+        call_command('backfill_step_timings', batch_size=7, stdout=io.StringIO())
+        self.assertEqual(self.timings(), expected)
+
+    def test_sql_aggregate(self):
+        self.upload('a.csv', seed=4)
+        averages = dict(
+            Assessment_StepTiming.objects.filter(step_key='步骤1确认故障信息', assessment_base__is_published=True)
+            .values_list('assessment_base__crew_group').annotate(Avg('seconds')).order_by()
+        )
+        for crew_group, average in averages.items():
+            values = [record.additional_data['步骤1确认故障信息'] for record in Assessment_Base.objects.filter(crew_group=crew_group)]
+            self.assertAlmostEqual(average, sum(float(value) for value in values) / len(values))
+
+
+# additional_data 拆分为列名字典和值保存，接口返回的字典与拆分前完全相同
+class AdditionalDataStorageTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_ingestion_stores_values(self):
+        content, _ = generate_assessment_csv(100, steps=3, seed=1)
+        response = self.client.post('/api/upload-assessment/', {'file': SimpleUploadedFile('a.csv', content)}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        keys = ['整体用时'] + step_columns(3)
+        self.assertEqual(list(Assessment_DataKeys.objects.values_list('keys', flat=True)), [keys])
+        self.assertTrue(all(len(values) == 4 for values in Assessment_Base.objects.values_list('data_values', flat=True)))
+
+        rows = list(csv.reader(io.StringIO(content.decode('utf-8'))))[2:]
+        expected = {(row[3], row[4], row[5]): dict(zip(keys, map(int, row[8:]))) for row in rows}
+        data = self.client.get('/api/assessment-base/unpaged-data/').data
+        for record in data:
+            self.assertEqual(list(record['additional_data'].items()), list(expected[(str(record['work_certificate_number']), record['train_model'], record['assessment_item'])].items()))
+
+    def test_api_round_trip(self):
+        for additional_data in [{'整体用时': 30, '步骤1': '10', '备注': None}, [1, 2], {}, None]:
+            response = self.client.post('/api/assessment-base/', {'assessment_item': '紧急制动', 'assessment_result': 2, 'additional_data': json.dumps(additional_data)})
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(self.client.get(f'/api/assessment-base/{response.data["id"]}/').data['additional_data'], additional_data)
+        self.assertEqual(Assessment_DataKeys.objects.count(), 2)
+
+    def test_save_update_fields(self):
+        record = Assessment_Base.objects.create(train_model='01A', additional_data={'整体用时': 30})
+        record.additional_data = {'整体用时': '1:00', '步骤1': 20}
+        record.save(update_fields=['additional_data'])
+        record = Assessment_Base.objects.get(pk=record.pk)
+        self.assertEqual(record.additional_data, {'整体用时': '1:00', '步骤1': 20})
+        self.assertEqual(record.total_seconds, 60.0)
+        self.assertEqual(list(record.step_timings.values_list('step_key', 'seconds')), [('步骤1', 20.0)])
+
+
+# 上传性能基准本身能够运行，默认规模的基准通过 manage.py bench_upload 运行
+class UploadBenchmarkTests(TestCase):
+    def test_run_case(self):
+        result = run_case(300, measure_memory=True)
+        self.assertEqual(result['files'], 3)
+        self.assertEqual(result['written_rows'], result['expected_rows'])
+        self.assertGreater(result['rows_per_second'], 0)
+        self.assertGreater(result['queries'], 0)
+        self.assertGreater(result['peak_memory_mb'], 0)
+
+    def test_run_read_case(self):
+        result = run_read_case(200, steps=3, repeat=1)
+        self.assertGreater(result['records'], 0)
+        self.assertGreater(result['values']['rows_per_second'], 0)
+
+    def test_find_regressions(self):
+        baseline = [{'rows': 1000, 'rows_per_second': 5000, 'queries': 50}]
+        self.assertEqual(find_regressions([{'rows': 1000, 'rows_per_second': 4500, 'queries': 55}], baseline), [])
+        self.assertEqual(len(find_regressions([{'rows': 1000, 'rows_per_second': 3000, 'queries': 80}], baseline)), 2)
+        self.assertEqual(find_regressions([{'rows': 2000, 'rows_per_second': 1, 'queries': 1}], baseline), [])
+
+
+# pyarrow 解析器与 pandas 解析器读出的分块完全一致
+@skipUnless(pa_csv, '没有安装 pyarrow')
+class ArrowCsvReaderTests(SimpleTestCase):
+    def assertSameChunks(self, content, encoding):
+        arrow_chunks = list(read_arrow_chunks(io.BytesIO(content), encoding, chunk_size=400))
+        pandas_chunks = list(read_csv_chunks(io.BytesIO(content), encoding, chunk_size=400))
+        self.assertEqual(len(arrow_chunks), len(pandas_chunks))
+        for arrow_chunk, pandas_chunk in zip(arrow_chunks, pandas_chunks):
+            self.assertEqual(list(arrow_chunk.columns), list(pandas_chunk.columns))
+            self.assertEqual(list(arrow_chunk.index), list(pandas_chunk.index))
+            for column in arrow_chunk.columns:
+                self.assertEqual(
+                    arrow_chunk[column].astype(object).where(arrow_chunk[column].notna(), None).tolist(),
+                    pandas_chunk[column].astype(object).where(pandas_chunk[column].notna(), None).tolist(),
+                    column,
+                )
+
+    def test_same_chunks(self):
+        for encoding in ['utf-8-sig', 'gb18030']:
+            content, _ = generate_assessment_csv(1000, steps=5, encoding=encoding, bad_date_ratio=0.05)
+            self.assertSameChunks(content, encoding)
+
+    # 形如日期、时间的文本不会被 pyarrow 转换为日期时间类型，保持原文
+    def test_temporal_text_kept(self):
+        content = '考核记录表,,,,,,,\n日期,姓名,工作证编号,车型,考核项目,整体用时,开始时间,步骤1\n'
+        content += '20230101,张三,10001,01A,紧急制动,00:03:25,2023-01-01 08:00,12\n' * 3
+        self.assertSameChunks(content.encode('utf-8'), 'utf-8')
+        chunk = next(read_arrow_chunks(io.BytesIO(content.encode('utf-8')), 'utf-8'))
+        self.assertEqual(chunk['整体用时'].iloc[0], '00:03:25')
+        self.assertEqual(chunk['开始时间'].iloc[0], '2023-01-01 08:00')
+        self.assertEqual(chunk['日期'].iloc[0], 20230101)
@@ -1,24 +1,47 @@
-import io
+import base64
+import hashlib
 import operator
-import re
-from datetime import datetime
+import sys
+from datetime import date
 from functools import reduce
 
-import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import F, Q
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import status, viewsets
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.filters import OrderingFilter
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import NewUser, Assessment_Base, Assessment_Classification
-from .serializers import AssessmentBaseSerializer
+from .aggregates import aggregate_assessments, parse_aggregation_params
+from .catalog import refresh_subjects
+from .exports import EXPORT_CONTENT_TYPES, EXPORT_STREAMS, NDJSON_FORMAT
+from .ingestion import get_process_pool, ingest_upload, ingest_uploads_parallel
+from .jobs import append_chunk, chunked_upload_sha256, create_chunked_upload, create_upload_job, finalize_chunked_upload
+from .models import TRAIN_LINE_LENGTH, NewUser, Assessment_Base, Assessment_ChunkedUpload, Assessment_Subject, Assessment_Classification, Assessment_UploadJob
+from .readers import expand_upload, get_parallel_source, get_upload_source, open_source
+from .serializers import (
+    AssessmentBaseSerializer, ChunkedUploadSerializer, UploadJobSerializer, assessment_base_data, assessment_base_values,
+)
+
+'''
+以 prefix 开头的条件，改写为 prefix <= field < prefix 的最后一个字符加一
+SQLite 的 LIKE 默认不区分大小写，不能使用普通索引；范围条件按 SQLite 默认的二进制排序规则比较，可以直接在索引上扫描
+前端传入的线路是 "01"、"05" 这样的数字，与原先的 startswith 结果一致
+'''
+def prefix_condition(field, prefix):
+    if ord(prefix[-1]) == sys.maxunicode:
+        return Q(**{f'{field}__startswith': prefix})
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix[:-1] + chr(ord(prefix[-1]) + 1)})
 
 # 获取当前登录用户信息
 class UserInfoViewSet(viewsets.ViewSet):
@@ -58,133 +81,121 @@ class LogoutView(APIView):
 # 定义文件上传并写入数据库的逻辑
 class AssessmentUploadView(APIView):
     
-    # 定义一个方法来将考核结果文本映射为整数存入数据库
-    def map_assessment_result(self, result_text):
-        mapping = {
-            '优秀': Assessment_Base.EXCELLENT,
-            '合格': Assessment_Base.QUALIFIED,
-            '不合格': Assessment_Base.NOT_QUALIFIED,
-        }
-        return mapping.get(result_text, Assessment_Base.OTHER)    
-    
     parser_classes = (MultiPartParser, FormParser)
 
     def post(self, request, *args, **kwargs):
         files = request.FILES.getlist('file')
+        # 增量模式：重新上传修正后的文件时只写入新增、修改和删除的记录，而不是删除后全部重新写入
+        incremental = request.query_params.get('mode') == 'incremental'
 
+        # 并行模式：多个文件在进程池中同时解析清洗，每个文件单独返回处理结果
+        if request.query_params.get('parallel') in ('1', 'true', 'True'):
+            return self.post_parallel(files, incremental)
+
+        results = []
         for file_obj in files:
+            file_name = file_obj.name
             try:
-                with transaction.atomic():
-                    file_name = file_obj.name
-                    # 删除数据库中已有的同名文件的数据
-                    Assessment_Base.objects.filter(file_name=file_name).delete()
-
-                    file_content = file_obj.read()
-                    df = None
-                    '''
-                    'latin1' (或 'iso-8859-1')：西欧语言字符集，是很多西欧语言的标准编码。
-                    'ascii'：美国标准信息交换码，只能表示基本的英文字符和一些控制字符。
-                    'utf-16'：与UTF-8类似，但使用至少16位（2字节）来编码字符，适用于编码较多的字符集。
-                    'utf-32'：使用32位（4字节）来编码字符，与UTF-16类似，但更占用空间，用于需要编码非常多字符的情况。
-                    'cp1252'：Windows的西欧字符集，与ISO-8859-1类似，但包含了一些在ISO-8859-1中未定义的打印字符。
-                    'gb2312'：简体中文字符集，比GBK和GB18030早，但字符数量较少。
-                    'big5'：繁体中文字符集，用于台湾、香港等地区的中文编码。
-                    '''
-                    for encoding in ['utf-8', 'gbk', 'latin1', 'ascii', 'utf-16', 'utf-32', 'cp1252', 'gb2312', 'big5']:
-                        try:
-                            io_string = io.StringIO(file_content.decode(encoding))
-                            # 后续在这里会判断文件的格式，对于不同的文件格式，需要使用不同的方法来读取文件
-                            # 例如：如果文件是 csv 格式，使用 pd.read_csv 方法来读取文件
-                            # 如果文件是 excel 格式，使用 pd.read_excel 方法来读取文件
-                            df = pd.read_csv(io_string, header=1)
-                            break
-                        except UnicodeDecodeError:
-                            continue
-
-                    if df is None:
-                        return Response({'detail': f'文件 {file_name} 无法解码，请检查文件编码格式!'}, status=status.HTTP_400_BAD_REQUEST)
-
-                    if '备注' in df.columns:
-                        df = df.drop('备注', axis=1)
-                    '''
-                    科目的定义：09A02逃生门释放和收回
-                    单科目单人重复填写，只保留最后一次的记录
-                    通过按照 姓名、工作证编号、车型 和 考核项目 这几个关键字段排序
-                    确保任何具有相同姓名、工作证编号、车型和考核项目的重复记录都会被排列在一起
-                    先排序确保重复记录紧密排列，然后只保留最后出现的记录，这样做可以有效地处理数据中的重复项
-                    '''   
-                    df = df.sort_values(by=['姓名', '工作证编号', '车型', '考核项目'])
-                    df = df.drop_duplicates(subset=['姓名', '工作证编号', '车型', '考核项目'], keep='last')
-                    
-                    # 首先，获取DataFrame的列名列表
-                    columns = df.columns.tolist()
-                    # 找到"整体耗时"这一列的索引
-                    try:
-                        # 尝试找到"整体耗时"这一列的索引
-                        time_index = columns.index('整体耗时')
-                    except ValueError:
-                        try:
-                            # 如果"整体耗时"列不存在，尝试找到"整体用时"这一列的索引
-                            time_index = columns.index('整体用时')
-                        except ValueError:
-                            # 如果"整体用时"也不存在，可能需要处理错误或选择一个备选方案
-                            time_index = len(columns)  # 假设所有列都需要保留
-
-                    # 在遍历DataFrame的每一行之前，确定需要pop的列
-                    columns_to_pop = columns[:time_index]
-                    
-                    for index, row in df.iterrows():
-                        # 尝试将工作证编号先转换为整数，然后转换为字符串
-                        try:
-                            work_certificate_number = str(int(row.get('工作证编号')))
-                        # 如果转换失败，则将工作证编号置为空字符串
-                        except (ValueError, TypeError):
-                            work_certificate_number = ''
-                            
-                        if pd.isna(work_certificate_number) or not re.match(r'^\d{5,}$', str(work_certificate_number)):
-                            print(f"跳过文件 {file_name} 中的行 {index}: 工作证编号 '{work_certificate_number}' 不是大于四位数的数字")
-                            continue
-                        
-                        # 如果乘务班组、姓名、工作证编号都为空，则跳过当前行不录入
-                        if pd.isna(row.get('乘务班组')) and pd.isna(row.get('姓名')) and (pd.isna(row.get('工作证编号')) or not re.match(r'^\d{5,}$', work_certificate_number)):
-                            print(f"跳过文件 {file_name} 中的行 {index}: 乘务班组、姓名、工作证编号都为空")
-                            continue  
-                        
-                        # 对时间型列 日期、记录日期 进行处理
-                        record_date_str = row.get('记录日期') or row.get('日期')
-                        try:
-                            # 将数据中的 20231110 转换为 2023-11-10
-                            record_date = datetime.strptime(str(record_date_str), '%Y%m%d').date() if pd.notna(record_date_str) else None
-                        except ValueError:
-                            print(f"跳过文件 {file_name} 中的行 {index}: 记录日期 '{record_date_str}' 格式错误")
-                            continue
-                        crew_group = row.get('乘务班组')
-                        if pd.notna(crew_group) and '高峰' in crew_group:
-                            crew_group = '乘务高峰组'
-                        # 考核结果的映射
-                        assessment_result = self.map_assessment_result(row.get('考核结果'))
-
-                        additional_data = row.to_dict()
-                        additional_data = {k: (None if pd.isna(v) else v) for k, v in additional_data.items()}
-                        for field in columns_to_pop:
-                            additional_data.pop(field, None)
-
-                        Assessment_Base.objects.create(
-                            file_name=file_name,
-                            record_date=record_date,
-                            crew_group=crew_group,
-                            name=row.get('姓名'),
-                            work_certificate_number=work_certificate_number,
-                            train_model=row.get('车型'),
-                            assessment_item=row.get('考核项目'),
-                            assessment_result=assessment_result,
-                            additional_data=additional_data
-                        )
-
+                # 不再一次性读入整个文件，而是从 Django 的临时文件中按分块流式读取
+                # .gz 和 .zip 文件边解压边读取，压缩包中的每个文件单独导入并返回各自的结果
+                # 内容与上次上传完全相同的文件直接返回 unchanged
+                for file_name, member in expand_upload(get_upload_source(file_obj), file_obj.name):
+                    with open_source(member) as source:
+                        results.append(ingest_upload(source, file_name, incremental=incremental))
             except Exception as e:
                 return Response({'detail': f'处理文件 {file_name} 时发生错误: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({'detail': '所有文件上传成功。'}, status=status.HTTP_201_CREATED)
+        return Response({'detail': '所有文件上传成功。', 'files': results}, status=status.HTTP_201_CREATED)
+
+    def post_parallel(self, files, incremental=False):
+        try:
+            # 压缩包中的每个文件作为单独的任务交给进程池，在子进程中才解压
+            sources = [member for file_obj in files for member in expand_upload(get_parallel_source(file_obj), file_obj.name)]
+        except Exception as e:
+            return Response({'detail': f'读取压缩包时发生错误: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+        # 各个请求共用同一个进程池，不在每个请求中启动子进程
+        executor = get_process_pool(settings.UPLOAD_PARALLEL_WORKERS)
+        results = ingest_uploads_parallel(sources, max_workers=settings.UPLOAD_PARALLEL_WORKERS, incremental=incremental, executor=executor)
+
+        failed_count = sum(1 for result in results if result['status'] == 'failed')
+        if failed_count:
+            # 部分文件失败时返回 207，前端根据 files 中每个文件的结果分别提示
+            return Response({'detail': f'{failed_count} 个文件处理失败。', 'files': results}, status=status.HTTP_207_MULTI_STATUS)
+        return Response({'detail': '所有文件上传成功。', 'files': results}, status=status.HTTP_201_CREATED)
+
+# 后台上传任务视图
+# POST 只暂存文件并创建任务，立即返回 202 和任务编号，GET 查询任务状态以及每个文件的进度、记录数和错误信息
+class UploadJobViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    queryset = Assessment_UploadJob.objects.prefetch_related('files')
+    serializer_class = UploadJobSerializer
+    parser_classes = (MultiPartParser, FormParser)
+
+    def create(self, request, *args, **kwargs):
+        files = request.FILES.getlist('file')
+        if not files:
+            return Response({'detail': '请选择要上传的文件!'}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = create_upload_job(files, request.user)
+        serializer = self.get_serializer(Assessment_UploadJob.objects.prefetch_related('files').get(pk=job.pk))
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+'''
+分块续传上传视图，适用于网络不稳定时上传超大文件
+POST 创建上传会话，返回会话编号和已接收的字节数
+PUT chunk/?offset=N 以请求体的原始字节追加一个分块，offset 必须等于已接收的字节数，不一致时返回 409 和当前的偏移量
+GET 查询会话，网络中断后从返回的 offset 继续上传
+POST finalize/ 完成上传，创建后台上传任务并返回 202 和任务信息，处理进度通过 upload-jobs 接口查询
+完成上传时可以提供整个文件的 sha256，与服务端收到的内容不一致时返回 400，客户端可以重新上传
+超过 CHUNKED_UPLOAD_EXPIRE_SECONDS 秒没有追加内容的会话由 run_upload_jobs 删除
+分块直接从请求流写入磁盘上的暂存文件，请求体不会被缓存到内存中
+'''
+class ChunkedUploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    queryset = Assessment_ChunkedUpload.objects.all()
+    serializer_class = ChunkedUploadSerializer
+
+    def perform_create(self, serializer):
+        serializer.instance = create_chunked_upload(
+            serializer.validated_data['file_name'], serializer.validated_data.get('size'), self.request.user,
+        )
+
+    @action(detail=True, methods=['put'], url_path='chunk')
+    def chunk(self, request, *args, **kwargs):
+        upload = self.get_object()
+        if upload.status != Assessment_ChunkedUpload.UPLOADING:
+            return Response({'detail': '上传已完成，不能再追加内容。', 'offset': upload.offset}, status=status.HTTP_409_CONFLICT)
+        try:
+            offset = int(request.query_params.get('offset', ''))
+        except ValueError:
+            return Response({'detail': '请提供分块的偏移量 offset!'}, status=status.HTTP_400_BAD_REQUEST)
+        if offset != upload.offset:
+            return Response({'detail': '分块的偏移量与已接收的字节数不一致。', 'offset': upload.offset}, status=status.HTTP_409_CONFLICT)
+
+        # 分块超出声明的文件大小时直接拒绝，不读取请求体
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if upload.size is not None and offset + content_length > upload.size:
+            return Response({'detail': '分块超出了文件大小。', 'offset': upload.offset}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 不访问 request.data，不经过解析器，直接从请求流中读取原始字节
+        new_offset = append_chunk(upload, offset, request.stream) if content_length else offset
+        upload.refresh_from_db()
+        if new_offset is None:
+            return Response({'detail': '分块的偏移量与已接收的字节数不一致。', 'offset': upload.offset}, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(upload).data)
+
+    @action(detail=True, methods=['post'], url_path='finalize')
+    def finalize(self, request, *args, **kwargs):
+        upload = self.get_object()
+        if upload.size is not None and upload.offset != upload.size:
+            return Response({'detail': f'文件尚未上传完整，已接收 {upload.offset} 字节，共 {upload.size} 字节。', 'offset': upload.offset}, status=status.HTTP_400_BAD_REQUEST)
+        sha256 = request.data.get('sha256')
+        if sha256 and upload.status == Assessment_ChunkedUpload.UPLOADING and sha256.lower() != chunked_upload_sha256(upload):
+            return Response({'detail': '文件内容的 sha256 与已接收的内容不一致。', 'offset': upload.offset}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = finalize_chunked_upload(upload)
+        if job is None:
+            return Response({'detail': '上传已完成，请勿重复提交。'}, status=status.HTTP_409_CONFLICT)
+        serializer = UploadJobSerializer(Assessment_UploadJob.objects.prefetch_related('files').get(pk=job.pk))
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
 # 定义分页规则
 class StandardResultsSetPagination(PageNumberPagination):
@@ -192,9 +203,93 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 1000
 
+'''
+按 (record_date, id) 的游标分页，前端加上 ?pagination=cursor 启用，之后按返回的 next 链接加载下一页
+游标记录上一页最后一条记录的日期和 id，下一页直接在日期索引上从该位置开始读取，不需要 OFFSET，任意深度的页都一样快
+游标分页固定按日期、id 升序排列，只能向后翻页，适合无限滚动；ordering 参数指定其他排序时返回 400，不会被悄悄忽略
+记录总数按筛选条件缓存 ASSESSMENT_COUNT_CACHE_SECONDS 秒，加载后续页时不再执行 COUNT，总数可能略有滞后
+'''
+class AssessmentCursorPagination(BasePagination):
+    page_size = 12
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    # 计算总数的缓存键时不包括的分页参数
+    pagination_query_params = ('pagination', 'cursor', 'page', 'page_size', 'ordering')
+    # 显式指定空日期排在最前，SQLite 和 PostgreSQL 的排序一致
+    ordering = (F('record_date').asc(nulls_first=True), 'id')
+    # 游标分页可以接受的 ordering 参数，都与固定的排序一致
+    allowed_orderings = ('', 'record_date', 'record_date,id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = request.query_params.get('ordering', '').replace(' ', '')
+        if ordering not in self.allowed_orderings:
+            raise ValidationError({'ordering': [f'游标分页固定按 record_date、id 升序排列，不支持 ordering={ordering}，请改用页码分页。']})
+        self.count = self.get_count(queryset)
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            record_date, last_id = cursor
+            if record_date is None:
+                queryset = queryset.filter(Q(record_date__isnull=True, id__gt=last_id) | Q(record_date__isnull=False))
+            else:
+                # record_date >= 上一页最后的日期 作为索引上的起点，同一天的记录再按 id 排除已经返回的
+                queryset = queryset.filter(record_date__gte=record_date).filter(Q(record_date__gt=record_date) | Q(id__gt=last_id))
+
+        # 多读一条判断是否还有下一页
+        rows = list(queryset[:page_size + 1])
+        page = rows[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if len(rows) > page_size else None
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({'count': self.count, 'next': self.get_next_link(), 'results': data})
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(page_size, self.max_page_size) if page_size > 0 else self.page_size
+
+    # 同样的筛选条件在缓存时间内只计算一次总数
+    def get_count(self, queryset):
+        params = sorted(
+            (key, value) for key, values in self.request.query_params.lists()
+            if key not in self.pagination_query_params for value in values
+        )
+        key = 'assessment_count:' + hashlib.sha256(repr(params).encode('utf-8')).hexdigest()
+        return cache.get_or_set(key, queryset.count, settings.ASSESSMENT_COUNT_CACHE_SECONDS)
+
+    def encode_cursor(self, row):
+        value = f"{row.record_date.isoformat() if row.record_date else ''}:{row.id}"
+        return base64.urlsafe_b64encode(value.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        value = request.query_params.get(self.cursor_query_param)
+        if not value:
+            return None
+        try:
+            record_date, last_id = base64.urlsafe_b64decode(value.encode('ascii')).decode('ascii').split(':')
+            return (date.fromisoformat(record_date) if record_date else None), int(last_id)
+        except (ValueError, UnicodeError):
+            raise NotFound('无效的分页游标')
+
+# get_queryset 中使用的筛选参数
+LIST_FILTER_PARAMS = ('start_date', 'end_date', 'train_model_line', 'train_model', 'assessment_item')
+
 # 驾驶员基本信息筛选排序视图
 class AssessmentBaseViewSet(viewsets.ModelViewSet):
-    queryset = Assessment_Base.objects.all()
+    # 只返回已发布的记录，正在上传的文件的暂存记录对列表和图表不可见
+    queryset = Assessment_Base.objects.published()
     serializer_class = AssessmentBaseSerializer
     pagination_class = StandardResultsSetPagination
     # 添加OrderingFilter到过滤后端
@@ -204,28 +299,45 @@ class AssessmentBaseViewSet(viewsets.ModelViewSet):
     ordering_fields = '__all__'
     # 默认按照记录日期升序排列
     ordering = ['record_date']
+
+    # 默认按页码分页，请求中带有 pagination=cursor 或 cursor 参数时改用游标分页
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params if self.request is not None else {}
+            if params.get('pagination') == 'cursor' or AssessmentCursorPagination.cursor_query_param in params:
+                self._paginator = AssessmentCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
     
     # 获取所有不重复的 train_model 和 assessment_item 组合，为前端的 科目 提供选项框
+    # 没有筛选条件时直接读取科目目录，与 Assessment_Base 的大小无关，同时返回每个科目的记录数和日期范围
+    # 带有日期、线路等筛选条件时对筛选后的记录做 DISTINCT
+    # 原先把两个字段用 '-' 拼成字符串去重后再拆开，名称中带 '-' 的科目会被拆错，现在直接返回字段值
     @action(detail=False, methods=['get'], url_path='all-train-and-assessment')
     def all_train_and_assessment_items(self, request, *args, **kwargs):
-        # 使用 Django 的 .values() 和 .distinct() 来获取所有不重复的 train_model 和 assessment_item 组合
-        queryset = self.get_queryset().values('train_model', 'assessment_item').distinct()
-
-        # 使用 set 来存储唯一的组合
-        unique_combinations = set()
-
-        # 遍历查询集，为每个组合创建一个唯一的字符串标识符，然后添加到 set 中
-        for item in queryset:
-            combination = f"{item['train_model']}-{item['assessment_item']}"
-            unique_combinations.add(combination)
-
-        # 将 set 转换回列表形式的数据，分别返回 train_model 和 assessment_item 字段
-        result = []
-        for combination in unique_combinations:
-            train_model, assessment_item = combination.split('-', 1)
-            result.append({"train_model": train_model, "assessment_item": assessment_item})
-
-        return Response(result)
+        if any(request.query_params.get(param) for param in LIST_FILTER_PARAMS):
+            queryset = self.get_queryset().values('train_model', 'assessment_item').distinct().order_by('train_model', 'assessment_item')
+            return Response(list(queryset))
+        return Response(list(Assessment_Subject.objects.values('train_model', 'assessment_item', 'row_count', 'first_date', 'last_date')))
+
+    # 通过接口增删改记录时，在同一个事务中重新统计修改前后所属的科目
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            instance = serializer.save()
+            refresh_subjects([(instance.train_model, instance.assessment_item)])
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            subject = (serializer.instance.train_model, serializer.instance.assessment_item)
+            instance = serializer.save()
+            refresh_subjects([subject, (instance.train_model, instance.assessment_item)])
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            refresh_subjects([(instance.train_model, instance.assessment_item)])
     
     # 重写 get_queryset 方法，以便根据日期范围筛选查询集
     def get_queryset(self):
@@ -251,7 +363,11 @@ class AssessmentBaseViewSet(viewsets.ModelViewSet):
         # 检查 train_model_line 是否有值
         if train_model_line:
             # 如果有值，添加一个条件来匹配以该值开始的 train_model
-            query_conditions.append(Q(train_model__startswith=train_model_line))
+            # 线路编号已经存入 train_line 列，两位的线路直接在索引上等值查找，其他长度的前缀仍按车型的范围条件匹配
+            if len(train_model_line) == TRAIN_LINE_LENGTH:
+                query_conditions.append(Q(train_line=train_model_line))
+            else:
+                query_conditions.append(prefix_condition('train_model', train_model_line))
         # 如果 train_model_line 为空，即前端的选项框中选取了 所有线路，不添加该条件，从而不限制查询结果
 
         # 构建一个精确匹配 train_model 的车型匹配
@@ -272,16 +388,47 @@ class AssessmentBaseViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    # 列表只读，直接从数据库读取需要的列，不经过 AssessmentBaseSerializer 逐条构造模型实例，返回的 JSON 完全相同
+    def list(self, request, *args, **kwargs):
+        queryset = assessment_base_values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(assessment_base_data(page))
+        return Response(assessment_base_data(queryset))
+
     @action(detail=False, methods=['get'], url_path='unpaged-data')
     def unpaged_data(self, request, *args, **kwargs):
         # 重用定义好的 get_queryset 方法来获取满足筛选条件的全量数据（不分页）
         queryset = self.get_queryset()
         
-        # 使用serializer来序列化数据
-        serializer = self.get_serializer(queryset, many=True)
-        
-        # 返回序列化后的数据
-        return Response(serializer.data)
+        # 与列表相同，使用只读的快速序列化
+        return Response(assessment_base_data(assessment_base_values(queryset)))
+
+    # 流式导出满足筛选条件的全量数据，不在内存中构造完整的列表
+    # export_format 为 ndjson（默认，每行一条记录的 JSON）或 csv；不使用 format 参数，它被 DRF 用来选择渲染器
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request, *args, **kwargs):
+        export_format = request.query_params.get('export_format', NDJSON_FORMAT)
+        if export_format not in EXPORT_STREAMS:
+            return Response({'detail': f'不支持的导出格式: {export_format}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(EXPORT_STREAMS[export_format](queryset), content_type=EXPORT_CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="assessments.{export_format}"'
+        return response
+
+    # 按维度分组统计满足筛选条件的记录：记录数、合格率和优秀率、整体用时的平均值和百分位数
+    # 参数 group_by、metrics、percentiles 见 aggregates.parse_aggregation_params，例如 ?group_by=crew_group,month&percentiles=50,90
+    @action(detail=False, methods=['get'], url_path='aggregate')
+    def aggregate(self, request, *args, **kwargs):
+        try:
+            group_by, metrics, percentiles = parse_aggregation_params(request.query_params)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        groups = aggregate_assessments(queryset, group_by, metrics, percentiles)
+        return Response({'group_by': group_by, 'metrics': metrics, 'groups': groups})
 
 # 保存操作分类视图
 class SaveClassification(APIView):
@@ -302,7 +449,7 @@ class SaveClassification(APIView):
         classifications = request.data.get('classifications')
 
         # 找到所有具有该 file_name 的 Assessment_Base 实例
-        assessment_bases = Assessment_Base.objects.filter(file_name=file_name)
+        assessment_bases = Assessment_Base.objects.published().filter(file_name=file_name)
         if not assessment_bases.exists():
             return Response({"error": "File name not found."}, status=status.HTTP_404_NOT_FOUND)
 